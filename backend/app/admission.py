@@ -0,0 +1,237 @@
+"""
+Admission control and load shedding.
+
+Requests are sorted into route classes by path prefix. Each class has its own
+concurrency limit and a bounded FIFO wait queue, and all classes share a
+global capacity kept below the threadpool and DB pool sizes. When a slot
+frees up, waiting checkout traffic (scanner and sales) is admitted before
+catalog traffic, which goes before analytics.
+
+A request is rejected with 429 when its class queue is full, and with 503
+when it cannot be admitted before its deadline (the class wait limit, or a
+shorter X-Request-Deadline-Ms header). Both responses carry Retry-After.
+GETs that look coalesced onto an in-flight computation skip admission here;
+the single-flight layer admits them after all if they end up leading the
+computation (the leader may have finished in between).
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional
+from starlette.datastructures import QueryParams
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from .singleflight import DEFERRED_ADMISSION, single_flight
+
+
+class RouteClass:
+    """Limits and counters for one class of routes"""
+
+    def __init__(self, name: str, prefixes: tuple, priority: int,
+                 max_concurrent: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.prefixes = prefixes
+        self.priority = priority
+        self.max_concurrent = int(os.getenv(f"ADMISSION_{name.upper()}_CONCURRENCY", max_concurrent))
+        self.max_queue = int(os.getenv(f"ADMISSION_{name.upper()}_QUEUE", max_queue))
+        self.max_wait = float(os.getenv(f"ADMISSION_{name.upper()}_MAX_WAIT", max_wait))
+        self.in_flight = 0
+        self.waiters: deque = deque()
+        self.avg_service_seconds = 0.05
+        self.counters = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected_queue_full": 0,
+            "rejected_deadline": 0
+        }
+        self.total_wait_seconds = 0.0
+
+    def has_slot(self) -> bool:
+        return self.in_flight < self.max_concurrent
+
+    def retry_after(self) -> int:
+        backlog = len(self.waiters) + 1
+        return max(1, math.ceil(self.avg_service_seconds * backlog / self.max_concurrent))
+
+
+class AdmissionController:
+    """Per-class slots under a shared capacity, with strict priority between classes"""
+
+    def __init__(self, classes: List[RouteClass], capacity: int):
+        self.classes = sorted(classes, key=lambda c: c.priority)
+        self.capacity = capacity
+        self.in_flight = 0
+
+    def classify(self, path: str) -> Optional[RouteClass]:
+        """The class with the longest matching prefix"""
+        best, best_length = None, -1
+        for route_class in self.classes:
+            for prefix in route_class.prefixes:
+                if path.startswith(prefix) and len(prefix) > best_length:
+                    best, best_length = route_class, len(prefix)
+        return best
+
+    def _eligible(self, route_class: RouteClass) -> bool:
+        return self.in_flight < self.capacity and route_class.has_slot()
+
+    def _admit(self, route_class: RouteClass):
+        self.in_flight += 1
+        route_class.in_flight += 1
+        route_class.counters["admitted"] += 1
+
+    def _dispatch(self):
+        """Hand free slots to waiters, highest priority class first"""
+        while self.in_flight < self.capacity:
+            for route_class in self.classes:
+                if not route_class.has_slot():
+                    continue
+                while route_class.waiters and route_class.waiters[0].done():
+                    route_class.waiters.popleft()  # Timed out
+                if route_class.waiters:
+                    self._admit(route_class)
+                    route_class.waiters.popleft().set_result(True)
+                    break
+            else:
+                return
+
+    async def acquire(self, route_class: RouteClass, deadline: float) -> Optional[int]:
+        """None once admitted, otherwise the HTTP status to reject with"""
+        higher_waiting = any(
+            c.waiters and c.has_slot() for c in self.classes if c.priority < route_class.priority
+        )
+        if self._eligible(route_class) and not route_class.waiters and not higher_waiting:
+            self._admit(route_class)
+            return None
+
+        if len(route_class.waiters) >= route_class.max_queue:
+            route_class.counters["rejected_queue_full"] += 1
+            return 429
+
+        future = asyncio.get_running_loop().create_future()
+        route_class.waiters.append(future)
+        route_class.counters["queued"] += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(future, timeout=deadline)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return None  # Admitted just as the deadline passed
+            route_class.counters["rejected_deadline"] += 1
+            return 503
+        finally:
+            route_class.total_wait_seconds += time.monotonic() - started
+        return None
+
+    def release(self, route_class: RouteClass, service_seconds: float):
+        self.in_flight -= 1
+        route_class.in_flight -= 1
+        route_class.avg_service_seconds += 0.1 * (service_seconds - route_class.avg_service_seconds)
+        self._dispatch()
+
+    def snapshot(self) -> Dict:
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "classes": {
+                c.name: {
+                    "priority": c.priority,
+                    "max_concurrent": c.max_concurrent,
+                    "max_queue": c.max_queue,
+                    "max_wait_seconds": c.max_wait,
+                    "in_flight": c.in_flight,
+                    "queue_depth": sum(1 for w in c.waiters if not w.done()),
+                    "avg_service_seconds": round(c.avg_service_seconds, 4),
+                    "total_wait_seconds": round(c.total_wait_seconds, 3),
+                    **c.counters
+                }
+                for c in self.classes
+            }
+        }
+
+
+# Keep the shared capacity below anyio's 40 worker threads
+admission_controller = AdmissionController(
+    classes=[
+        RouteClass("checkout", ("/barcode", "/sales", "/stores", "/reservations"), 0, 32, 200, 5.0),
+        RouteClass("catalog", ("/products", "/suppliers", "/sync"), 1, 16, 100, 5.0),
+        RouteClass("analytics", ("/analytics", "/advanced-analytics", "/stores/rollup"), 2, 4, 20, 2.0),
+    ],
+    capacity=int(os.getenv("ADMISSION_CAPACITY", "36"))
+)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the admission controller to HTTP requests"""
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    @staticmethod
+    def _coalesced(scope: Scope) -> bool:
+        """Identical GETs already being computed only wait, so need no slot"""
+        if scope["method"] != "GET":
+            return False
+        key = single_flight.request_key(scope["path"], QueryParams(scope["query_string"]))
+        return single_flight.in_flight(key)
+
+    @staticmethod
+    def _deadline(scope: Scope, route_class: RouteClass) -> float:
+        deadline = route_class.max_wait
+        for name, value in scope["headers"]:
+            if name == b"x-request-deadline-ms":
+                try:
+                    deadline = min(deadline, max(int(value) / 1000, 0.0))
+                except ValueError:
+                    pass
+        return deadline
+
+    @staticmethod
+    def _rejection(route_class: RouteClass, status: int) -> JSONResponse:
+        detail = "Too many queued requests" if status == 429 else "Server busy, try again later"
+        return JSONResponse(
+            status_code=status,
+            content={"detail": detail, "route_class": route_class.name},
+            headers={"Retry-After": str(route_class.retry_after())}
+        )
+
+    def _deferred(self, route_class: RouteClass, deadline: float):
+        """Admission for a bypassed request that turns out to lead its computation"""
+        async def admitted(compute):
+            rejected = await self.controller.acquire(route_class, deadline)
+            if rejected is not None:
+                return self._rejection(route_class, rejected)
+            started = time.monotonic()
+            try:
+                return await compute()
+            finally:
+                self.controller.release(route_class, time.monotonic() - started)
+        return admitted
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        route_class = self.controller.classify(scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+        deadline = self._deadline(scope, route_class)
+        if self._coalesced(scope):
+            scope[DEFERRED_ADMISSION] = self._deferred(route_class, deadline)
+            await self.app(scope, receive, send)
+            return
+
+        rejected = await self.controller.acquire(route_class, deadline)
+        if rejected is not None:
+            await self._rejection(route_class, rejected)(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route_class, time.monotonic() - started)
@@ -3,79 +3,41 @@ Create this as backend/app/advanced_ml.py
 Advanced ML features for inventory management
 """
 
+import math
 import numpy as np
 import pandas as pd
-from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.linear_model import Ridge
 from sklearn.ensemble import IsolationForest, RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
+from sklearn.base import clone
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
-from typing import List, Dict, Tuple
+from sqlalchemy import func, extract, insert
+from typing import List, Dict, Tuple, Optional
 from . import models
+from .forecasting import revenue_forecaster
+from .dialects import date_of
+from .metrics import ml_timer
 
 class AdvancedAnalytics:
     """Advanced analytics and ML predictions"""
     
     def __init__(self):
-        self.revenue_model = LinearRegression()
         self.demand_model = RandomForestRegressor(n_estimators=100, random_state=42)
         self.anomaly_detector = IsolationForest(contamination=0.1, random_state=42)
         self.price_optimizer = Ridge(alpha=1.0)
         self.scaler = StandardScaler()
     
+    def release_model(self, name: str):
+        """Swap a fitted estimator for an unfitted copy; each call refits anyway"""
+        setattr(self, name, clone(getattr(self, name)))
+    
     def revenue_forecasting(self, db: Session, days_ahead: int = 30) -> Dict:
         """
-        Predict future revenue using historical sales data
+        Predict future revenue from running OLS sums over daily revenue
         """
-        # Get historical sales data
-        cutoff = datetime.utcnow() - timedelta(days=365)
-        sales = db.query(
-            func.date(models.Sale.sale_date).label('date'),
-            func.sum(models.Sale.total_amount).label('revenue')
-        ).filter(
-            models.Sale.sale_date >= cutoff
-        ).group_by(func.date(models.Sale.sale_date)).order_by('date').all()
-        
-        if len(sales) < 7:
-            return {
-                "error": "Insufficient data for forecasting",
-                "message": "Need at least 7 days of sales data"
-            }
-        
-        # Prepare data
-        dates = [(s.date - sales[0].date).days for s in sales]
-        revenues = [float(s.revenue) for s in sales]
-        
-        X = np.array(dates).reshape(-1, 1)
-        y = np.array(revenues)
-        
-        # Train model
-        self.revenue_model.fit(X, y)
-        
-        # Predict future
-        last_date_offset = dates[-1]
-        future_dates = np.array([last_date_offset + i for i in range(1, days_ahead + 1)]).reshape(-1, 1)
-        predictions = self.revenue_model.predict(future_dates)
-        
-        # Calculate confidence
-        r2_score = self.revenue_model.score(X, y)
-        
-        return {
-            "forecast_days": days_ahead,
-            "predicted_revenue": float(predictions.sum()),
-            "daily_predictions": [
-                {
-                    "day": i + 1,
-                    "date": (datetime.utcnow() + timedelta(days=i + 1)).strftime("%Y-%m-%d"),
-                    "predicted_revenue": float(pred)
-                }
-                for i, pred in enumerate(predictions)
-            ],
-            "confidence": "high" if r2_score > 0.7 else "medium" if r2_score > 0.4 else "low",
-            "accuracy_score": float(r2_score),
-            "trend": "increasing" if predictions[-1] > predictions[0] else "decreasing"
-        }
+        with ml_timer("revenue_forecast", "predict"):
+            return revenue_forecaster.forecast(db, days_ahead)
     
     def seasonal_trends_analysis(self, db: Session) -> Dict:
         """
@@ -183,15 +145,38 @@ class AdvancedAnalytics:
         
         return results
     
-    def profit_margin_calculator(self, db: Session, product_id: int, cost_price: float) -> Dict:
+    def _landed_cost_query(self, db: Session):
+        """Weighted-average unit cost per product from delivered purchase orders"""
+        return db.query(
+            models.PurchaseOrder.product_id.label('product_id'),
+            (func.sum(models.PurchaseOrder.total_cost) / func.sum(models.PurchaseOrder.quantity)).label('unit_cost')
+        ).filter(
+            models.PurchaseOrder.status == models.PurchaseOrderStatus.DELIVERED
+        ).group_by(models.PurchaseOrder.product_id)
+    
+    def profit_margin_calculator(self, db: Session, product_id: int, cost_price: Optional[float] = None) -> Dict:
         """
         Calculate profit margins for a product
+        
+        Without an explicit cost_price the landed cost from delivered
+        purchase orders is used.
         """
         product = db.query(models.Product).filter(models.Product.id == product_id).first()
         
         if not product:
             return {"error": "Product not found"}
         
+        if cost_price is None:
+            landed = self._landed_cost_query(db).filter(
+                models.PurchaseOrder.product_id == product_id
+            ).first()
+            if not landed or landed.unit_cost is None:
+                return {
+                    "error": "No cost data",
+                    "message": "Pass cost_price or record a delivered purchase order"
+                }
+            cost_price = float(landed.unit_cost)
+        
         selling_price = product.price
         profit = selling_price - cost_price
         margin_percentage = (profit / selling_price * 100) if selling_price > 0 else 0
@@ -225,6 +210,118 @@ class AdvancedAnalytics:
             "recommendation": self._get_margin_recommendation(margin_percentage)
         }
     
+    # Margin bands, matching the thresholds in _get_margin_recommendation
+    MARGIN_BANDS = {
+        "excellent": (50, None),
+        "good": (30, 50),
+        "average": (20, 30),
+        "low": (10, 20),
+        "critical": (None, 10)
+    }
+    
+    def margin_report(
+        self,
+        db: Session,
+        page: int = 1,
+        per_page: int = 50,
+        category: Optional[str] = None,
+        band: Optional[str] = None,
+        min_margin: Optional[float] = None,
+        max_margin: Optional[float] = None,
+        sort_by: str = "margin",
+        descending: bool = True
+    ) -> Dict:
+        """
+        Margin for every product in one grouped query, using landed cost
+        from delivered purchase orders and the last 30 days of sales
+        """
+        cutoff = datetime.utcnow() - timedelta(days=30)
+        
+        cost = self._landed_cost_query(db).subquery()
+        sales = db.query(
+            models.Sale.product_id.label('product_id'),
+            func.sum(models.Sale.quantity).label('units_sold'),
+            func.sum(models.Sale.total_amount).label('revenue')
+        ).filter(
+            models.Sale.sale_date >= cutoff
+        ).group_by(models.Sale.product_id).subquery()
+        
+        units_sold = func.coalesce(sales.c.units_sold, 0)
+        revenue = func.coalesce(sales.c.revenue, 0.0)
+        profit_per_unit = models.Product.price - cost.c.unit_cost
+        margin = profit_per_unit / func.nullif(models.Product.price, 0) * 100  # NULL for unpriced products
+        profit = profit_per_unit * units_sold
+        
+        query = db.query(
+            models.Product.id,
+            models.Product.name,
+            models.Product.category,
+            models.Product.price,
+            cost.c.unit_cost,
+            units_sold.label('units_sold'),
+            revenue.label('revenue'),
+            margin.label('margin'),
+            profit.label('profit'),
+            func.count().over().label('total')
+        ).outerjoin(
+            cost, cost.c.product_id == models.Product.id
+        ).outerjoin(
+            sales, sales.c.product_id == models.Product.id
+        )
+        
+        if category:
+            query = query.filter(models.Product.category == category)
+        if band:
+            low, high = self.MARGIN_BANDS[band]
+            min_margin = low if low is not None else min_margin
+            max_margin = high if high is not None else max_margin
+        if min_margin is not None:
+            query = query.filter(margin >= min_margin)
+        if max_margin is not None:
+            query = query.filter(margin < max_margin)
+        
+        sort_columns = {
+            "margin": margin,
+            "profit": profit,
+            "revenue": revenue,
+            "units_sold": units_sold,
+            "name": models.Product.name
+        }
+        sort_column = sort_columns[sort_by]
+        # Products without cost data sort last either way
+        query = query.order_by(
+            cost.c.unit_cost.is_(None),
+            sort_column.desc() if descending else sort_column.asc(),
+            models.Product.id
+        )
+        
+        rows = query.offset((page - 1) * per_page).limit(per_page).all()
+        
+        return {
+            "total": rows[0].total if rows else 0,
+            "page": page,
+            "per_page": per_page,
+            "products": [
+                {
+                    "product_id": r.id,
+                    "product_name": r.name,
+                    "category": r.category,
+                    "selling_price": r.price,
+                    "cost_price": round(float(r.unit_cost), 2) if r.unit_cost is not None else None,
+                    "margin_percentage": round(float(r.margin), 2) if r.margin is not None else None,
+                    "units_sold_30days": int(r.units_sold),
+                    "revenue_30days": float(r.revenue),
+                    "total_profit_30days": round(float(r.profit), 2) if r.profit is not None else None,
+                    "recommendation": (
+                        self._get_margin_recommendation(float(r.margin)) if r.margin is not None
+                        else "No delivered purchase orders - cost unknown" if r.unit_cost is None
+                        else "No selling price - margin undefined"
+                    )
+                }
+                for r in rows
+            ]
+        }
+    
     def _get_margin_recommendation(self, margin: float) -> str:
         """Get recommendation based on profit margin"""
         if margin >= 50:
@@ -244,12 +341,12 @@ class AdvancedAnalytics:
         """
         # Get historical sales
         sales = db.query(
-            func.date(models.Sale.sale_date).label('date'),
+            date_of(models.Sale.sale_date).label('date'),
             func.sum(models.Sale.quantity).label('quantity')
         ).filter(
             models.Sale.product_id == product_id,
             models.Sale.sale_date >= datetime.utcnow() - timedelta(days=90)
-        ).group_by(func.date(models.Sale.sale_date)).order_by('date').all()
+        ).group_by(date_of(models.Sale.sale_date)).order_by('date').all()
         
         if len(sales) < 7:
             return {
@@ -270,8 +367,11 @@ class AdvancedAnalytics:
         X = df[['day_index', 'day_of_week']].values
         y = df['quantity'].values
         
-        # Train model
-        self.demand_model.fit(X, y)
+        # Fit a fresh copy: concurrent requests must not fit the shared estimator
+        model = clone(self.demand_model)
+        with ml_timer("demand_forecast", "fit"):
+            model.fit(X, y)
+        self.demand_model = model
         
         # Predict future
         last_day_index = len(sales) - 1
@@ -280,7 +380,8 @@ class AdvancedAnalytics:
         for i in range(1, days_ahead + 1):
             future_date = sales[-1].date + timedelta(days=i)
             pred_X = np.array([[last_day_index + i, future_date.weekday()]])
-            pred_quantity = self.demand_model.predict(pred_X)[0]
+            with ml_timer("demand_forecast", "predict"):
+                pred_quantity = model.predict(pred_X)[0]
             
             future_predictions.append({
                 "day": i,
@@ -298,56 +399,168 @@ class AdvancedAnalytics:
             "recommended_stock_level": int(total_predicted * 1.2)  # 20% buffer
         }
     
+    def optimize_catalog_prices(self, db: Session, product_ids: Optional[List[int]] = None,
+                                window_days: int = 60, min_sales: int = 5) -> List[Dict]:
+        """
+        Compute price suggestions for the whole catalog in one pass.
+        
+        Daily units, revenue and sale counts for every product come from a
+        single grouped query; velocity and a log-log elasticity (slope of
+        log units against log realized price) are then computed for all
+        products at once with grouped NumPy sums.
+        """
+        query = db.query(
+            models.Product.id,
+            models.Product.name,
+            models.Product.price,
+            date_of(models.Sale.sale_date).label('date'),
+            func.sum(models.Sale.quantity).label('quantity'),
+            func.sum(models.Sale.total_amount).label('revenue'),
+            func.count(models.Sale.id).label('count')
+        ).join(
+            models.Sale, models.Product.id == models.Sale.product_id
+        ).filter(
+            models.Sale.sale_date >= datetime.utcnow() - timedelta(days=window_days)
+        )
+        if product_ids is not None:
+            query = query.filter(models.Product.id.in_(product_ids))
+        rows = query.group_by(
+            models.Product.id, models.Product.name, models.Product.price,
+            date_of(models.Sale.sale_date)
+        ).all()
+        
+        if not rows:
+            return []
+        
+        ids = np.array([r.id for r in rows])
+        quantity = np.array([float(r.quantity) for r in rows])
+        revenue = np.array([float(r.revenue) for r in rows])
+        count = np.array([float(r.count) for r in rows])
+        unique_ids, group = np.unique(ids, return_inverse=True)
+        groups = len(unique_ids)
+        
+        def group_sum(values):
+            return np.bincount(group, weights=values, minlength=groups)
+        
+        # Per-product totals
+        sales_count = group_sum(count)
+        units = group_sum(quantity)
+        velocity = sales_count / window_days
+        avg_quantity = units / sales_count
+        
+        # Per-product OLS of log(units) on log(realized price) over days with sales
+        with ml_timer("price_optimizer", "fit"):
+            valid = (quantity > 0) & (revenue > 0)
+            safe_quantity = np.where(valid, quantity, 1.0)
+            safe_revenue = np.where(valid, revenue, 1.0)
+            x = np.log(safe_revenue / safe_quantity)  # 0 for invalid rows
+            y = np.log(safe_quantity)
+            n = group_sum(valid.astype(float))
+            sx, sy = group_sum(x), group_sum(y)
+            sxx, sxy = group_sum(x * x), group_sum(x * y)
+            sxx_centered = sxx - np.divide(sx * sx, n, out=np.zeros(groups), where=n > 0)
+            sxy_centered = sxy - np.divide(sx * sy, n, out=np.zeros(groups), where=n > 0)
+            # Elasticity needs a few days and some actual price variation
+            has_elasticity = (n >= 3) & (sxx_centered > 1e-6)
+            elasticity = np.divide(sxy_centered, sxx_centered, out=np.zeros(groups), where=has_elasticity)
+        
+        products = {r.id: r for r in rows}
+        suggestions = []
+        for i, product_id in enumerate(unique_ids.tolist()):
+            product = products[product_id]
+            if sales_count[i] < min_sales or product.price <= 0:
+                continue  # too few sales, or no price to change relative to
+            e = float(elasticity[i]) if has_elasticity[i] else None
+            current_price = product.price
+            suggested_price, reason = self._suggest_price(current_price, velocity[i], e)
+            suggestions.append({
+                "product_id": product_id,
+                "product_name": product.name,
+                "current_price": current_price,
+                "suggested_price": round(suggested_price, 2),
+                "price_change_percentage": round(((suggested_price - current_price) / current_price * 100), 2),
+                "reason": reason,
+                "sales_velocity": round(float(velocity[i]), 2),
+                "avg_quantity_per_sale": round(float(avg_quantity[i]), 2),
+                "elasticity": round(e, 3) if e is not None else None
+            })
+        
+        return suggestions
+    
+    def _suggest_price(self, current_price: float, sales_velocity: float, elasticity: Optional[float]) -> Tuple[float, str]:
+        """Pick a price from demand velocity, refined by elasticity when known"""
+        if elasticity is not None and elasticity > -1 and sales_velocity > 1:
+            return current_price * 1.1, "Inelastic demand - price increase unlikely to reduce volume"
+        if elasticity is not None and elasticity < -1 and sales_velocity <= 1:
+            return current_price * 0.9, "Elastic demand - price reduction should boost sales"
+        
+        # Simple optimization: higher sales = can increase price, lower sales = decrease
+        if sales_velocity > 2:  # High demand
+            return current_price * 1.1, "High demand - price increase recommended"
+        elif sales_velocity > 1:  # Moderate demand
+            return current_price, "Optimal pricing - maintain current price"
+        else:  # Low demand
+            return current_price * 0.9, "Low demand - price reduction may boost sales"
+    
+    def run_price_optimization_job(self, db: Session) -> Dict:
+        """
+        Recompute suggestions for every product and replace the stored table
+        """
+        started = datetime.utcnow()
+        suggestions = self.optimize_catalog_prices(db)
+        
+        db.query(models.PriceSuggestion).delete(synchronize_session=False)
+        if suggestions:
+            rows = []
+            for suggestion in suggestions:
+                row = {key: value for key, value in suggestion.items() if key != "product_name"}
+                row["computed_at"] = started
+                rows.append(row)
+            db.execute(insert(models.PriceSuggestion), rows)
+        db.commit()
+        
+        return {
+            "products_priced": len(suggestions),
+            "computed_at": started,
+            "duration_seconds": round((datetime.utcnow() - started).total_seconds(), 3)
+        }
+    
     def price_optimization(self, db: Session, product_id: int) -> Dict:
         """
-        Suggest optimal price based on sales patterns
+        Suggest optimal price, served from the stored catalog-wide job results
         """
         product = db.query(models.Product).filter(models.Product.id == product_id).first()
         
         if not product:
             return {"error": "Product not found"}
         
-        # Get historical sales
-        sales = db.query(models.Sale).filter(
-            models.Sale.product_id == product_id,
-            models.Sale.sale_date >= datetime.utcnow() - timedelta(days=60)
-        ).all()
+        stored = db.query(models.PriceSuggestion).filter(
+            models.PriceSuggestion.product_id == product_id
+        ).first()
+        # A suggestion computed before a price change is stale; recompute it below
+        if stored and math.isclose(stored.current_price, product.price):
+            return {
+                "product_id": product_id,
+                "product_name": product.name,
+                "current_price": stored.current_price,
+                "suggested_price": stored.suggested_price,
+                "price_change_percentage": stored.price_change_percentage,
+                "reason": stored.reason,
+                "sales_velocity": stored.sales_velocity,
+                "avg_quantity_per_sale": stored.avg_quantity_per_sale,
+                "elasticity": stored.elasticity,
+                "computed_at": stored.computed_at
+            }
         
-        if len(sales) < 5:
+        # Not covered by the last job run (new product, job never run or price changed since)
+        suggestions = self.optimize_catalog_prices(db, product_ids=[product_id])
+        if not suggestions:
             return {
                 "error": "Insufficient data",
                 "current_price": product.price,
                 "message": "Need more sales data for optimization"
             }
-        
-        # Calculate metrics
-        avg_quantity_per_sale = sum(s.quantity for s in sales) / len(sales)
-        current_price = product.price
-        
-        # Simple optimization: price elasticity estimation
-        # Higher sales = lower optimal price, lower sales = can increase price
-        sales_velocity = len(sales) / 60  # sales per day
-        
-        if sales_velocity > 2:  # High demand
-            suggested_price = current_price * 1.1  # Can increase 10%
-            reason = "High demand - price increase recommended"
-        elif sales_velocity > 1:  # Moderate demand
-            suggested_price = current_price
-            reason = "Optimal pricing - maintain current price"
-        else:  # Low demand
-            suggested_price = current_price * 0.9  # Decrease 10%
-            reason = "Low demand - price reduction may boost sales"
-        
-        return {
-            "product_id": product_id,
-            "product_name": product.name,
-            "current_price": current_price,
-            "suggested_price": round(suggested_price, 2),
-            "price_change_percentage": round(((suggested_price - current_price) / current_price * 100), 2),
-            "reason": reason,
-            "sales_velocity": round(sales_velocity, 2),
-            "avg_quantity_per_sale": round(avg_quantity_per_sale, 2)
-        }
+        return suggestions[0]
     
     def anomaly_detection(self, db: Session) -> List[Dict]:
         """
@@ -356,12 +569,12 @@ class AdvancedAnalytics:
         # Get recent sales
         cutoff = datetime.utcnow() - timedelta(days=30)
         sales = db.query(
-            func.date(models.Sale.sale_date).label('date'),
+            date_of(models.Sale.sale_date).label('date'),
             func.sum(models.Sale.total_amount).label('revenue'),
             func.count(models.Sale.id).label('count')
         ).filter(
             models.Sale.sale_date >= cutoff
-        ).group_by(func.date(models.Sale.sale_date)).all()
+        ).group_by(date_of(models.Sale.sale_date)).all()
         
         if len(sales) < 7:
             return []
@@ -370,14 +583,18 @@ class AdvancedAnalytics:
         X = np.array([[s.revenue, s.count] for s in sales])
         
         # Detect anomalies
-        self.anomaly_detector.fit(X)
-        predictions = self.anomaly_detector.predict(X)
+        model = clone(self.anomaly_detector)
+        with ml_timer("sales_anomaly", "fit"):
+            model.fit(X)
+        self.anomaly_detector = model
+        with ml_timer("sales_anomaly", "predict"):
+            predictions = model.predict(X)
         
         # Find anomalies
+        avg_revenue = np.mean([s.revenue for s in sales])
         anomalies = []
         for i, (sale, pred) in enumerate(zip(sales, predictions)):
             if pred == -1:  # Anomaly detected
-                avg_revenue = np.mean([s.revenue for s in sales])
                 deviation = ((sale.revenue - avg_revenue) / avg_revenue * 100)
                 
                 anomalies.append({
@@ -0,0 +1,242 @@
+"""
+Streaming anomaly detection on the sale write path.
+
+Each product, each category and the whole store keeps an exponentially
+weighted mean and variance of its daily revenue. Recording a sale is O(1):
+the running total for the day is compared against the EWMA band as it grows
+(unusually high days are flagged as soon as they cross it), and when a new
+day starts the finished day is checked for unusually low revenue and folded
+into the averages.
+
+The detector is warmed from the database on the first query (or by the
+rebuild_streaming_state job), never on the write path: sales recorded while
+it is cold, e.g. after a memory eviction, are left to that replay.
+"""
+
+import math
+import threading
+from collections import deque
+from datetime import datetime, timedelta, date
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from . import models
+from .forecasting import to_date
+from .dialects import date_of
+
+
+class _DailyEwma:
+    """EWMA mean/variance of a daily total plus the open day's running sum"""
+
+    __slots__ = ("mean", "var", "days", "day", "total", "quantity", "flagged")
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.days = 0
+        self.day: Optional[date] = None
+        self.total = 0.0
+        self.quantity = 0
+        self.flagged = False
+
+    def fold(self, value: float, alpha: float):
+        if self.days == 0:
+            self.mean = value
+            self.var = 0.0
+        else:
+            diff = value - self.mean
+            incr = alpha * diff
+            self.mean += incr
+            self.var = (1 - alpha) * (self.var + diff * incr)
+        self.days += 1
+
+
+class OnlineAnomalyDetector:
+    """Per-product, per-category and store-wide EWMA z-score detector"""
+
+    SCOPES = ("product", "category", "store")
+
+    def __init__(
+        self,
+        alpha: float = 0.2,
+        threshold: float = 3.0,
+        warmup_days: int = 7,
+        history_days: int = 60,
+        max_gap_days: int = 30,
+        max_events: int = 1000
+    ):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup_days = warmup_days
+        self.history_days = history_days
+        self.max_gap_days = max_gap_days
+        self._lock = threading.Lock()
+        self._stats: Dict[tuple, _DailyEwma] = {}
+        self._names: Dict[tuple, str] = {}
+        self.events = deque(maxlen=max_events)
+        self.built = False
+        self.built_at: Optional[datetime] = None
+
+    def _std(self, stat: _DailyEwma) -> float:
+        # Floor the deviation so near-constant series do not flag every wobble
+        return max(math.sqrt(max(stat.var, 0.0)), 0.1 * abs(stat.mean), 1e-9)
+
+    def _emit(self, key: tuple, stat: _DailyEwma, anomaly_type: str):
+        expected = stat.mean
+        z_score = (stat.total - expected) / self._std(stat)
+        deviation = ((stat.total - expected) / expected * 100) if expected else 0.0
+        self.events.append({
+            "scope": key[0],
+            "key": key[1],
+            "name": self._names.get(key, str(key[1])),
+            "date": stat.day.strftime("%Y-%m-%d"),
+            "revenue": round(stat.total, 2),
+            "units": stat.quantity,
+            "expected_revenue": round(expected, 2),
+            "z_score": round(z_score, 2),
+            "deviation_percentage": round(deviation, 2),
+            "type": anomaly_type,
+            "severity": "high" if abs(z_score) > 2 * self.threshold else "medium",
+            "detected_at": datetime.utcnow()
+        })
+
+    def _close_day(self, key: tuple, stat: _DailyEwma, next_day: date):
+        """Check the finished day for a shortfall and fold it into the averages"""
+        if stat.day is None:
+            return
+        if (
+            stat.days >= self.warmup_days
+            and not stat.flagged
+            and (stat.mean - stat.total) / self._std(stat) > self.threshold
+        ):
+            self._emit(key, stat, "unusually_low")
+        stat.fold(stat.total, self.alpha)
+        # Days without any sales count as zero revenue
+        gap = min((next_day - stat.day).days - 1, self.max_gap_days)
+        for _ in range(max(gap, 0)):
+            stat.fold(0.0, self.alpha)
+        stat.day = next_day
+        stat.total = 0.0
+        stat.quantity = 0
+        stat.flagged = False
+
+    def _observe(self, key: tuple, day: date, quantity: int, amount: float):
+        stat = self._stats.get(key)
+        if stat is None:
+            stat = self._stats[key] = _DailyEwma()
+            stat.day = day
+        if day > stat.day:
+            self._close_day(key, stat, day)
+        elif day < stat.day:
+            # Late arrivals for an already folded day are not rescored
+            return
+        stat.total += amount
+        stat.quantity += quantity
+        if (
+            stat.days >= self.warmup_days
+            and not stat.flagged
+            and (stat.total - stat.mean) / self._std(stat) > self.threshold
+        ):
+            stat.flagged = True
+            self._emit(key, stat, "unusually_high")
+
+    def _record(self, product_id: int, product_name: str, category: str,
+                sale_date: datetime, quantity: int, amount: float):
+        day = to_date(sale_date)
+        amount = float(amount)
+        self._names[("product", product_id)] = product_name
+        self._names[("category", category)] = category
+        self._names[("store", "all")] = "All products"
+        self._observe(("product", product_id), day, quantity, amount)
+        self._observe(("category", category), day, quantity, amount)
+        self._observe(("store", "all"), day, quantity, amount)
+
+    def rebuild(self, db: Session) -> Dict:
+        """Replay recent daily totals per product to warm the detector"""
+        cutoff = datetime.utcnow() - timedelta(days=self.history_days)
+        rows = db.query(
+            models.Sale.product_id,
+            models.Product.name,
+            models.Product.category,
+            date_of(models.Sale.sale_date).label('date'),
+            func.sum(models.Sale.quantity).label('quantity'),
+            func.sum(models.Sale.total_amount).label('revenue')
+        ).join(
+            models.Product, models.Product.id == models.Sale.product_id
+        ).filter(
+            models.Sale.sale_date >= cutoff
+        ).group_by(
+            models.Sale.product_id, models.Product.name, models.Product.category,
+            date_of(models.Sale.sale_date)
+        ).order_by('date').all()
+
+        with self._lock:
+            self._stats.clear()
+            self._names.clear()
+            self.events.clear()
+            for row in rows:
+                self._record(row.product_id, row.name, row.category,
+                             row.date, int(row.quantity), row.revenue)
+            self.built = True
+            self.built_at = datetime.utcnow()
+            return self.status()
+
+    def evict(self):
+        """Drop all series to free memory; the next query replays history"""
+        with self._lock:
+            self._stats.clear()
+            self._names.clear()
+            self.events.clear()
+            self.built = False
+
+    def record_sale(self, sale: models.Sale, product: models.Product):
+        """Score a newly committed sale in O(1)"""
+        with self._lock:
+            if not self.built:
+                # The next rebuild replays this sale from the database
+                return
+            self._record(product.id, product.name, product.category,
+                         sale.sale_date, sale.quantity, sale.total_amount)
+
+    def status(self) -> Dict:
+        return {
+            "built": self.built,
+            "built_at": self.built_at,
+            "series_tracked": len(self._stats),
+            "events": len(self.events)
+        }
+
+    def anomalies(
+        self,
+        db: Session,
+        scope: Optional[str] = None,
+        key: Optional[str] = None,
+        anomaly_type: Optional[str] = None,
+        limit: int = 100
+    ) -> List[Dict]:
+        """Most recent anomalies first, optionally filtered"""
+        if not self.built:
+            self.rebuild(db)
+
+        with self._lock:
+            # Close out series whose last day has already ended
+            today = datetime.utcnow().date()
+            for series_key, stat in self._stats.items():
+                if stat.day is not None and stat.day < today:
+                    self._close_day(series_key, stat, today)
+
+            results = []
+            for event in reversed(self.events):
+                if scope and event["scope"] != scope:
+                    continue
+                if key is not None and str(event["key"]) != key:
+                    continue
+                if anomaly_type and event["type"] != anomaly_type:
+                    continue
+                results.append(event)
+                if len(results) >= limit:
+                    break
+            return results
+
+# Singleton instance
+anomaly_detector = OnlineAnomalyDetector()
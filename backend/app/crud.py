@@ -1,30 +1,37 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, case, and_
 from . import models, schemas
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, List, Dict
+import numpy as np
+from .dialects import dialect_name, days_between
+from .forecasting import revenue_forecaster
+from .anomaly import anomaly_detector
+from .top_sellers import top_sellers
+from .search import product_search_index
+from .facets import catalog_facets, filter_clauses
+from .sync import edge_syncer
 
 # Product CRUD
 def get_product(db: Session, product_id: int):
-    return db.query(models.Product).filter(models.Product.id == product_id).first()
+    # Session.get skips the SELECT when the product is already loaded in this session
+    return db.get(models.Product, product_id)
 
-def get_products(db: Session, skip: int = 0, limit: int = 10, category: Optional[str] = None):
+def get_products(db: Session, skip: int = 0, limit: int = 10, category: Optional[str] = None,
+                 stock_status: Optional[str] = None, price_band: Optional[str] = None):
     query = db.query(models.Product)
     if category:
         query = query.filter(models.Product.category == category)
-    return query.offset(skip).limit(limit).all()
-
-def get_products_count(db: Session, category: Optional[str] = None):
-    query = db.query(func.count(models.Product.id))
-    if category:
-        query = query.filter(models.Product.category == category)
-    return query.scalar()
+    query = query.filter(*filter_clauses(stock_status, price_band))
+    return query.order_by(models.Product.id).offset(skip).limit(limit).all()
 
 def create_product(db: Session, product: schemas.ProductCreate):
     db_product = models.Product(**product.model_dump())
     db.add(db_product)
     db.commit()
     db.refresh(db_product)
+    product_search_index.upsert(db_product)
+    catalog_facets.update(db_product)
     
     # Record initial stock history
     create_stock_history(db, db_product.id, db_product.stock, "initial")
@@ -39,6 +46,7 @@ def update_product(db: Session, product_id: int, product: schemas.ProductUpdate)
     
     # Track stock changes
     if "stock" in update_data and update_data["stock"] != db_product.stock:
+        edge_syncer.record(db, "adjustment", product_id, stock=update_data["stock"], previous=db_product.stock)
         create_stock_history(db, product_id, update_data["stock"], "adjustment")
     
     for key, value in update_data.items():
@@ -47,6 +55,12 @@ def update_product(db: Session, product_id: int, product: schemas.ProductUpdate)
     db_product.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(db_product)
+    
+    if "name" in update_data:
+        top_sellers.rename(product_id, db_product.name)
+    if "name" in update_data or "category" in update_data:
+        product_search_index.upsert(db_product)
+    catalog_facets.update(db_product)
     return db_product
 
 def delete_product(db: Session, product_id: int):
@@ -54,6 +68,8 @@ def delete_product(db: Session, product_id: int):
     if db_product:
         db.delete(db_product)
         db.commit()
+        product_search_index.delete(product_id)
+        catalog_facets.remove(product_id)
         return True
     return False
 
@@ -63,8 +79,19 @@ def create_sale(db: Session, sale: schemas.SaleCreate):
     if not product:
         raise ValueError("Product not found")
     
-    if product.stock < sale.quantity:
+    # Decrement in one conditional UPDATE so concurrent sales and reservation
+    # holds cannot oversell (stock held by reservations is not for sale)
+    sold = db.query(models.Product).filter(
+        models.Product.id == sale.product_id,
+        models.Product.stock - models.Product.reserved >= sale.quantity
+    ).update({
+        models.Product.stock: models.Product.stock - sale.quantity,
+        models.Product.updated_at: datetime.utcnow()
+    }, synchronize_session=False)
+    if not sold:
+        db.rollback()
         raise ValueError("Insufficient stock")
+    db.refresh(product)
     
     # Calculate total
     total = product.price * sale.quantity
@@ -73,21 +100,28 @@ def create_sale(db: Session, sale: schemas.SaleCreate):
     db_sale = models.Sale(
         product_id=sale.product_id,
         quantity=sale.quantity,
-        total_amount=total
+        total_amount=total,
+        sale_date=datetime.utcnow()
     )
     db.add(db_sale)
-    
-    # Update product stock
-    product.stock -= sale.quantity
-    product.updated_at = datetime.utcnow()
+    edge_syncer.record(db, "sale", sale.product_id, quantity=sale.quantity,
+                       total_amount=total, sale_date=db_sale.sale_date.isoformat())
     
     # Record stock history
     create_stock_history(db, sale.product_id, product.stock, "sale")
     
     db.commit()
     db.refresh(db_sale)
+    publish_sale(db, db_sale, product)
     return db_sale
 
+def publish_sale(db: Session, db_sale: models.Sale, product: models.Product):
+    """Keep the streaming analytics and facets in step with the sales table"""
+    revenue_forecaster.record_sale(db_sale.sale_date, db_sale.total_amount)
+    anomaly_detector.record_sale(db_sale, product)
+    top_sellers.record_sale(product.id, product.name, db_sale.sale_date, db_sale.quantity)
+    catalog_facets.update(product)
+
 def get_sales(db: Session, skip: int = 0, limit: int = 50):
     return db.query(models.Sale).order_by(desc(models.Sale.sale_date)).offset(skip).limit(limit).all()
 
@@ -105,6 +139,7 @@ def get_stock_history(db: Session, product_id: int, days: int = 30):
     cutoff = datetime.utcnow() - timedelta(days=days)
     return db.query(models.StockHistory).filter(
         models.StockHistory.product_id == product_id,
+        models.StockHistory.store_id.is_(None),  # central stock only; stores have their own series
         models.StockHistory.recorded_at >= cutoff
     ).order_by(models.StockHistory.recorded_at).all()
 
@@ -114,12 +149,142 @@ def get_low_stock_products(db: Session):
         models.Product.stock <= models.Product.reorder_level
     ).all()
 
-def get_top_selling_products(db: Session, limit: int = 10, days: int = 30):
-    cutoff = datetime.utcnow() - timedelta(days=days)
+def get_top_selling_products(db: Session, limit: int = 10, days: int = 30, since: Optional[datetime] = None):
+    cutoff = since or datetime.utcnow() - timedelta(days=days)
     return db.query(
         models.Product.id,
         models.Product.name,
         func.sum(models.Sale.quantity).label('total_sold')
     ).join(models.Sale).filter(
         models.Sale.sale_date >= cutoff
-    ).group_by(models.Product.id).order_by(desc('total_sold')).limit(limit).all()
\ No newline at end of file
+    ).group_by(models.Product.id).order_by(desc('total_sold')).limit(limit).all()
+
+# Supplier performance
+SUPPLIER_SORT_FIELDS = (
+    "performance_score", "on_time_delivery_rate", "total_value",
+    "total_orders", "avg_lead_time_days", "name"
+)
+
+def get_supplier_performance_stats(
+    db: Session,
+    supplier_id: Optional[int] = None,
+    sort_by: str = "performance_score",
+    descending: bool = True,
+    skip: int = 0,
+    limit: int = 100,
+    active_only: bool = False
+) -> Dict:
+    """Order counts, value, on-time rate and lead times for suppliers in one grouped query"""
+    po = models.PurchaseOrder
+    delivered = po.status == models.PurchaseOrderStatus.DELIVERED
+    timed = and_(delivered, po.expected_delivery.isnot(None), po.actual_delivery.isnot(None))
+    lead_days = case(
+        (and_(delivered, po.actual_delivery.isnot(None)), days_between(db, po.order_date, po.actual_delivery))
+    )
+    
+    total_orders = func.count(po.id)
+    completed = func.sum(case((delivered, 1), else_=0))
+    on_time = func.sum(case((and_(timed, po.actual_delivery <= po.expected_delivery), 1), else_=0))
+    late = func.sum(case((and_(timed, po.actual_delivery > po.expected_delivery), 1), else_=0))
+    total_value = func.coalesce(func.sum(po.total_cost), 0.0)
+    # Suppliers without timed deliveries get the benefit of the doubt
+    on_time_rate = case((on_time + late > 0, 100.0 * on_time / (on_time + late)), else_=100.0)
+    score = on_time_rate / 100.0 * models.Supplier.rating
+    avg_lead = func.avg(lead_days)
+    
+    columns = [
+        models.Supplier.id,
+        models.Supplier.name,
+        models.Supplier.rating,
+        total_orders.label('total_orders'),
+        completed.label('completed_orders'),
+        total_value.label('total_value'),
+        on_time.label('on_time'),
+        late.label('late'),
+        on_time_rate.label('on_time_rate'),
+        score.label('score'),
+        avg_lead.label('avg_lead'),
+        func.count().over().label('total')
+    ]
+    postgres = dialect_name(db) == "postgresql"
+    if postgres:
+        columns += [
+            func.percentile_cont(0.5).within_group(lead_days.asc()).label('p50_lead'),
+            func.percentile_cont(0.9).within_group(lead_days.asc()).label('p90_lead')
+        ]
+    
+    query = db.query(*columns).outerjoin(
+        po, po.supplier_id == models.Supplier.id
+    )
+    if supplier_id is not None:
+        query = query.filter(models.Supplier.id == supplier_id)
+    if active_only:
+        query = query.filter(models.Supplier.is_active == True)
+    
+    sort_columns = {
+        "performance_score": score,
+        "on_time_delivery_rate": on_time_rate,
+        "total_value": total_value,
+        "total_orders": total_orders,
+        "avg_lead_time_days": avg_lead,
+        "name": models.Supplier.name
+    }
+    sort_column = sort_columns[sort_by]
+    rows = query.group_by(
+        models.Supplier.id, models.Supplier.name, models.Supplier.rating
+    ).order_by(
+        sort_column.desc() if descending else sort_column.asc(), models.Supplier.id
+    ).offset(skip).limit(limit).all()
+    
+    if postgres:
+        percentiles = {r.id: (r.p50_lead, r.p90_lead) for r in rows}
+    else:
+        percentiles = _lead_time_percentiles(db, [r.id for r in rows])
+    
+    suppliers = []
+    for r in rows:
+        on_time_count = int(r.on_time or 0)
+        late_count = int(r.late or 0)
+        p50, p90 = percentiles.get(r.id, (None, None))
+        suppliers.append({
+            "supplier_id": r.id,
+            "supplier_name": r.name,
+            "rating": r.rating,
+            "total_orders": r.total_orders,
+            "completed_orders": int(r.completed_orders or 0),
+            "total_value": float(r.total_value),
+            "on_time_delivery_rate": round(float(r.on_time_rate), 2),
+            "on_time_deliveries": on_time_count,
+            "late_deliveries": late_count,
+            "avg_lead_time_days": round(float(r.avg_lead), 2) if r.avg_lead is not None else None,
+            "p50_lead_time_days": round(float(p50), 2) if p50 is not None else None,
+            "p90_lead_time_days": round(float(p90), 2) if p90 is not None else None,
+            "performance_score": round(float(r.score), 2)
+        })
+    
+    return {
+        "total": rows[0].total if rows else 0,
+        "suppliers": suppliers
+    }
+
+def _lead_time_percentiles(db: Session, supplier_ids: List[int]) -> Dict:
+    """p50/p90 lead times for backends without percentile_cont"""
+    if not supplier_ids:
+        return {}
+    po = models.PurchaseOrder
+    rows = db.query(
+        po.supplier_id,
+        days_between(db, po.order_date, po.actual_delivery)
+    ).filter(
+        po.supplier_id.in_(supplier_ids),
+        po.status == models.PurchaseOrderStatus.DELIVERED,
+        po.actual_delivery.isnot(None)
+    ).all()
+    
+    lead_times: Dict[int, List[float]] = {}
+    for sid, days in rows:
+        lead_times.setdefault(sid, []).append(float(days))
+    return {
+        sid: tuple(np.percentile(values, [50, 90]).tolist())
+        for sid, values in lead_times.items()
+    }
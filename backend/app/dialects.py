@@ -0,0 +1,35 @@
+"""
+SQL expressions that differ between the PostgreSQL and SQLite backends.
+"""
+
+from sqlalchemy import func, extract, type_coerce, Date
+from sqlalchemy.orm import Session
+
+
+def dialect_name(db: Session) -> str:
+    return db.get_bind().dialect.name
+
+
+def days_between(db: Session, start, end):
+    """Fractional days from start to end as a SQL expression"""
+    if dialect_name(db) == "postgresql":
+        return extract('epoch', end - start) / 86400.0
+    return func.julianday(end) - func.julianday(start)
+
+
+def date_of(column):
+    """Calendar day of a timestamp, returned as a date on every backend
+
+    SQLite's date() yields an ISO string; coercing to Date (without a SQL
+    CAST, which SQLite would turn into a number) makes SQLAlchemy parse it.
+    extract('dow'/'month') needs no helper: SQLAlchemy already compiles it to
+    strftime on SQLite, with Sunday = 0 as on PostgreSQL.
+    """
+    return type_coerce(func.date(column), Date)
+
+
+def month_of(db: Session, column):
+    """Calendar month of a timestamp as 'YYYY-MM' on every backend"""
+    if dialect_name(db) == "postgresql":
+        return func.to_char(column, 'YYYY-MM')
+    return func.strftime('%Y-%m', column)
@@ -0,0 +1,158 @@
+"""
+Precomputed facet counts for catalog browsing.
+
+Counts are kept per (category, stock status, price band) combination, built
+once from a single pass over products and then updated incrementally whenever a product
+is created, changed, sold, restocked or deleted. Facet counts for any filter
+come from summing this small table, so product listings and the dashboard
+never run COUNT or DISTINCT scans over products.
+
+Facets are disjunctive: each facet's counts apply the other selected filters
+but not its own, so a UI can show how many products each alternative holds.
+"""
+
+import threading
+from collections import Counter
+from typing import Dict, Optional, Tuple
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+from . import models
+
+STOCK_STATUSES = ("in_stock", "low_stock", "out_of_stock")
+
+# (label, lower bound inclusive, upper bound exclusive)
+PRICE_BANDS = (
+    ("under_10", 0, 10),
+    ("10_50", 10, 50),
+    ("50_100", 50, 100),
+    ("100_500", 100, 500),
+    ("500_plus", 500, None),
+)
+
+
+def stock_status(stock: int, reorder_level: Optional[int]) -> str:
+    if stock <= 0:
+        return "out_of_stock"
+    if stock <= (reorder_level or 0):  # nullable column; no level means never low
+        return "low_stock"
+    return "in_stock"
+
+
+def price_band(price: float) -> str:
+    for label, low, high in PRICE_BANDS:
+        if high is None or price < high:
+            return label
+    return PRICE_BANDS[-1][0]
+
+
+def filter_clauses(stock_status: Optional[str] = None, price_band: Optional[str] = None) -> list:
+    """SQL conditions matching the stock status and price band facets"""
+    clauses = []
+    reorder_level = func.coalesce(models.Product.reorder_level, 0)
+    if stock_status == "out_of_stock":
+        clauses.append(models.Product.stock <= 0)
+    elif stock_status == "low_stock":
+        clauses.append(and_(models.Product.stock > 0, models.Product.stock <= reorder_level))
+    elif stock_status == "in_stock":
+        clauses.append(models.Product.stock > reorder_level)
+    for label, low, high in PRICE_BANDS:
+        if label == price_band:
+            if low:
+                clauses.append(models.Product.price >= low)
+            if high is not None:
+                clauses.append(models.Product.price < high)
+    return clauses
+
+
+class CatalogFacets:
+    """Incrementally maintained product counts by category, stock status and price band"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+        self._keys: Dict[int, Tuple[str, str, str]] = {}
+        self.built = False
+
+    @staticmethod
+    def _key(product) -> Tuple[str, str, str]:
+        return (
+            product.category,
+            stock_status(product.stock, product.reorder_level),
+            price_band(product.price)
+        )
+
+    def rebuild(self, db: Session) -> Dict:
+        rows = db.query(
+            models.Product.id, models.Product.category, models.Product.stock,
+            models.Product.reorder_level, models.Product.price
+        ).yield_per(10000)
+        with self._lock:
+            self._keys = {row.id: self._key(row) for row in rows}
+            self._counts = Counter(self._keys.values())
+            self.built = True
+            return {"products": len(self._keys), "combinations": len(self._counts)}
+
+    def evict(self):
+        """Drop the counts to free memory; the next facet query rebuilds them"""
+        with self._lock:
+            self._keys = {}
+            self._counts = Counter()
+            self.built = False
+
+    def update(self, product):
+        """Re-file a product after any change to its category, stock or price"""
+        with self._lock:
+            if not self.built:
+                return
+            key = self._key(product)
+            old = self._keys.get(product.id)
+            if old == key:
+                return
+            if old is not None:
+                self._release(old)
+            self._keys[product.id] = key
+            self._counts[key] += 1
+
+    def remove(self, product_id: int):
+        with self._lock:
+            old = self._keys.pop(product_id, None)
+            if old is not None:
+                self._release(old)
+
+    def _release(self, key: Tuple[str, str, str]):
+        self._counts[key] -= 1
+        if self._counts[key] <= 0:
+            del self._counts[key]
+
+    def facets(self, db: Session, category: Optional[str] = None,
+               stock_status: Optional[str] = None, price_band: Optional[str] = None) -> Dict:
+        """Total matching all filters, plus per-facet counts"""
+        if not self.built:
+            self.rebuild(db)
+        selected = (category, stock_status, price_band)
+        with self._lock:
+            counts = list(self._counts.items())
+
+        total = 0
+        by_facet = [Counter(), Counter(), Counter()]
+        for key, count in counts:
+            misses = [i for i in range(3) if selected[i] is not None and key[i] != selected[i]]
+            if not misses:
+                total += count
+            if len(misses) <= 1:
+                # Count towards a facet when every *other* filter matches
+                for i in range(3):
+                    if not misses or misses == [i]:
+                        by_facet[i][key[i]] += count
+
+        return {
+            "total": total,
+            "facets": {
+                "category": dict(sorted(by_facet[0].items())),
+                "stock_status": {status: by_facet[1].get(status, 0) for status in STOCK_STATUSES},
+                "price_band": {label: by_facet[2].get(label, 0) for label, _, _ in PRICE_BANDS}
+            }
+        }
+
+# Singleton instance
+catalog_facets = CatalogFacets()
@@ -0,0 +1,197 @@
+"""
+Incremental revenue forecasting from running sufficient statistics.
+
+Ordinary least squares over (day, revenue) points only needs n, Σx, Σy, Σxy,
+Σx² and Σy², so instead of re-querying a year of sales and refitting a
+LinearRegression per request we keep those sums for the daily revenue
+buckets in memory and update them as sales are recorded.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, date
+from typing import Dict, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from . import models
+from .dialects import date_of
+
+
+def to_date(value) -> date:
+    """Normalize DB date values (SQLite returns strings) to a date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class RevenueForecaster:
+    """Linear revenue trend kept as running OLS sums over daily buckets"""
+
+    def __init__(self, window_days: int = 365, min_days: int = 7):
+        self.window_days = window_days
+        self.min_days = min_days
+        self._lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, origin: Optional[date]):
+        # x is measured in days from a fixed origin to keep the sums small
+        self.origin = origin
+        self.buckets: "OrderedDict[date, float]" = OrderedDict()
+        self.n = 0
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.sum_xy = 0.0
+        self.sum_xx = 0.0
+        self.sum_yy = 0.0
+        self.built = False
+        self.built_at: Optional[datetime] = None
+
+    def _x(self, day: date) -> float:
+        return float((day - self.origin).days)
+
+    def _add_point(self, day: date, y: float):
+        x = self._x(day)
+        self.n += 1
+        self.sum_x += x
+        self.sum_y += y
+        self.sum_xy += x * y
+        self.sum_xx += x * x
+        self.sum_yy += y * y
+
+    def _remove_point(self, day: date, y: float):
+        x = self._x(day)
+        self.n -= 1
+        self.sum_x -= x
+        self.sum_y -= y
+        self.sum_xy -= x * y
+        self.sum_xx -= x * x
+        self.sum_yy -= y * y
+
+    def _expire(self, today: date):
+        """Drop buckets that slid out of the window (amortized O(1))"""
+        cutoff = today - timedelta(days=self.window_days)
+        while self.buckets:
+            day, revenue = next(iter(self.buckets.items()))
+            if day >= cutoff:
+                break
+            self.buckets.popitem(last=False)
+            self._remove_point(day, revenue)
+
+    def rebuild(self, db: Session) -> Dict:
+        """Recompute all buckets and sums from the sales table"""
+        cutoff = datetime.utcnow() - timedelta(days=self.window_days)
+        rows = db.query(
+            date_of(models.Sale.sale_date).label('date'),
+            func.sum(models.Sale.total_amount).label('revenue')
+        ).filter(
+            models.Sale.sale_date >= cutoff
+        ).group_by(date_of(models.Sale.sale_date)).order_by('date').all()
+
+        with self._lock:
+            self._reset(cutoff.date())
+            for row in rows:
+                day = to_date(row.date)
+                revenue = float(row.revenue)
+                self.buckets[day] = revenue
+                self._add_point(day, revenue)
+            self.built = True
+            self.built_at = datetime.utcnow()
+            return self.status()
+
+    def evict(self):
+        """Drop the buckets to free memory; the next forecast rebuilds them"""
+        with self._lock:
+            self._reset(None)
+
+    def record_sale(self, sale_date: datetime, amount: float):
+        """Fold a newly recorded sale into its daily bucket in O(1)"""
+        with self._lock:
+            if not self.built:
+                # The next rebuild will pick this sale up from the database
+                return
+            day = to_date(sale_date)
+            amount = float(amount)
+            if day in self.buckets:
+                old = self.buckets[day]
+                new = old + amount
+                x = self._x(day)
+                self.buckets[day] = new
+                self.sum_y += amount
+                self.sum_xy += x * amount
+                self.sum_yy += new * new - old * old
+            else:
+                if self.buckets and day < next(reversed(self.buckets)):
+                    # Backdated sale: keep buckets in date order for expiry
+                    self.buckets[day] = amount
+                    self.buckets = OrderedDict(sorted(self.buckets.items()))
+                else:
+                    self.buckets[day] = amount
+                self._add_point(day, amount)
+
+    def status(self) -> Dict:
+        return {
+            "built": self.built,
+            "built_at": self.built_at,
+            "days_tracked": self.n,
+            "window_days": self.window_days,
+            "total_revenue": self.sum_y
+        }
+
+    def _fit(self):
+        """Slope, intercept and R² from the running sums"""
+        n = self.n
+        sxx = self.sum_xx - self.sum_x * self.sum_x / n
+        sxy = self.sum_xy - self.sum_x * self.sum_y / n
+        syy = self.sum_yy - self.sum_y * self.sum_y / n
+        slope = sxy / sxx if sxx > 0 else 0.0
+        intercept = (self.sum_y - slope * self.sum_x) / n
+        if syy > 0:
+            r2 = slope * sxy / syy
+        else:
+            # Constant revenue is fitted perfectly by a flat line
+            r2 = 1.0
+        return slope, intercept, r2
+
+    def forecast(self, db: Session, days_ahead: int = 30) -> Dict:
+        """
+        Predict future revenue from the running sums
+        """
+        if not self.built:
+            self.rebuild(db)
+
+        with self._lock:
+            self._expire(datetime.utcnow().date())
+
+            if self.n < self.min_days:
+                return {
+                    "error": "Insufficient data for forecasting",
+                    "message": f"Need at least {self.min_days} days of sales data"
+                }
+
+            slope, intercept, r2_score = self._fit()
+            last_x = self._x(next(reversed(self.buckets)))
+
+        predictions = [
+            intercept + slope * (last_x + i) for i in range(1, days_ahead + 1)
+        ]
+
+        return {
+            "forecast_days": days_ahead,
+            "predicted_revenue": float(sum(predictions)),
+            "daily_predictions": [
+                {
+                    "day": i + 1,
+                    "date": (datetime.utcnow() + timedelta(days=i + 1)).strftime("%Y-%m-%d"),
+                    "predicted_revenue": float(pred)
+                }
+                for i, pred in enumerate(predictions)
+            ],
+            "confidence": "high" if r2_score > 0.7 else "medium" if r2_score > 0.4 else "low",
+            "accuracy_score": float(r2_score),
+            "trend": "increasing" if predictions[-1] > predictions[0] else "decreasing"
+        }
+
+# Singleton instance
+revenue_forecaster = RevenueForecaster()
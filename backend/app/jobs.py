@@ -0,0 +1,320 @@
+"""
+In-process background jobs for heavy analytics.
+
+Jobs are rows in the jobs table so their status and results survive the
+request that created them. A small pool of worker threads pulls job ids from
+a priority queue, runs the registered task with its own database session and
+stores the JSON result. Cancellation is immediate for queued jobs and
+cooperative for running ones (tasks call ctx.check_cancelled()).
+
+A cron-like scheduler submits registered tasks on a schedule, e.g. nightly
+precomputation.
+"""
+
+import json
+import os
+import queue
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from . import models
+from .database import SessionLocal
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """Handed to running tasks so they can stop early when cancelled"""
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+
+    def check_cancelled(self):
+        db = SessionLocal()
+        try:
+            cancelled = db.query(models.Job.cancel_requested).filter(
+                models.Job.id == self.job_id
+            ).scalar()
+        finally:
+            db.close()
+        if cancelled:
+            raise JobCancelled()
+
+
+def _cron_field(spec: str, low: int, high: int) -> set:
+    """Expand one cron field (*, */n, a-b, a-b/n, a,b) into a set of values"""
+    values = set()
+    for part in spec.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/")
+            step = int(step_text)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(v) for v in part.split("-"))
+        else:
+            start = end = int(part)
+        if start < low or end > high:
+            raise ValueError(f"Cron value out of range: {spec}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """Standard five-field cron expression: minute hour day month weekday (0=Sunday)
+
+    As in cron, when both day and weekday are restricted (neither starts with
+    *) a day matches if it matches either field: "0 3 1 * 1" runs on the 1st
+    and on every Monday.
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError("Cron expression needs 5 fields")
+        self.expression = expression
+        self.minutes = _cron_field(fields[0], 0, 59)
+        self.hours = _cron_field(fields[1], 0, 23)
+        self.days = _cron_field(fields[2], 1, 31)
+        self.months = _cron_field(fields[3], 1, 12)
+        self.weekdays = {d % 7 for d in _cron_field(fields[4], 0, 7)}
+        self.any_day = fields[2].startswith("*")
+        self.any_weekday = fields[4].startswith("*")
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.isoweekday() % 7) in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def matches(self, moment: datetime) -> bool:
+        return (
+            moment.minute in self.minutes
+            and moment.hour in self.hours
+            and moment.month in self.months
+            and self._day_matches(moment)
+        )
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # A year of minutes bounds the search for any valid expression
+        for _ in range(366 * 24 * 60):
+            if self.matches(candidate):
+                return candidate
+            candidate += timedelta(minutes=1)
+        raise ValueError(f"Cron expression never fires: {self.expression}")
+
+
+class JobRunner:
+    """Worker pool, priority queue and scheduler for registered tasks"""
+
+    def __init__(self, workers: int = 2):
+        self.workers = workers
+        self.tasks: Dict[str, Callable] = {}
+        self.schedules: List[Dict] = []
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+
+    # Registration
+    def task(self, name: str):
+        """Decorator registering fn(db, params, ctx) as a job task"""
+        def register(fn: Callable):
+            self.tasks[name] = fn
+            return fn
+        return register
+
+    def schedule(self, name: str, cron: str, task: str, params: Optional[Dict] = None, priority: int = 8):
+        self.schedules.append({
+            "name": name,
+            "cron": CronSchedule(cron),
+            "task": task,
+            "params": params or {},
+            "priority": priority,
+            "next_run": None
+        })
+
+    # Submission
+    def _enqueue(self, job_id: int, priority: int):
+        with self._lock:
+            self._sequence += 1
+            self._queue.put((priority, self._sequence, job_id))
+
+    def submit(self, task: str, params: Optional[Dict] = None, priority: int = 5,
+               scheduled_by: Optional[str] = None) -> models.Job:
+        if task not in self.tasks:
+            raise ValueError(f"Unknown task: {task}")
+        db = SessionLocal()
+        try:
+            job = models.Job(
+                task=task,
+                params=json.dumps(params or {}),
+                priority=priority,
+                scheduled_by=scheduled_by
+            )
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            db.expunge(job)
+        finally:
+            db.close()
+        self._enqueue(job.id, priority)
+        return job
+
+    def submit_response(self, task: str, params: Optional[Dict] = None, priority: int = 5) -> JSONResponse:
+        """202 response for endpoints called with ?async=true"""
+        job = self.submit(task, params, priority)
+        return JSONResponse(status_code=202, content={
+            "job_id": job.id,
+            "task": job.task,
+            "status": job.status.value,
+            "status_url": f"/jobs/{job.id}"
+        })
+
+    def cancel(self, db: Session, job_id: int) -> Optional[models.Job]:
+        job = db.query(models.Job).filter(models.Job.id == job_id).first()
+        if not job:
+            return None
+        if job.status == models.JobStatus.QUEUED:
+            # The worker skips it when it comes off the queue
+            job.status = models.JobStatus.CANCELLED
+            job.finished_at = datetime.utcnow()
+        elif job.status == models.JobStatus.RUNNING:
+            job.cancel_requested = True
+        db.commit()
+        db.refresh(job)
+        return job
+
+    # Execution
+    def _claim(self, db: Session, job_id: int) -> Optional[models.Job]:
+        claimed = db.query(models.Job).filter(
+            models.Job.id == job_id,
+            models.Job.status == models.JobStatus.QUEUED
+        ).update(
+            {models.Job.status: models.JobStatus.RUNNING, models.Job.started_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+        db.commit()
+        if not claimed:
+            return None
+        return db.query(models.Job).filter(models.Job.id == job_id).first()
+
+    def _run(self, job_id: int):
+        db = SessionLocal()
+        try:
+            job = self._claim(db, job_id)
+            if job is None:
+                return
+            task = self.tasks[job.task]
+            params = json.loads(job.params or "{}")
+            try:
+                result = task(db, params, JobContext(job_id))
+                status, error = models.JobStatus.SUCCEEDED, None
+                payload = json.dumps(jsonable_encoder(result))
+            except JobCancelled:
+                db.rollback()
+                status, error, payload = models.JobStatus.CANCELLED, None, None
+            except Exception:
+                db.rollback()
+                status, error, payload = models.JobStatus.FAILED, traceback.format_exc(), None
+            db.query(models.Job).filter(models.Job.id == job_id).update({
+                models.Job.status: status,
+                models.Job.result: payload,
+                models.Job.error: error,
+                models.Job.finished_at: datetime.utcnow()
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _worker(self):
+        while not self._stop.is_set():
+            try:
+                _, _, job_id = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    def _scheduler(self):
+        for entry in self.schedules:
+            entry["next_run"] = entry["cron"].next_after(datetime.utcnow())
+        while not self._stop.wait(15):
+            now = datetime.utcnow()
+            for entry in self.schedules:
+                if entry["next_run"] <= now:
+                    self.submit(entry["task"], entry["params"], entry["priority"], scheduled_by=entry["name"])
+                    entry["next_run"] = entry["cron"].next_after(now)
+
+    def start(self, scheduler: bool = True):
+        if self._threads:
+            return
+        self._stop.clear()
+        self._recover()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if scheduler and self.schedules:
+            thread = threading.Thread(target=self._scheduler, name="job-scheduler", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _recover(self):
+        """Requeue jobs left queued by a previous process and fail interrupted ones"""
+        db = SessionLocal()
+        try:
+            db.query(models.Job).filter(
+                models.Job.status == models.JobStatus.RUNNING
+            ).update({
+                models.Job.status: models.JobStatus.FAILED,
+                models.Job.error: "Interrupted by server restart",
+                models.Job.finished_at: datetime.utcnow()
+            }, synchronize_session=False)
+            db.commit()
+            queued = db.query(models.Job.id, models.Job.priority).filter(
+                models.Job.status == models.JobStatus.QUEUED
+            ).order_by(models.Job.id).all()
+        finally:
+            db.close()
+        for job_id, priority in queued:
+            self._enqueue(job_id, priority)
+
+    def describe(self, job: models.Job, include_result: bool = True) -> Dict[str, Any]:
+        data = {
+            "job_id": job.id,
+            "task": job.task,
+            "params": json.loads(job.params or "{}"),
+            "priority": job.priority,
+            "status": job.status.value,
+            "cancel_requested": job.cancel_requested,
+            "scheduled_by": job.scheduled_by,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+            "error": job.error
+        }
+        if include_result:
+            data["result"] = json.loads(job.result) if job.result else None
+        return data
+
+# Singleton instance
+job_runner = JobRunner(workers=int(os.getenv("JOB_WORKERS", "2")))
@@ -1,9 +1,24 @@
+import os
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import text
 
-from .database import engine
+from .database import engine, SessionLocal
 from . import models
-from .routers import products, analytics, sales, advanced_analytics, barcode, suppliers
+from .routers import products, analytics, sales, advanced_analytics, barcode, suppliers, jobs, stores, reservations, sync, debug, archive
+from .jobs import job_runner
+from .reservations import reservation_manager
+from .sync import edge_syncer
+from .admission import AdmissionMiddleware, admission_controller
+from .metrics import MetricsMiddleware, registry
+from .profiling import ProfilingMiddleware
+from .memory import memory_accountant
+from .forecasting import revenue_forecaster
+from .anomaly import anomaly_detector
+from .top_sellers import top_sellers
+from . import tasks  # registers background job tasks and schedules
 
 # Create tables
 models.Base.metadata.create_all(bind=engine)
@@ -16,6 +31,9 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Admission control - added before CORS so rejections still carry CORS headers
+app.add_middleware(AdmissionMiddleware)
+
 # CORS middleware - configure for production
 app.add_middleware(
     CORSMiddleware,
@@ -31,6 +49,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in request profiling (X-Profile-Token or PROFILE_SAMPLE_RATE)
+app.add_middleware(ProfilingMiddleware)
+
+# Metrics outermost, so latency includes admission queueing and rejections are counted
+app.add_middleware(MetricsMiddleware)
+
 # Include all routers
 app.include_router(products.router)
 app.include_router(analytics.router)
@@ -38,6 +62,27 @@ app.include_router(sales.router)
 app.include_router(advanced_analytics.router)
 app.include_router(barcode.router)
 app.include_router(suppliers.router)
+app.include_router(jobs.router)
+app.include_router(stores.router)
+app.include_router(reservations.router)
+app.include_router(sync.router)
+app.include_router(debug.router)
+app.include_router(archive.router)
+
+# Background job workers (set JOB_SCHEDULER=0 on all but one instance)
+@app.on_event("startup")
+def start_job_runner():
+    job_runner.start(scheduler=os.getenv("JOB_SCHEDULER", "1") == "1")
+    reservation_manager.start()
+    edge_syncer.start()  # only when EDGE_NODE_ID and CENTRAL_URL are set
+    memory_accountant.start()  # only when a memory limit is configured
+
+@app.on_event("shutdown")
+def stop_job_runner():
+    job_runner.stop()
+    reservation_manager.stop()
+    edge_syncer.stop()
+    memory_accountant.stop()
 
 # Health check endpoints
 @app.get("/")
@@ -56,17 +101,48 @@ def root():
             "Anomaly Detection",
             "Barcode Scanning",
             "Supplier Management",
-            "Purchase Orders"
+            "Purchase Orders",
+            "Background Jobs",
+            "Multi-Store Inventory",
+            "Reservation Holds",
+            "Offline Edge Sync"
         ]
     }
 
 @app.get("/health")
 def health_check():
-    return {
-        "status": "ok",
-        "database": "connected",
-        "ml_models": "loaded"
-    }
+    """Database round trip and streaming model state; 503 if the database is unreachable"""
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+        database = {"status": "connected", "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+    except Exception as e:
+        database = {"status": "error", "error": str(e)}
+    finally:
+        db.close()
+    
+    healthy = database["status"] == "connected"
+    return JSONResponse(status_code=200 if healthy else 503, content={
+        "status": "ok" if healthy else "degraded",
+        "database": database,
+        # Streaming models build lazily on first use, so "cold" is not an error
+        "ml_models": {
+            "revenue_forecast": "warm" if revenue_forecaster.built else "cold",
+            "anomaly_detector": "warm" if anomaly_detector.built else "cold",
+            "top_sellers": "warm" if top_sellers.built else "cold"
+        }
+    })
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus metrics: request latency, SQL usage, ML timings, memory, admission and single-flight"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admission")
+def admission_stats():
+    """Concurrency, queueing and rejection counters per route class"""
+    return admission_controller.snapshot()
 
 @app.get("/api-info")
 def api_info():
@@ -81,6 +157,13 @@ def api_info():
             "advanced_analytics": "/advanced-analytics",
             "barcode": "/barcode",
             "suppliers": "/suppliers",
+            "jobs": "/jobs",
+            "stores": "/stores",
+            "reservations": "/reservations",
+            "sync": "/sync",
+            "metrics": "/metrics",
+            "debug": "/debug",
+            "archive": "/archive",
             "documentation": "/docs",
             "alternative_docs": "/redoc"
         }
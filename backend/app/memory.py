@@ -0,0 +1,337 @@
+"""
+Memory accounting for the API process.
+
+Reports resident memory (RSS), the top allocation sites from tracemalloc and
+the estimated size of every in-process consumer: the fitted scikit-learn
+estimators and the in-memory caches (search index, facets, top sellers,
+streaming anomaly detector, revenue forecaster, request profiles).
+
+Each consumer may have a byte limit, MEMORY_LIMIT_<NAME> (e.g.
+MEMORY_LIMIT_SEARCH_INDEX=64MB). A consumer over its limit is evicted: caches
+are dropped and rebuild lazily from the database on next use, fitted models
+are replaced by unfitted copies (every call refits them). MEMORY_RSS_LIMIT
+evicts the largest consumers first until the process is back under it. A
+guard thread checks limits every MEMORY_CHECK_SECONDS (0 disables it).
+
+tracemalloc costs CPU and memory on every allocation, so it is off unless
+TRACEMALLOC_FRAMES is set or it is switched on through /debug/memory.
+"""
+
+import gc
+import itertools
+import os
+import sys
+import threading
+import tracemalloc
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import numpy as np
+from .metrics import Counter, Gauge, Metric, registry
+
+SIZE_UNITS = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+SAMPLE_ITEMS = 200  # container items measured before extrapolating
+TREE_NODE_BYTES = 64  # one node of a fitted sklearn tree, excluding its value array
+
+
+def parse_size(value: Optional[str]) -> Optional[int]:
+    """'512MB', '512M', '2GB', '65536' -> bytes; empty -> None"""
+    if not value or not value.strip():
+        return None
+    value = value.strip().upper()
+    if value[-1] in "KMG":
+        value += "B"
+    for suffix, factor in SIZE_UNITS.items():
+        if value.endswith(suffix):
+            return int(float(value[:-len(suffix)]) * factor)
+    return int(float(value.rstrip("B")))
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size; peak RSS where /proc is unavailable"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+# Size estimates
+
+def approx_size(obj, _seen: Optional[set] = None) -> int:
+    """Deep size of an object graph; large containers are sampled and extrapolated"""
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return sys.getsizeof(obj) if obj.base is not None else obj.nbytes + 112
+    if isinstance(obj, (str, bytes, int, float, bool, type(None), datetime)):
+        return sys.getsizeof(obj)
+    if isinstance(obj, (threading.Thread, type(threading.Lock()), type(threading.RLock()),
+                        threading.Event, threading.Condition)):
+        return 0
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        items = [item for pair in itertools.islice(obj.items(), SAMPLE_ITEMS) for item in pair]
+        total = len(obj) * 2
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        items = list(itertools.islice(obj, SAMPLE_ITEMS))
+        total = len(obj)
+    else:
+        attributes = getattr(obj, "__dict__", None)
+        if attributes is None:
+            return size
+        return size + approx_size(attributes, seen)
+
+    if items:
+        measured = sum(approx_size(item, seen) for item in items)
+        size += int(measured * total / len(items))
+    return size
+
+
+def estimator_bytes(estimator) -> int:
+    """Fitted size of a scikit-learn estimator: tree nodes, ensembles and arrays"""
+    tree = getattr(estimator, "tree_", None)
+    if tree is not None:
+        return tree.node_count * TREE_NODE_BYTES + tree.value.nbytes
+    size = sum(estimator_bytes(member) for member in getattr(estimator, "estimators_", None) or [])
+    for value in vars(estimator).values():
+        if isinstance(value, np.ndarray):
+            size += value.nbytes
+    return size
+
+
+def locked_size(obj) -> int:
+    """approx_size taken under the object's own lock, so writers cannot resize it mid-walk"""
+    lock = getattr(obj, "_lock", None)
+    if lock is None:
+        return approx_size(obj)
+    with lock:
+        return approx_size(obj)
+
+
+# Accounting
+
+@dataclass
+class Consumer:
+    name: str
+    size: Callable[[], int]
+    evict: Optional[Callable[[], None]]
+    limit: Optional[int] = None
+    evictions: int = 0
+    last_evicted_at: Optional[datetime] = None
+
+
+class MemoryAccountant:
+    """Registry of memory consumers, their limits and evictions"""
+
+    def __init__(self, rss_limit: Optional[int] = None, check_seconds: float = 60.0, trace_frames: int = 0):
+        self.rss_limit = rss_limit
+        self.check_seconds = check_seconds
+        self.consumers: Dict[str, Consumer] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        if trace_frames:
+            self.start_tracing(trace_frames)
+
+    def register(self, name: str, size: Callable[[], int], evict: Optional[Callable[[], None]] = None):
+        limit = parse_size(os.getenv(f"MEMORY_LIMIT_{name.upper()}"))
+        self.consumers[name] = Consumer(name, size, evict, limit)
+
+    def sizes(self) -> Dict[str, int]:
+        out = {}
+        for name, consumer in self.consumers.items():
+            try:
+                out[name] = int(consumer.size())
+            except Exception:
+                out[name] = 0  # mid-rebuild or not yet fitted
+        return out
+
+    def evict(self, name: str, reason: str = "manual") -> Dict:
+        consumer = self.consumers.get(name)
+        if consumer is None:
+            raise KeyError(name)
+        if consumer.evict is None:
+            return {"consumer": name, "evicted": False, "reason": "not evictable"}
+        try:
+            before = int(consumer.size())
+        except Exception:
+            before = 0
+        consumer.evict()
+        gc.collect()
+        with self._lock:
+            consumer.evictions += 1
+            consumer.last_evicted_at = datetime.utcnow()
+        return {"consumer": name, "evicted": True, "reason": reason, "freed_bytes_estimate": before}
+
+    def enforce(self) -> List[Dict]:
+        """Evict consumers over their own limit, then the largest ones while RSS is over its limit"""
+        actions = []
+        sizes = self.sizes()
+        for name, consumer in self.consumers.items():
+            if consumer.limit is not None and sizes[name] > consumer.limit:
+                actions.append(self.evict(name, reason=f"over limit ({sizes[name]} > {consumer.limit} bytes)"))
+                sizes[name] = 0
+
+        if self.rss_limit is not None:
+            candidates = sorted(
+                (name for name, consumer in self.consumers.items() if consumer.evict and sizes[name]),
+                key=lambda n: sizes[n], reverse=True
+            )
+            # The allocator keeps some freed pages, so RSS can stay high after an eviction;
+            # at worst every evictable consumer is dropped
+            for name in candidates:
+                rss = rss_bytes()
+                if rss is None or rss <= self.rss_limit:
+                    break
+                actions.append(self.evict(name, reason=f"rss over limit ({rss} > {self.rss_limit} bytes)"))
+        return actions
+
+    # tracemalloc
+
+    def start_tracing(self, frames: int = 1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._baseline = tracemalloc.take_snapshot()
+
+    def stop_tracing(self):
+        self._baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def top_allocators(self, limit: int = 20, diff: bool = False) -> Optional[List[Dict]]:
+        """Allocation sites holding the most memory, or growing fastest since tracing started"""
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        if diff and self._baseline is not None:
+            stats = snapshot.compare_to(self._baseline, "lineno")[:limit]
+            return [
+                {"location": str(s.traceback), "size_bytes": s.size, "size_diff_bytes": s.size_diff,
+                 "count": s.count, "count_diff": s.count_diff}
+                for s in stats
+            ]
+        return [
+            {"location": str(s.traceback), "size_bytes": s.size, "count": s.count}
+            for s in snapshot.statistics("lineno")[:limit]
+        ]
+
+    # Reporting
+
+    def report(self, top: int = 20, diff: bool = False) -> Dict:
+        sizes = self.sizes()
+        traced = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None
+        return {
+            "rss_bytes": rss_bytes(),
+            "rss_limit_bytes": self.rss_limit,
+            "estimated_total_bytes": sum(sizes.values()),
+            "consumers": [
+                {
+                    "name": name,
+                    "estimated_bytes": sizes[name],
+                    "limit_bytes": consumer.limit,
+                    "evictable": consumer.evict is not None,
+                    "evictions": consumer.evictions,
+                    "last_evicted_at": consumer.last_evicted_at
+                }
+                for name, consumer in sorted(self.consumers.items(), key=lambda c: sizes[c[0]], reverse=True)
+            ],
+            "tracemalloc": {
+                "enabled": traced is not None,
+                "traced_bytes": traced[0] if traced else None,
+                "peak_traced_bytes": traced[1] if traced else None,
+                "top_allocators": self.top_allocators(top, diff)
+            }
+        }
+
+    # Guard thread
+
+    def _guard(self):
+        while not self._stop.wait(self.check_seconds):
+            try:
+                self.enforce()
+            except Exception:
+                pass  # a consumer failed to size or evict; try again next round
+
+    def start(self):
+        has_limits = self.rss_limit is not None or any(c.limit is not None for c in self.consumers.values())
+        if not self.check_seconds or not has_limits or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._guard, name="memory-guard", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+# Singleton instance
+memory_accountant = MemoryAccountant(
+    rss_limit=parse_size(os.getenv("MEMORY_RSS_LIMIT")),
+    check_seconds=float(os.getenv("MEMORY_CHECK_SECONDS", "60")),
+    trace_frames=int(os.getenv("TRACEMALLOC_FRAMES", "0"))
+)
+
+
+def _register_consumers():
+    from .advanced_ml import advanced_analytics
+    from .anomaly import anomaly_detector
+    from .facets import catalog_facets
+    from .forecasting import revenue_forecaster
+    from .ml_model import stock_predictor
+    from .profiling import request_profiler
+    from .search import product_search_index
+    from .top_sellers import top_sellers
+
+    register = memory_accountant.register
+    register("demand_model", lambda: estimator_bytes(advanced_analytics.demand_model),
+             lambda: advanced_analytics.release_model("demand_model"))
+    register("anomaly_model", lambda: estimator_bytes(advanced_analytics.anomaly_detector),
+             lambda: advanced_analytics.release_model("anomaly_detector"))
+    register("price_model", lambda: estimator_bytes(advanced_analytics.price_optimizer))
+    register("stock_predictor", lambda: estimator_bytes(stock_predictor.model))
+    register("search_index", lambda: locked_size(product_search_index), product_search_index.evict)
+    register("catalog_facets", lambda: locked_size(catalog_facets), catalog_facets.evict)
+    register("top_sellers", lambda: locked_size(top_sellers), top_sellers.evict)
+    register("anomaly_detector", lambda: locked_size(anomaly_detector), anomaly_detector.evict)
+    register("revenue_forecaster", lambda: locked_size(revenue_forecaster), revenue_forecaster.evict)
+    register("request_profiles", lambda: locked_size(request_profiler), request_profiler.clear)
+
+_register_consumers()
+
+
+def _memory_metrics() -> List[Metric]:
+    resident = Gauge("process_resident_memory_bytes", "Resident memory of the API process")
+    rss = rss_bytes()
+    if rss is not None:
+        resident.set(rss)
+    estimated = Gauge("memory_estimated_bytes", "Estimated size of in-process caches and models", ("consumer",))
+    limits = Gauge("memory_limit_bytes", "Configured byte limit per consumer", ("consumer",))
+    evictions = Counter("memory_evictions_total", "Evictions per consumer", ("consumer",))
+    for name, size in memory_accountant.sizes().items():
+        consumer = memory_accountant.consumers[name]
+        estimated.set(size, consumer=name)
+        if consumer.limit is not None:
+            limits.set(consumer.limit, consumer=name)
+        evictions.inc(consumer.evictions, consumer=name)
+    return [resident, estimated, limits, evictions]
+
+registry.add_collector(_memory_metrics)
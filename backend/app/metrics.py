@@ -0,0 +1,320 @@
+"""
+Request, SQL and ML instrumentation exposed in Prometheus text format.
+
+MetricsMiddleware times every request under its route template (so
+/products/42 and /products/7 share one series) and status code, and keeps
+an in-flight gauge. SQLAlchemy cursor events count statements and their time
+both globally and against the request that issued them; the per-request
+tally lives in a context variable, which FastAPI copies into the threadpool
+running sync endpoints. ml_timer wraps model fit/predict calls. Admission
+and single-flight counters are read at scrape time.
+"""
+
+import abc
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+from .admission import admission_controller
+from .singleflight import single_flight
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 500)
+ML_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(abc.ABC):
+    """A named family of labelled series"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        """(sample name, labels, value) for every series"""
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # labels -> [bucket counts..., sum, count]
+        self._series: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                out.append((f"{self.name}_bucket", key + (("le", _format_value(bound)),), cumulative))
+            out.append((f"{self.name}_sum", key, series[-2]))
+            out.append((f"{self.name}_count", key, series[-1]))
+        return out
+
+
+class MetricsRegistry:
+    """Holds metrics and scrape-time collectors and renders them as text"""
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], Iterable[Metric]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Metric]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        metrics = list(self._metrics)
+        for collector in self._collectors:
+            metrics.extend(collector())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+# Singleton instance
+registry = MetricsRegistry()
+
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Requests currently being served"
+))
+http_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route template and status",
+    ("method", "route", "status")
+))
+http_db_statements = registry.register(Histogram(
+    "http_request_db_statements", "SQL statements issued per request",
+    ("method", "route"), COUNT_BUCKETS
+))
+http_db_seconds = registry.register(Histogram(
+    "http_request_db_seconds", "Time spent in SQL per request",
+    ("method", "route"), LATENCY_BUCKETS
+))
+db_statement_duration = registry.register(Histogram(
+    "db_statement_duration_seconds", "SQL statement latency (requests and background work)",
+    ("operation",), SQL_BUCKETS
+))
+ml_duration = registry.register(Histogram(
+    "ml_duration_seconds", "Model fit/predict durations", ("model", "operation"), ML_BUCKETS
+))
+
+
+# SQL instrumentation
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "ROLLBACK"}
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """Statement tally of the request being served, if any"""
+    return _request_stats.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["metrics_started"].pop()
+    elapsed = time.perf_counter() - started
+    operation = statement.lstrip()[:8].split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    db_statement_duration.observe(elapsed, operation=operation if operation in SQL_OPERATIONS else "OTHER")
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("metrics_started"):
+        connection.info["metrics_started"].pop()
+
+
+# ML instrumentation
+
+@contextmanager
+def ml_timer(model: str, operation: str):
+    """Record how long a model fit or predict call takes"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        ml_duration.observe(time.perf_counter() - started, model=model, operation=operation)
+
+
+# Request instrumentation
+
+def route_template(scope: Scope) -> str:
+    """The matched route's path template, or "unmatched" (keeps label cardinality bounded)"""
+    app = scope.get("app")
+    routes = getattr(getattr(app, "router", None), "routes", [])
+    endpoint = scope.get("endpoint")
+    for route in routes:
+        if endpoint is not None:
+            if getattr(route, "endpoint", None) is endpoint:
+                return route.path
+        elif route.matches(scope)[0] == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and SQL usage per route"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec()
+            _request_stats.reset(token)
+            method, route = scope["method"], route_template(scope)
+            http_duration.observe(elapsed, method=method, route=route, status=status)
+            http_db_statements.observe(stats.statements, method=method, route=route)
+            http_db_seconds.observe(stats.db_seconds, method=method, route=route)
+
+
+# Scrape-time collectors
+
+def _admission_metrics() -> List[Metric]:
+    snapshot = admission_controller.snapshot()
+    in_flight = Gauge("admission_in_flight", "Admitted requests being served per route class", ("route_class",))
+    queued = Gauge("admission_queue_depth", "Requests waiting for admission per route class", ("route_class",))
+    outcomes = Counter("admission_requests_total", "Admission decisions per route class", ("route_class", "outcome"))
+    for name, c in snapshot["classes"].items():
+        in_flight.set(c["in_flight"], route_class=name)
+        queued.set(c["queue_depth"], route_class=name)
+        for outcome in ("admitted", "queued", "rejected_queue_full", "rejected_deadline"):
+            outcomes.inc(c.get(outcome, 0), route_class=name, outcome=outcome)
+    return [in_flight, queued, outcomes]
+
+
+def _single_flight_metrics() -> List[Metric]:
+    snapshot = single_flight.snapshot()
+    calls = Counter("singleflight_requests_total", "Coalescable GETs executed or coalesced", ("route", "result"))
+    for route, counts in snapshot["routes"].items():
+        calls.inc(counts["executed"], route=route, result="executed")
+        calls.inc(counts["coalesced"], route=route, result="coalesced")
+    in_flight = Gauge("singleflight_in_flight", "Coalescable computations in progress")
+    in_flight.set(snapshot["in_flight"])
+    return [calls, in_flight]
+
+registry.add_collector(_admission_metrics)
+registry.add_collector(_single_flight_metrics)
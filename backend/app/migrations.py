@@ -0,0 +1,308 @@
+"""
+Versioned schema migrations.
+
+Each Migration has an up step, an optional down step and a version number;
+applied versions are recorded in schema_migrations. Migrations run in order,
+each in its own transaction, except non-transactional ones (index builds with
+CREATE INDEX CONCURRENTLY on PostgreSQL, which cannot run in a transaction
+and do not block writes). Steps are written to be idempotent, because
+create_all on a fresh database already creates what the models declare.
+
+check_index_usage() runs EXPLAIN on the hot queries (stock predictions and
+history, demand forecasts, purchase order lists) and reports whether each
+uses the index it relies on.
+
+Migration 4 range-partitions sales and stock_history by month on PostgreSQL
+(see app/partitions.py).
+
+Run through migrate_database.py.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, desc, func, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from . import models
+from .dialects import date_of
+
+ADVISORY_LOCK_ID = 7262049  # serializes concurrent migrators on PostgreSQL
+
+version_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# (index name, table, columns) for the hot query paths; also declared on the models
+HOT_QUERY_INDEXES = [
+    ("ix_stock_history_product_recorded", "stock_history", ("product_id", "recorded_at")),
+    ("ix_sales_product_sale_date", "sales", ("product_id", "sale_date")),
+    ("ix_purchase_orders_supplier_order_date", "purchase_orders", ("supplier_id", "order_date")),
+    ("ix_purchase_orders_status", "purchase_orders", ("status",)),
+]
+
+
+class MigrationError(Exception):
+    pass
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    up: Callable[[Connection], None]
+    down: Optional[Callable[[Connection], None]] = None
+    transactional: bool = True
+
+
+# Helpers
+
+def _columns(conn: Connection, table: str) -> List[str]:
+    inspector = inspect(conn)
+    if table not in inspector.get_table_names():
+        return []
+    return [column["name"] for column in inspector.get_columns(table)]
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str):
+    existing = _columns(conn, table)
+    if existing and column not in existing:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def create_index(conn: Connection, name: str, table: str, columns):
+    """CREATE INDEX, online on PostgreSQL (conn must be in autocommit mode there)"""
+    column_list = ", ".join(columns)
+    if conn.dialect.name == "postgresql":
+        # A failed concurrent build leaves an invalid index that IF NOT EXISTS would keep
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": name}).first()
+        if invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({column_list})"))
+    else:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column_list})"))
+
+
+def drop_index(conn: Connection, name: str):
+    concurrently = "CONCURRENTLY " if conn.dialect.name == "postgresql" else ""
+    conn.execute(text(f"DROP INDEX {concurrently}IF EXISTS {name}"))
+
+
+# Migrations
+
+def _baseline_up(conn: Connection):
+    """Columns added since the first release, then any missing tables"""
+    _add_column(conn, "products", "barcode", "VARCHAR UNIQUE")
+    _add_column(conn, "products", "sku", "VARCHAR UNIQUE")
+    _add_column(conn, "products", "reserved", "INTEGER NOT NULL DEFAULT 0")
+    for table in ("sales", "stock_history"):
+        columns = _columns(conn, table)
+        if columns and "store_id" not in columns:  # missing tables come from create_all below
+            _add_column(conn, table, "store_id", "INTEGER")
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_store_id ON {table} (store_id)"))
+    models.Base.metadata.create_all(bind=conn)
+
+
+def _trigram_up(conn: Connection):
+    if conn.dialect.name != "postgresql":
+        return  # other databases use the in-process search index
+    from .search import TRIGRAM_INDEXES
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    for ddl in TRIGRAM_INDEXES:
+        conn.execute(text(ddl))
+
+
+def _trigram_down(conn: Connection):
+    if conn.dialect.name == "postgresql":
+        for name in ("ix_products_name_trgm", "ix_products_sku_trgm", "ix_products_category_trgm"):
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def _hot_indexes_up(conn: Connection):
+    for name, table, columns in HOT_QUERY_INDEXES:
+        create_index(conn, name, table, columns)
+
+
+def _hot_indexes_down(conn: Connection):
+    for name, _, _ in HOT_QUERY_INDEXES:
+        drop_index(conn, name)
+
+
+def _partitions_up(conn: Connection):
+    from .partitions import partition_manager, partition_tables
+    models.ArchivedPartition.__table__.create(bind=conn, checkfirst=True)
+    partition_tables(conn, partition_manager.months_ahead)
+
+
+def _partitions_down(conn: Connection):
+    from .partitions import unpartition_tables
+    unpartition_tables(conn)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline columns and tables", _baseline_up),
+    Migration(2, "product search trigram indexes", _trigram_up, _trigram_down),
+    Migration(3, "composite indexes for hot queries", _hot_indexes_up, _hot_indexes_down, transactional=False),
+    Migration(4, "monthly partitions for sales and stock history", _partitions_up, _partitions_down),
+]
+
+
+# Runner
+
+class Migrator:
+    def __init__(self, engine: Engine, migrations: List[Migration] = MIGRATIONS):
+        self.engine = engine
+        self.migrations = sorted(migrations, key=lambda m: m.version)
+        versions = [m.version for m in self.migrations]
+        if len(set(versions)) != len(versions):
+            raise MigrationError("Duplicate migration versions")
+
+    def applied(self) -> Dict[int, datetime]:
+        version_metadata.create_all(bind=self.engine)
+        with self.engine.connect() as conn:
+            return {row.version: row.applied_at for row in conn.execute(select(schema_migrations))}
+
+    def status(self) -> List[Dict]:
+        applied = self.applied()
+        return [
+            {
+                "version": m.version,
+                "name": m.name,
+                "applied_at": applied.get(m.version),
+                "reversible": m.down is not None,
+                "online": not m.transactional,
+            }
+            for m in self.migrations
+        ]
+
+    def _run(self, migration: Migration, step: Callable[[Connection], None], record: Callable[[Connection], None]):
+        if migration.transactional:
+            with self.engine.begin() as conn:
+                step(conn)
+                record(conn)
+        else:
+            with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                step(conn)
+            with self.engine.begin() as conn:
+                record(conn)
+
+    def _locked(self, work):
+        if self.engine.dialect.name != "postgresql":
+            return work()
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock:
+            lock.execute(text("SELECT pg_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID})
+            try:
+                return work()
+            finally:
+                lock.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+
+    def upgrade(self, target: Optional[int] = None, log: Callable[[str], None] = print) -> List[int]:
+        """Apply pending migrations up to target (default: latest)"""
+        def work():
+            done = []
+            applied = self.applied()
+            for migration in self.migrations:
+                if migration.version in applied or (target is not None and migration.version > target):
+                    continue
+                log(f"  ↑ {migration.version:03d} {migration.name}")
+                self._run(migration, migration.up, lambda conn, m=migration: conn.execute(
+                    schema_migrations.insert().values(version=m.version, name=m.name, applied_at=datetime.utcnow())
+                ))
+                done.append(migration.version)
+            return done
+        return self._locked(work)
+
+    def downgrade(self, target: int, log: Callable[[str], None] = print) -> List[int]:
+        """Revert applied migrations above target, newest first"""
+        def work():
+            done = []
+            applied = self.applied()
+            pending = [m for m in reversed(self.migrations) if m.version in applied and m.version > target]
+            # Refuse up front rather than stopping halfway
+            for migration in pending:
+                if migration.down is None:
+                    raise MigrationError(f"Migration {migration.version} ({migration.name}) cannot be reverted")
+            for migration in pending:
+                log(f"  ↓ {migration.version:03d} {migration.name}")
+                self._run(migration, migration.down, lambda conn, m=migration: conn.execute(
+                    schema_migrations.delete().where(schema_migrations.c.version == m.version)
+                ))
+                done.append(migration.version)
+            return done
+        return self._locked(work)
+
+
+# Index usage check
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    prefix = "EXPLAIN QUERY PLAN " if compiler.dialect.name == "sqlite" else "EXPLAIN "
+    return prefix + compiler.process(element.statement, **kw)
+
+
+def hot_queries(db: Session, product_id: int = 1, supplier_id: int = 1):
+    """(label, expected index, query) for the queries the composite indexes serve"""
+    now = datetime.utcnow()
+    history = db.query(models.StockHistory).filter(
+        models.StockHistory.product_id == product_id,
+        models.StockHistory.store_id.is_(None),
+        models.StockHistory.recorded_at >= now - timedelta(days=30)
+    ).order_by(models.StockHistory.recorded_at)
+    return [
+        ("stock predictions / stock history", "ix_stock_history_product_recorded", history),
+        ("demand forecast", "ix_sales_product_sale_date", db.query(
+            date_of(models.Sale.sale_date).label("date"),
+            func.sum(models.Sale.quantity).label("quantity")
+        ).filter(
+            models.Sale.product_id == product_id,
+            models.Sale.sale_date >= now - timedelta(days=90)
+        ).group_by(date_of(models.Sale.sale_date)).order_by("date")),
+        ("purchase orders by supplier", "ix_purchase_orders_supplier_order_date", db.query(models.PurchaseOrder).filter(
+            models.PurchaseOrder.supplier_id == supplier_id
+        ).order_by(desc(models.PurchaseOrder.order_date)).limit(100)),
+        ("purchase orders by status", "ix_purchase_orders_status", db.query(models.PurchaseOrder).filter(
+            models.PurchaseOrder.status == models.PurchaseOrderStatus.PENDING
+        ).order_by(desc(models.PurchaseOrder.order_date)).limit(100)),
+    ]
+
+
+def _plan(db: Session, query) -> str:
+    rows = db.execute(Explain(query.statement)).all()
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def check_index_usage(engine: Engine) -> List[Dict]:
+    """EXPLAIN each hot query and report whether it uses its index
+
+    Small PostgreSQL tables are often cheaper to scan sequentially, so a
+    query that does not use its index is explained again with sequential
+    scans disabled; "forced" marks an index the planner can use but does
+    not prefer at the current table size.
+    """
+    results = []
+    with Session(bind=engine) as db:
+        for label, index, query in hot_queries(db):
+            plan = _plan(db, query)
+            used, forced = index in plan, False
+            if not used and engine.dialect.name == "postgresql":
+                db.execute(text("SET LOCAL enable_seqscan = off"))
+                plan = _plan(db, query)
+                db.rollback()
+                used = forced = index in plan
+            results.append({"query": label, "index": index, "uses_index": used, "forced": forced, "plan": plan})
+    return results
@@ -1,8 +1,12 @@
 from sklearn.linear_model import LinearRegression
+from sklearn.base import clone
 import numpy as np
+from collections import defaultdict
 from datetime import datetime, timedelta
+from typing import List
 from sqlalchemy.orm import Session
 from . import models
+from .metrics import ml_timer
 
 class StockPredictor:
     def __init__(self):
@@ -17,14 +21,21 @@ class StockPredictor:
         product = db.query(models.Product).filter(models.Product.id == product_id).first()
         if not product:
             return None
-        
-        # Get stock history for last 30 days
+        history = self._history_query(db).filter(models.StockHistory.product_id == product_id).all()
+        return self._predict(product, history)
+
+    @staticmethod
+    def _history_query(db: Session):
+        """Central stock history of the last 30 days (store rows track store stock)"""
         cutoff = datetime.utcnow() - timedelta(days=30)
-        history = db.query(models.StockHistory).filter(
-            models.StockHistory.product_id == product_id,
+        return db.query(models.StockHistory).filter(
+            models.StockHistory.store_id.is_(None),
             models.StockHistory.recorded_at >= cutoff
-        ).order_by(models.StockHistory.recorded_at).all()
-        
+        ).order_by(models.StockHistory.recorded_at)
+
+    def _predict(self, product: models.Product, history: List[models.StockHistory]):
+        """Stockout prediction from a product's history, oldest first"""
+        product_id = product.id
         if len(history) < 3:
             # Not enough data for prediction
             return {
@@ -32,7 +43,7 @@ class StockPredictor:
                 "product_name": product.name,
                 "current_stock": product.stock,
                 "predicted_days_until_stockout": None,
-                "reorder_recommended": product.stock <= product.reorder_level,
+                "reorder_recommended": product.stock <= (product.reorder_level or 0),
                 "predicted_stockout_date": None,
                 "confidence": "low",
                 "message": "Insufficient historical data for prediction"
@@ -44,21 +55,24 @@ class StockPredictor:
         X = np.array([[(h.recorded_at - start_date).days] for h in history])
         y = np.array([h.stock_level for h in history])
         
-        # Train model
-        self.model.fit(X, y)
+        # Train a fresh copy: concurrent requests must not fit the shared model
+        model = clone(self.model)
+        with ml_timer("stock_predictor", "fit"):
+            model.fit(X, y)
+        self.model = model
         
         # Calculate current day
         current_day = (datetime.utcnow() - start_date).days
         
         # Predict future stock levels
-        if self.model.coef_[0] >= 0:
+        if model.coef_[0] >= 0:
             # Stock is not decreasing, no stockout predicted
             return {
                 "product_id": product_id,
                 "product_name": product.name,
                 "current_stock": product.stock,
                 "predicted_days_until_stockout": None,
-                "reorder_recommended": product.stock <= product.reorder_level,
+                "reorder_recommended": product.stock <= (product.reorder_level or 0),
                 "predicted_stockout_date": None,
                 "confidence": "high",
                 "message": "Stock levels are stable or increasing"
@@ -66,12 +80,13 @@ class StockPredictor:
         
         # Find when stock will reach 0
         # y = mx + b, solve for x when y = 0
-        days_until_stockout = -self.model.intercept_ / self.model.coef_[0]
+        days_until_stockout = -model.intercept_ / model.coef_[0]
         days_remaining = days_until_stockout - current_day
         
         # Calculate R² score for confidence
         from sklearn.metrics import r2_score
-        predictions = self.model.predict(X)
+        with ml_timer("stock_predictor", "predict"):
+            predictions = model.predict(X)
         confidence_score = r2_score(y, predictions)
         confidence = "high" if confidence_score > 0.7 else "medium" if confidence_score > 0.4 else "low"
         
@@ -85,21 +100,20 @@ class StockPredictor:
             "product_name": product.name,
             "current_stock": product.stock,
             "predicted_days_until_stockout": round(days_remaining, 1),
-            "reorder_recommended": days_remaining < 14 or product.stock <= product.reorder_level,
+            "reorder_recommended": bool(days_remaining < 14 or product.stock <= (product.reorder_level or 0)),
             "predicted_stockout_date": stockout_date,
             "confidence": confidence,
-            "daily_depletion_rate": round(-self.model.coef_[0], 2)
+            "daily_depletion_rate": round(-model.coef_[0], 2)
         }
     
     def get_all_predictions(self, db: Session):
         """Get predictions for all products"""
         products = db.query(models.Product).all()
-        predictions = []
-        
-        for product in products:
-            pred = self.predict_stockout_date(db, product.id)
-            if pred:
-                predictions.append(pred)
+        # One history query for all products instead of one per product
+        history = defaultdict(list)
+        for entry in self._history_query(db):
+            history[entry.product_id].append(entry)
+        predictions = [self._predict(product, history[product.id]) for product in products]
         
         # Sort by days until stockout (urgent first)
         predictions.sort(key=lambda x: x.get("predicted_days_until_stockout") or float('inf'))
@@ -2,7 +2,7 @@
 Replace your entire backend/app/models.py with this file
 """
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, UniqueConstraint, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -16,6 +16,7 @@ class Product(Base):
     name = Column(String, nullable=False, index=True)
     category = Column(String, nullable=False, index=True)
     stock = Column(Integer, nullable=False, default=0)
+    reserved = Column(Integer, nullable=False, default=0, server_default="0")  # Held by active reservations
     price = Column(Float, nullable=False)
     reorder_level = Column(Integer, default=10)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -32,12 +33,15 @@ class Product(Base):
 # Sale Model
 class Sale(Base):
     __tablename__ = "sales"
+    # Per-product sales over a date range (demand forecasts, margins); see app/migrations.py
+    __table_args__ = (Index("ix_sales_product_sale_date", "product_id", "sale_date"),)
     
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     quantity = Column(Integer, nullable=False)
     total_amount = Column(Float, nullable=False)
     sale_date = Column(DateTime, default=datetime.utcnow, index=True)
+    store_id = Column(Integer, nullable=True, index=True)  # None = central stock
     
     # Relationships
     product = relationship("Product", back_populates="sales")
@@ -45,16 +49,51 @@ class Sale(Base):
 # Stock History Model
 class StockHistory(Base):
     __tablename__ = "stock_history"
+    __table_args__ = (Index("ix_stock_history_product_recorded", "product_id", "recorded_at"),)
     
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     stock_level = Column(Integer, nullable=False)
     action = Column(String)  # 'sale', 'restock', 'adjustment', 'initial'
     recorded_at = Column(DateTime, default=datetime.utcnow, index=True)
+    store_id = Column(Integer, nullable=True, index=True)  # None = central stock
     
     # Relationships
     product = relationship("Product", back_populates="stock_history")
 
+# Store Model
+class Store(Base):
+    __tablename__ = "stores"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String, unique=True, nullable=False, index=True)
+    name = Column(String, nullable=False)
+    # None = shared database, "schema:<name>" = PostgreSQL schema, otherwise a database URL
+    database_url = Column(String, nullable=True)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    @property
+    def storage(self):
+        if not self.database_url:
+            return "shared"
+        if self.database_url.startswith("schema:"):
+            return self.database_url
+        return "dedicated"
+
+# Per-store stock; store_id is not a foreign key because the row may live in
+# the store's own database
+class StoreInventory(Base):
+    __tablename__ = "store_inventory"
+    __table_args__ = (UniqueConstraint("store_id", "product_id", name="uq_store_inventory_store_product"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    store_id = Column(Integer, nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    stock = Column(Integer, nullable=False, default=0)
+    reorder_level = Column(Integer, default=10)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 # Supplier Model
 class Supplier(Base):
     __tablename__ = "suppliers"
@@ -84,6 +123,10 @@ class PurchaseOrderStatus(str, enum.Enum):
 # Purchase Order Model
 class PurchaseOrder(Base):
     __tablename__ = "purchase_orders"
+    __table_args__ = (
+        Index("ix_purchase_orders_supplier_order_date", "supplier_id", "order_date"),
+        Index("ix_purchase_orders_status", "status"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     supplier_id = Column(Integer, ForeignKey("suppliers.id"), nullable=False)
@@ -99,4 +142,113 @@ class PurchaseOrder(Base):
     
     # Relationships
     supplier = relationship("Supplier", back_populates="purchase_orders")
-    product = relationship("Product")
\ No newline at end of file
+    product = relationship("Product")
+# Price Suggestion Model (written by the catalog-wide pricing job)
+class PriceSuggestion(Base):
+    __tablename__ = "price_suggestions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, unique=True, index=True)
+    current_price = Column(Float, nullable=False)
+    suggested_price = Column(Float, nullable=False)
+    price_change_percentage = Column(Float, nullable=False)
+    reason = Column(String)
+    sales_velocity = Column(Float, nullable=False)
+    avg_quantity_per_sale = Column(Float, nullable=False)
+    elasticity = Column(Float, nullable=True)  # log-log slope of units vs price
+    computed_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    product = relationship("Product")
+
+# Background Job Status Enum
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+# Background Job Model
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    task = Column(String, nullable=False, index=True)
+    params = Column(Text, nullable=True)  # JSON
+    priority = Column(Integer, default=5)  # Lower runs first
+    status = Column(SQLEnum(JobStatus), default=JobStatus.QUEUED, index=True)
+    cancel_requested = Column(Boolean, default=False)
+    result = Column(Text, nullable=True)  # JSON
+    error = Column(Text, nullable=True)
+    scheduled_by = Column(String, nullable=True)  # Schedule entry name, if any
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+# Reservation Model (stock held for carts and online orders)
+class ReservationStatus(str, enum.Enum):
+    ACTIVE = "active"
+    CONFIRMED = "confirmed"
+    RELEASED = "released"
+    EXPIRED = "expired"
+
+class Reservation(Base):
+    __tablename__ = "reservations"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+    quantity = Column(Integer, nullable=False)
+    status = Column(SQLEnum(ReservationStatus), default=ReservationStatus.ACTIVE, index=True)
+    reference = Column(String, nullable=True, index=True)  # Cart or order id
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    resolved_at = Column(DateTime, nullable=True)
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=True)
+    
+    # Relationships
+    product = relationship("Product")
+    sale = relationship("Sale")
+
+# Outbox Model (edge mode: local sales and stock movements waiting to be
+# pushed to the central server, in id order)
+class OutboxEvent(Base):
+    __tablename__ = "sync_outbox"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(String, unique=True, nullable=False, index=True)
+    kind = Column(String, nullable=False)  # 'sale', 'restock', 'adjustment'
+    product_id = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    synced_at = Column(DateTime, nullable=True, index=True)
+    sync_status = Column(String, nullable=True)  # 'applied', 'conflict', 'rejected', 'duplicate'
+    sync_detail = Column(Text, nullable=True)  # JSON
+
+# Sync Receipt Model (central: one row per applied edge event, so replayed
+# batches are idempotent)
+class SyncReceipt(Base):
+    __tablename__ = "sync_receipts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(String, unique=True, nullable=False, index=True)
+    node = Column(String, nullable=False, index=True)
+    kind = Column(String, nullable=False)
+    product_id = Column(Integer, nullable=False)
+    event_at = Column(DateTime, nullable=False)
+    received_at = Column(DateTime, default=datetime.utcnow, index=True)
+    status = Column(String, nullable=False, index=True)  # 'applied', 'conflict', 'rejected'
+    detail = Column(Text, nullable=True)  # JSON
+
+# Archived monthly slice of sales / stock_history (see app/partitions.py)
+class ArchivedPartition(Base):
+    __tablename__ = "archived_partitions"
+    __table_args__ = (UniqueConstraint("table_name", "month", name="uq_archived_partitions_table_month"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    table_name = Column(String, nullable=False)
+    month = Column(String, nullable=False)  # 'YYYY-MM'
+    path = Column(String, nullable=False)  # gzip JSON lines, relative to ARCHIVE_DIR
+    row_count = Column(Integer, nullable=False)
+    sha256 = Column(String, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,404 @@
+"""
+Monthly partitioning and archival of sales and stock_history.
+
+Both tables only grow, while nearly every query reads the last 30-365 days.
+On PostgreSQL, migration 4 turns them into tables range-partitioned by month
+(sales_p2026_01, ...) plus a DEFAULT partition. Date-filtered queries then
+touch only the partitions they need. maintain() keeps PARTITION_MONTHS_AHEAD
+future partitions ready; rows that landed in the default partition are moved
+into a month's partition when it is created.
+
+SQLite has no partitioning. There a month is a date range of the single table,
+and the (product_id, date) indexes keep the date-filtered queries to the rows
+they need.
+
+archive() writes one table-month to ARCHIVE_DIR/<table>/<YYYY-MM>.jsonl.gz and
+removes it from the database (dropping the partition on PostgreSQL). The
+files are then the only copy, so ARCHIVE_DIR has no default and must point
+at durable storage (not an ephemeral container disk); archival is refused
+while it is unset.
+read_rows() serves ranges that mix live and archived months, and restore()
+loads a month back in. With ARCHIVE_AFTER_MONTHS set, the nightly maintenance
+job archives months older than that automatically.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+from sqlalchemy import DateTime, func, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from . import models
+from .dialects import dialect_name, month_of
+
+# table -> (model, partition key)
+PARTITIONED_TABLES = {
+    "sales": (models.Sale, "sale_date"),
+    "stock_history": (models.StockHistory, "recorded_at"),
+}
+
+
+class PartitionError(Exception):
+    pass
+
+
+# Months
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def parse_month(month: str) -> datetime:
+    try:
+        return datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        raise PartitionError(f"Month must be YYYY-MM, got {month!r}")
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def _table(table: str):
+    if table not in PARTITIONED_TABLES:
+        raise PartitionError(f"Unknown table {table!r}; one of {', '.join(PARTITIONED_TABLES)}")
+    return PARTITIONED_TABLES[table]
+
+
+# PostgreSQL DDL
+
+def is_partitioned(conn: Connection, table: str) -> bool:
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :table"
+    ), {"table": table}).first() is not None
+
+
+def _partition_exists(conn: Connection, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+
+def create_month_partition(conn: Connection, table: str, month: datetime) -> bool:
+    """Attach the partition for a month, moving any of its rows out of the default partition"""
+    name = partition_name(table, month)
+    if _partition_exists(conn, name):
+        return False
+    column = _table(table)[1]
+    bounds = {"start": month, "end": add_months(month, 1)}
+    # Built detached so rows can leave the default partition before ATTACH checks it
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {table}_default WHERE {column} >= :start AND {column} < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    conn.execute(text(
+        f"ALTER TABLE {table} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{bounds['start']:%Y-%m-%d}') TO ('{bounds['end']:%Y-%m-%d}')"
+    ))
+    return True
+
+
+def _rebuild_table(conn: Connection, table: str, partitioned: bool, months_ahead: int = 3):
+    """Copy a table into a partitioned (or plain) replacement with the same name, keys and indexes"""
+    model, column = _table(table)
+    old = f"{table}_{'unpartitioned' if partitioned else 'partitioned'}"
+    sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}).scalar()
+    referencing = [
+        fk for other in models.Base.metadata.tables.values() if other.name != table
+        for fk in other.foreign_keys if fk.column.table.name == table
+    ]
+
+    conn.execute(text(f"UPDATE {table} SET {column} = timezone('utc', now()) WHERE {column} IS NULL"))
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+    partition_by = f" PARTITION BY RANGE ({column})" if partitioned else ""
+    conn.execute(text(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS){partition_by}"))
+
+    if partitioned:
+        conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+        first = conn.execute(text(f"SELECT min({column}) FROM {old}")).scalar() or datetime.utcnow()
+        month, last = month_start(first), add_months(month_start(datetime.utcnow()), months_ahead)
+        while month <= last:
+            create_month_partition(conn, table, month)
+            month = add_months(month, 1)
+    conn.execute(text(f"INSERT INTO {table} SELECT * FROM {old}"))
+
+    # Foreign keys to a partitioned table would need the partition key; they are dropped and,
+    # on the way back, re-added NOT VALID (archived rows may be referenced)
+    conn.execute(text(
+        "DO $$ DECLARE c record; BEGIN FOR c IN SELECT conname, conrelid::regclass AS rel FROM pg_constraint "
+        f"WHERE contype = 'f' AND confrelid = '{old}'::regclass LOOP "
+        "EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', c.rel, c.conname); END LOOP; END $$"
+    ))
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+    conn.execute(text(f"DROP TABLE {old} CASCADE"))
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id"))
+
+    key = f"id, {column}" if partitioned else "id"
+    conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY ({key})"))
+    for index in model.__table__.indexes:
+        index.create(conn)
+    for fk in model.__table__.foreign_keys:
+        conn.execute(text(
+            f"ALTER TABLE {table} ADD FOREIGN KEY ({fk.parent.name}) "
+            f"REFERENCES {fk.column.table.name} ({fk.column.name})"
+        ))
+    if not partitioned:
+        for fk in referencing:
+            conn.execute(text(
+                f"ALTER TABLE {fk.parent.table.name} ADD FOREIGN KEY ({fk.parent.name}) "
+                f"REFERENCES {table} ({fk.column.name}) NOT VALID"
+            ))
+
+
+def partition_tables(conn: Connection, months_ahead: int = 3):
+    """Migration step: monthly range partitions on PostgreSQL (no-op elsewhere)"""
+    if conn.dialect.name != "postgresql":
+        return
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(conn, table):
+            _rebuild_table(conn, table, partitioned=True, months_ahead=months_ahead)
+
+
+def unpartition_tables(conn: Connection):
+    """Migration step: back to plain tables (archived months stay archived)"""
+    if conn.dialect.name != "postgresql":
+        return
+    for table in PARTITIONED_TABLES:
+        if is_partitioned(conn, table):
+            _rebuild_table(conn, table, partitioned=False)
+
+
+# Archive files
+
+def _encode(row: Dict) -> str:
+    return json.dumps({k: v.isoformat() if isinstance(v, datetime) else v for k, v in row.items()})
+
+
+def _decoder(model):
+    datetimes = {c.name for c in model.__table__.columns if isinstance(c.type, DateTime)}
+
+    def decode(line: str) -> Dict:
+        row = json.loads(line)
+        for name in datetimes:
+            if row.get(name):
+                row[name] = datetime.fromisoformat(row[name])
+        return row
+    return decode
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PartitionManager:
+    """Partition upkeep, archival and reads across live and archived months"""
+
+    def __init__(self, archive_dir: Optional[str] = None, months_ahead: int = 3, archive_after_months: int = 0):
+        self.archive_dir = archive_dir
+        self.months_ahead = months_ahead
+        self.archive_after_months = archive_after_months
+
+    def _path(self, relative: str) -> str:
+        if not self.archive_dir:
+            raise PartitionError("ARCHIVE_DIR is not set; point it at durable storage to archive")
+        return os.path.join(self.archive_dir, relative)
+
+    def months(self, db: Session, table: str) -> List[Dict]:
+        """Rows per month, live and archived, newest first"""
+        model, column_name = _table(table)
+        column = getattr(model, column_name)
+        month = month_of(db, column)
+        live = dict(db.query(month, func.count()).group_by(month).all())
+        archived = {
+            a.month: a for a in db.query(models.ArchivedPartition).filter(models.ArchivedPartition.table_name == table)
+        }
+        partitions = set()
+        if dialect_name(db) == "postgresql":
+            partitions = {name for (name,) in db.execute(text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :table"
+            ), {"table": table})}
+        out = []
+        for key in sorted(set(live) | set(archived), reverse=True):
+            if key is None:
+                continue
+            record = archived.get(key)
+            name = partition_name(table, parse_month(key))
+            out.append({
+                "month": key,
+                "live_rows": live.get(key, 0),
+                "partition": name if name in partitions else None,
+                "archived_rows": record.row_count if record else 0,
+                "archive_path": record.path if record else None,
+                "archived_at": record.archived_at if record else None,
+            })
+        return out
+
+    # Maintenance
+
+    def ensure_partitions(self, db: Session) -> List[str]:
+        """Create partitions from the current month to months_ahead (PostgreSQL)"""
+        created = []
+        conn = db.connection()
+        if conn.dialect.name != "postgresql":
+            return created
+        current = month_start(datetime.utcnow())
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(conn, table):
+                continue
+            for offset in range(self.months_ahead + 1):
+                month = add_months(current, offset)
+                if create_month_partition(conn, table, month):
+                    created.append(partition_name(table, month))
+        db.commit()
+        return created
+
+    def maintain(self, db: Session) -> Dict:
+        result = {"created_partitions": self.ensure_partitions(db), "archived": []}
+        if self.archive_after_months:
+            cutoff = add_months(month_start(datetime.utcnow()), -self.archive_after_months)
+            for table in PARTITIONED_TABLES:
+                for entry in self.months(db, table):
+                    month = parse_month(entry["month"])
+                    if month < cutoff and entry["live_rows"] and not entry["archive_path"]:
+                        result["archived"].append(self.archive(db, table, entry["month"]))
+        return result
+
+    # Archival
+
+    def archive(self, db: Session, table: str, month: str) -> Dict:
+        """Write a table-month to a compressed file, then remove it from the database"""
+        model, column_name = _table(table)
+        start = parse_month(month)
+        end = add_months(start, 1)
+        if start >= month_start(datetime.utcnow()):
+            raise PartitionError("Only past months can be archived")
+        if db.query(models.ArchivedPartition).filter_by(table_name=table, month=month).first():
+            raise PartitionError(f"{table} {month} is already archived; restore it first")
+
+        column = getattr(model, column_name)
+        relative = os.path.join(table, f"{month}.jsonl.gz")
+        path = self._path(relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        rows, max_id = 0, None
+        query = select(model.__table__).where(column >= start, column < end).order_by(column, model.id)
+        with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+            for row in db.execute(query.execution_options(yield_per=5000)).mappings():
+                f.write(_encode(dict(row)) + "\n")
+                rows += 1
+                max_id = row["id"] if max_id is None else max(max_id, row["id"])
+        if not rows:
+            os.remove(path + ".tmp")
+            raise PartitionError(f"{table} has no rows in {month}")
+        os.replace(path + ".tmp", path)
+
+        # Rows that arrive after the export (higher ids) stay live
+        deleted = db.query(model).filter(column >= start, column < end, model.id <= max_id).delete(
+            synchronize_session=False
+        )
+        conn = db.connection()
+        dropped = False
+        name = partition_name(table, start)
+        if conn.dialect.name == "postgresql" and _partition_exists(conn, name):
+            if not conn.execute(text(f"SELECT 1 FROM {name} LIMIT 1")).first():
+                conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                conn.execute(text(f"DROP TABLE {name}"))
+                dropped = True
+        record = models.ArchivedPartition(
+            table_name=table, month=month, path=relative, row_count=rows, sha256=_sha256(path)
+        )
+        db.add(record)
+        db.commit()
+        return {"table": table, "month": month, "rows": rows, "deleted": deleted,
+                "path": relative, "partition_dropped": dropped}
+
+    def _archived_rows(self, record: models.ArchivedPartition) -> Iterator[Dict]:
+        decode = _decoder(_table(record.table_name)[0])
+        with gzip.open(self._path(record.path), "rt", encoding="utf-8") as f:
+            for line in f:
+                yield decode(line)
+
+    def restore(self, db: Session, table: str, month: str) -> Dict:
+        """Load an archived month back into the database and delete its file"""
+        model, _ = _table(table)
+        record = db.query(models.ArchivedPartition).filter_by(table_name=table, month=month).first()
+        if not record:
+            raise PartitionError(f"{table} {month} is not archived")
+        path = self._path(record.path)
+        if _sha256(path) != record.sha256:
+            raise PartitionError(f"{record.path} does not match its checksum")
+
+        conn = db.connection()
+        if conn.dialect.name == "postgresql" and is_partitioned(conn, table):
+            create_month_partition(conn, table, parse_month(month))
+        batch, restored = [], 0
+        for row in self._archived_rows(record):
+            batch.append(row)
+            if len(batch) >= 5000:
+                db.execute(model.__table__.insert(), batch)
+                restored += len(batch)
+                batch = []
+        if batch:
+            db.execute(model.__table__.insert(), batch)
+            restored += len(batch)
+        db.delete(record)
+        db.commit()
+        os.remove(path)
+        return {"table": table, "month": month, "rows": restored}
+
+    # Reads
+
+    def read_rows(self, db: Session, table: str, start: datetime, end: datetime,
+                  product_id: Optional[int] = None, limit: int = 1000) -> Dict:
+        """Rows in [start, end) from live tables and archive files, oldest first"""
+        model, column_name = _table(table)
+        column = getattr(model, column_name)
+        query = db.query(model.__table__).filter(column >= start, column < end)
+        if product_id is not None:
+            query = query.filter(model.product_id == product_id)
+        # limit + 1 from each source tells whether the merged result was cut
+        rows = [{**row._asdict(), "source": "live"} for row in query.order_by(column, model.id).limit(limit + 1)]
+
+        archived = db.query(models.ArchivedPartition).filter(
+            models.ArchivedPartition.table_name == table,
+            models.ArchivedPartition.month >= f"{start:%Y-%m}",
+            models.ArchivedPartition.month <= f"{end:%Y-%m}"
+        ).order_by(models.ArchivedPartition.month).all()
+        for record in archived:
+            taken = 0
+            for row in self._archived_rows(record):
+                if start <= row[column_name] < end and (product_id is None or row["product_id"] == product_id):
+                    rows.append({**row, "source": "archive"})
+                    taken += 1
+                    if taken > limit:
+                        break
+
+        rows.sort(key=lambda r: (r[column_name], r["id"]))
+        return {
+            "table": table,
+            "start": start,
+            "end": end,
+            "archived_months": [r.month for r in archived],
+            "truncated": len(rows) > limit,
+            "rows": rows[:limit],
+        }
+
+# Singleton instance
+partition_manager = PartitionManager(
+    archive_dir=os.getenv("ARCHIVE_DIR"),
+    months_ahead=int(os.getenv("PARTITION_MONTHS_AHEAD", "3")),
+    archive_after_months=int(os.getenv("ARCHIVE_AFTER_MONTHS", "0"))
+)
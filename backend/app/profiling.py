@@ -0,0 +1,350 @@
+"""
+On-demand sampling profiler for individual requests.
+
+A request is profiled when it carries X-Profile-Token matching DEBUG_TOKEN,
+or when it is picked by PROFILE_SAMPLE_RATE (0 by default). Unprofiled
+requests cost one header lookup and one random() call.
+
+While at least one request is being profiled, a sampler thread snapshots
+every thread's stack each PROFILE_INTERVAL_MS. A stack belongs to a request
+when the innermost contextvars.Context running it (held by Handle._run on an
+asyncio event loop, or by the anyio worker running a sync endpoint) carries
+that request's profile, so concurrent requests do not mix. uvloop runs
+handles in compiled code with no Python frame, so on its loops the task
+currently running there is looked up instead; before Python 3.12 tasks do
+not expose their context, so only the request's own task is matched there
+(work it hands to child tasks is not sampled). Samples are wall-clock, so
+time blocked on the database shows up too.
+
+Finished profiles go into a ring buffer of PROFILE_BUFFER entries, with a
+call tree, the hottest functions and collapsed stacks for flame graph tools
+(flamegraph.pl, speedscope).
+"""
+
+import asyncio
+import contextvars
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+import weakref
+from collections import Counter, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXCLUDED_PREFIXES = ("/debug", "/metrics", "/health")
+
+Frame = Tuple[str, str, int]  # (file, function, first line)
+
+
+def _short_path(filename: str) -> str:
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    if filename.startswith(BACKEND_DIR):
+        return os.path.relpath(filename, BACKEND_DIR)
+    return os.path.basename(filename)
+
+
+def frame_label(frame: Frame) -> str:
+    return f"{frame[1]} ({_short_path(frame[0])}:{frame[2]})"
+
+
+class Profile:
+    """Samples collected for one request"""
+
+    def __init__(self, profile_id: int, method: str, path: str, trigger: str, interval: float):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.interval = interval
+        self.started_at = datetime.utcnow()
+        self.status: Optional[int] = None
+        self.duration_ms: Optional[float] = None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "trigger": self.trigger,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "samples": self.samples,
+            "interval_ms": round(self.interval * 1000, 2)
+        }
+
+    def collapsed(self) -> str:
+        """One line per distinct stack, root first: 'a;b;c <samples>'"""
+        return "\n".join(
+            ";".join(frame_label(frame) for frame in stack) + f" {count}"
+            for stack, count in self.stacks.most_common()
+        ) + "\n"
+
+    def top_functions(self, limit: int = 25) -> List[Dict]:
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for frame in set(stack):
+                total[frame] += count
+        samples = max(self.samples, 1)
+        return [
+            {
+                "function": frame_label(frame),
+                "self_samples": own[frame],
+                "total_samples": count,
+                "self_pct": round(100.0 * own[frame] / samples, 1),
+                "total_pct": round(100.0 * count / samples, 1)
+            }
+            for frame, count in total.most_common(limit)
+        ]
+
+    def call_tree(self, min_pct: float = 1.0) -> Dict:
+        """Nested call tree; branches under min_pct of the samples are pruned"""
+        root = {"function": "<request>", "samples": 0, "children": {}}
+        for stack, count in self.stacks.items():
+            node = root
+            node["samples"] += count
+            for frame in stack:
+                node = node["children"].setdefault(frame, {"function": frame_label(frame), "samples": 0, "children": {}})
+                node["samples"] += count
+
+        cutoff = max(self.samples, 1) * min_pct / 100.0
+
+        def prune(node: Dict) -> Dict:
+            children = sorted(node["children"].values(), key=lambda c: c["samples"], reverse=True)
+            return {
+                "function": node["function"],
+                "samples": node["samples"],
+                "children": [prune(child) for child in children if child["samples"] >= cutoff]
+            }
+
+        return prune(root)
+
+    def detail(self) -> Dict:
+        return {**self.summary(), "top_functions": self.top_functions(), "call_tree": self.call_tree()}
+
+
+_current_profile: contextvars.ContextVar[Optional[Profile]] = contextvars.ContextVar("current_profile", default=None)
+
+
+class RequestProfiler:
+    """Decides which requests to profile, samples them and keeps the results"""
+
+    def __init__(self, token: Optional[str] = None, sample_rate: float = 0.0,
+                 interval_ms: float = 5.0, buffer_size: int = 50, max_samples: int = 20000):
+        self.token = token
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000.0
+        self.max_samples = max_samples
+        self.profiles: Deque[Profile] = deque(maxlen=buffer_size)
+        self._ids = itertools.count(1)
+        self._active: Set[Profile] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Event loops by thread, and request tasks, for loops without Python-level handles
+        self._loops: Dict[int, asyncio.AbstractEventLoop] = {}
+        self._tasks: "weakref.WeakKeyDictionary[asyncio.Task, Profile]" = weakref.WeakKeyDictionary()
+
+    def trigger_for(self, scope: Scope) -> Optional[str]:
+        """'header', 'sampled' or None"""
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == b"x-profile-token":
+                    if hmac.compare_digest(value, self.token.encode()):
+                        return "header"
+                    break
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    def begin(self, method: str, path: str, trigger: str) -> Profile:
+        profile = Profile(next(self._ids), method, path, trigger, self.interval)
+        task = self._running_task()
+        with self._lock:
+            self._active.add(profile)
+            if task is not None:
+                self._loops[threading.get_ident()] = task.get_loop()
+                self._tasks[task] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sampler, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return profile
+
+    def end(self, profile: Profile, status: Optional[int], duration: float):
+        profile.status = status
+        profile.duration_ms = round(duration * 1000, 2)
+        task = self._running_task()
+        with self._lock:
+            self._active.discard(profile)
+            if task is not None:
+                self._tasks.pop(task, None)
+            self.profiles.append(profile)
+
+    def get(self, profile_id: int) -> Optional[Profile]:
+        with self._lock:
+            return next((p for p in self.profiles if p.id == profile_id), None)
+
+    def clear(self):
+        """Drop stored profiles (requests being profiled are kept)"""
+        with self._lock:
+            self.profiles.clear()
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            return [p.summary() for p in reversed(self.profiles)]
+
+    # Sampling
+
+    @staticmethod
+    def _running_task() -> Optional[asyncio.Task]:
+        try:
+            return asyncio.current_task()
+        except RuntimeError:
+            return None
+
+    @staticmethod
+    def _idle(frames: List, i: int) -> bool:
+        """An idle worker still holds its last context while waiting for work"""
+        return i + 1 >= len(frames) or frames[i + 1].f_code.co_filename.endswith(("queue.py", "threading.py"))
+
+    def _owner(self, thread_id: int, frames: List) -> Tuple[Optional[Profile], int]:
+        """The profile of the context a thread is running in, and where its stack starts
+
+        frames run outermost first. The context is held by whatever called
+        Context.run, so the innermost such frame wins: Handle._run on an
+        asyncio loop, WorkerThread.run in anyio. asyncio.run and Runner.run
+        only hold the base context and are skipped.
+        """
+        for i in range(len(frames) - 1, -1, -1):
+            frame = frames[i]
+            if frame.f_code.co_name not in ("run", "_run") or frame.f_code.co_filename.endswith("runners.py"):
+                continue
+            for value in frame.f_locals.values():
+                context = value if isinstance(value, contextvars.Context) else getattr(value, "_context", None)
+                if not isinstance(context, contextvars.Context):
+                    continue
+                profile = context.get(_current_profile)
+                if profile is None or self._idle(frames, i):
+                    return None, 0
+                return profile, i + 1
+        return self._task_owner(thread_id, frames)
+
+    def _task_owner(self, thread_id: int, frames: List) -> Tuple[Optional[Profile], int]:
+        """Event loops whose handles have no Python frame (uvloop): the task running on the loop"""
+        loop = self._loops.get(thread_id)
+        if loop is None:
+            return None, 0
+        task = asyncio.tasks._current_tasks.get(loop)
+        if task is None:
+            return None, 0
+        get_context = getattr(task, "get_context", None)  # Python 3.12+
+        profile = get_context().get(_current_profile) if get_context else self._tasks.get(task)
+        if profile is None:
+            return None, 0
+        coro_frame = getattr(task.get_coro(), "cr_frame", None)
+        for i, frame in enumerate(frames):
+            if frame is coro_frame:
+                return profile, i
+        return None, 0
+
+    def _sample(self):
+        me = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(frame)
+                frame = frame.f_back
+            frames.reverse()
+            profile, start = self._owner(thread_id, frames)
+            if profile is None or profile.samples >= self.max_samples:
+                continue
+            stack = tuple(
+                (f.f_code.co_filename, f.f_code.co_name, f.f_code.co_firstlineno) for f in frames[start:]
+            )
+            profile.stacks[stack] += 1
+            profile.samples += 1
+
+    def _sampler(self):
+        while True:
+            with self._lock:
+                active = bool(self._active)
+            if not active:
+                self._wake.clear()
+                self._wake.wait()
+                continue
+            started = time.perf_counter()
+            try:
+                self._sample()
+            except Exception:
+                pass  # a thread exiting mid-walk; skip this tick
+            time.sleep(max(self.interval - (time.perf_counter() - started), 0.0005))
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                "header_trigger_enabled": bool(self.token),
+                "sample_rate": self.sample_rate,
+                "interval_ms": round(self.interval * 1000, 2),
+                "buffer_size": self.profiles.maxlen,
+                "stored": len(self.profiles),
+                "active": len(self._active)
+            }
+
+# Singleton instance
+request_profiler = RequestProfiler(
+    token=os.getenv("DEBUG_TOKEN"),
+    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    interval_ms=float(os.getenv("PROFILE_INTERVAL_MS", "5")),
+    buffer_size=int(os.getenv("PROFILE_BUFFER", "50"))
+)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling opted-in requests; adds X-Profile-Id to their responses"""
+
+    def __init__(self, app: ASGIApp, profiler: RequestProfiler = request_profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith(EXCLUDED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        trigger = self.profiler.trigger_for(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile = self.profiler.begin(scope["method"], scope["path"], trigger)
+        token = _current_profile.set(profile)
+        status = None
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("X-Profile-Id", str(profile.id))
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_profile.reset(token)
+            self.profiler.end(profile, status, time.perf_counter() - started)
@@ -0,0 +1,196 @@
+"""
+Query budgets and N+1 detection for tests.
+
+QueryRecorder captures every SQL statement an engine executes, together
+with the application line that issued it. query_budget() fails with
+QueryBudgetExceeded when a block runs more statements than declared, and the
+report groups near-identical statements (same SQL once parameters and IN
+lists are collapsed) so per-row lookup loops stand out:
+
+    with query_budget(4):
+        client.get("/analytics/predictions")
+
+Load the fixtures with `pytest_plugins = ["app.query_budget"]` in a
+conftest.py. `budget_client` is a TestClient whose get_db dependency uses a
+fresh SQLite database per test (startup hooks and background threads are
+not run), and the `query_budget` fixture counts statements on that database
+only. Module-level caches such as the search index and facets are shared
+between tests.
+"""
+
+import os
+import re
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMETER_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|:\w+|__\[POSTCOMPILE_\w+\])\s*,?)+\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """SQL with literals and parameter lists collapsed, for grouping repeats"""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PARAMETER_LIST.sub("(?)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def _caller() -> Optional[str]:
+    """Innermost application frame outside this module, as file:line"""
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(APP_DIR) and not frame.filename.endswith("query_budget.py"):
+            return f"{os.path.relpath(frame.filename, os.path.dirname(APP_DIR))}:{frame.lineno}"
+    return None
+
+
+@dataclass
+class RecordedStatement:
+    sql: str
+    normalized: str
+    seconds: float
+    location: Optional[str]
+
+
+class QueryRecorder:
+    """Records statements executed on an engine (or all engines) while active"""
+
+    def __init__(self, engine: Optional[Engine] = None, capture_callers: bool = True):
+        self.target = engine if engine is not None else Engine
+        self.capture_callers = capture_callers
+        self.statements: List[RecordedStatement] = []
+        self._lock = threading.Lock()
+        self._started = threading.local()
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        self._started.at = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - getattr(self._started, "at", time.perf_counter())
+        recorded = RecordedStatement(
+            sql=statement,
+            normalized=normalize_statement(statement),
+            seconds=elapsed,
+            location=_caller() if self.capture_callers else None
+        )
+        with self._lock:
+            self.statements.append(recorded)
+
+    def __enter__(self) -> "QueryRecorder":
+        event.listen(self.target, "before_cursor_execute", self._before)
+        event.listen(self.target, "after_cursor_execute", self._after)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.target, "before_cursor_execute", self._before)
+        event.remove(self.target, "after_cursor_execute", self._after)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def repeated(self, threshold: int = 3) -> List[Tuple[str, int, Dict[str, int]]]:
+        """Statements run at least `threshold` times: (normalized SQL, count, callers)"""
+        groups: Dict[str, List[RecordedStatement]] = {}
+        for statement in self.statements:
+            groups.setdefault(statement.normalized, []).append(statement)
+        suspects = []
+        for normalized, members in groups.items():
+            if len(members) < threshold or not normalized.upper().startswith(("SELECT", "WITH")):
+                continue
+            callers: Dict[str, int] = {}
+            for member in members:
+                key = member.location or "<unknown>"
+                callers[key] = callers.get(key, 0) + 1
+            suspects.append((normalized, len(members), callers))
+        return sorted(suspects, key=lambda s: s[1], reverse=True)
+
+    def report(self, threshold: int = 3, limit: int = 10) -> str:
+        lines = [f"{self.count} statements, {sum(s.seconds for s in self.statements) * 1000:.1f} ms"]
+        suspects = self.repeated(threshold)
+        if suspects:
+            lines.append("Likely N+1 patterns:")
+            for normalized, count, callers in suspects[:limit]:
+                lines.append(f"  {count}x {normalized[:200]}")
+                for location, hits in sorted(callers.items(), key=lambda c: c[1], reverse=True)[:3]:
+                    lines.append(f"      from {location} ({hits}x)")
+        return "\n".join(lines)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A block ran more statements than its budget, or repeated a query too often"""
+
+
+@contextmanager
+def query_budget(max_statements: int, engine: Optional[Engine] = None,
+                 n_plus_one_threshold: Optional[int] = None, label: str = "block"):
+    """Fail if the block runs more than max_statements statements
+
+    With n_plus_one_threshold set, also fail when any SELECT is repeated that
+    many times even within budget.
+    """
+    with QueryRecorder(engine) as recorder:
+        yield recorder
+    threshold = n_plus_one_threshold or 3
+    over_budget = recorder.count > max_statements
+    repeats = n_plus_one_threshold is not None and recorder.repeated(n_plus_one_threshold)
+    if over_budget or repeats:
+        reason = (f"{label} ran {recorder.count} statements (budget {max_statements})"
+                  if over_budget else f"{label} repeated a query {n_plus_one_threshold}+ times")
+        raise QueryBudgetExceeded(f"{reason}\n{recorder.report(threshold)}")
+
+
+# Pytest fixtures (pytest is only needed when they are used)
+try:
+    import pytest
+except ImportError:  # pragma: no cover
+    pytest = None
+
+if pytest is not None:
+    @pytest.fixture
+    def budget_engine(tmp_path):
+        from . import models
+        from .database import create_engine_for
+
+        test_engine = create_engine_for(f"sqlite:///{tmp_path / 'budget.db'}")
+        models.Base.metadata.create_all(bind=test_engine)
+        yield test_engine
+        test_engine.dispose()
+
+    @pytest.fixture
+    def budget_client(budget_engine):
+        from fastapi.testclient import TestClient
+        from sqlalchemy.orm import sessionmaker
+        from .database import get_db
+        from .main import app
+
+        TestSession = sessionmaker(autocommit=False, autoflush=False, bind=budget_engine)
+
+        def override_get_db():
+            db = TestSession()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        try:
+            yield TestClient(app)
+        finally:
+            app.dependency_overrides.pop(get_db, None)
+
+    @pytest.fixture(name="query_budget")
+    def query_budget_fixture(budget_engine):
+        """query_budget bound to the test database"""
+        def bound(max_statements: int, n_plus_one_threshold: Optional[int] = None, label: str = "block"):
+            return query_budget(max_statements, budget_engine, n_plus_one_threshold, label)
+        return bound
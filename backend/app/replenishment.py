@@ -0,0 +1,247 @@
+"""
+Batch auto-replenishment.
+
+Computes safety stock, reorder points and economic order quantities for the
+whole catalog in one vectorized pass and turns the products that need stock
+into draft purchase orders, grouped by supplier and inserted in a single
+transaction.
+"""
+
+import numpy as np
+from statistics import NormalDist
+from datetime import datetime, timedelta
+from typing import Dict, List
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert
+from . import models
+from .dialects import days_between, date_of
+
+OPEN_STATUSES = (
+    models.PurchaseOrderStatus.PENDING,
+    models.PurchaseOrderStatus.APPROVED,
+    models.PurchaseOrderStatus.ORDERED,
+)
+
+
+class ReplenishmentEngine:
+    """Reorder point / EOQ planner that writes draft purchase orders"""
+
+    def __init__(
+        self,
+        history_days: int = 90,
+        default_lead_time_days: float = 7.0,
+        ordering_cost: float = 50.0,
+        holding_cost_rate: float = 0.25
+    ):
+        self.history_days = history_days
+        self.default_lead_time_days = default_lead_time_days
+        self.ordering_cost = ordering_cost
+        self.holding_cost_rate = holding_cost_rate
+
+    def _demand(self, db: Session, cutoff: datetime) -> Dict[int, tuple]:
+        """Σ daily units and Σ daily units² per product"""
+        daily = db.query(
+            models.Sale.product_id.label('product_id'),
+            func.sum(models.Sale.quantity).label('units')
+        ).filter(
+            models.Sale.sale_date >= cutoff
+        ).group_by(
+            models.Sale.product_id, date_of(models.Sale.sale_date)
+        ).subquery()
+        rows = db.query(
+            daily.c.product_id,
+            func.sum(daily.c.units),
+            func.sum(daily.c.units * daily.c.units)
+        ).group_by(daily.c.product_id).all()
+        return {pid: (float(total), float(squares)) for pid, total, squares in rows}
+
+    def _lead_times(self, db: Session) -> Dict[int, tuple]:
+        """Mean and variance of observed lead time per supplier"""
+        po = models.PurchaseOrder
+        # Use the actual delivery date, or the promised one if it was not recorded
+        delivered_at = func.coalesce(po.actual_delivery, po.expected_delivery)
+        lead = days_between(db, po.order_date, delivered_at)
+        rows = db.query(
+            po.supplier_id,
+            func.avg(lead),
+            func.avg(lead * lead)
+        ).filter(
+            po.status == models.PurchaseOrderStatus.DELIVERED,
+            delivered_at.isnot(None)
+        ).group_by(po.supplier_id).all()
+        return {
+            sid: (float(mean), max(float(mean_sq) - float(mean) ** 2, 0.0))
+            for sid, mean, mean_sq in rows
+        }
+
+    def _sourcing(self, db: Session) -> Dict[int, tuple]:
+        """Most recently used supplier and its last unit cost for each product"""
+        po = models.PurchaseOrder
+        latest = db.query(
+            po.product_id.label('product_id'),
+            func.max(po.id).label('order_id')
+        ).filter(
+            po.status != models.PurchaseOrderStatus.CANCELLED
+        ).group_by(po.product_id).subquery()
+        rows = db.query(
+            po.product_id, po.supplier_id, po.unit_cost
+        ).join(latest, latest.c.order_id == po.id).all()
+        return {pid: (sid, unit_cost) for pid, sid, unit_cost in rows}
+
+    def _on_order(self, db: Session) -> Dict[int, int]:
+        rows = db.query(
+            models.PurchaseOrder.product_id,
+            func.sum(models.PurchaseOrder.quantity)
+        ).filter(
+            models.PurchaseOrder.status.in_(OPEN_STATUSES)
+        ).group_by(models.PurchaseOrder.product_id).all()
+        return {pid: int(quantity) for pid, quantity in rows}
+
+    def plan(self, db: Session, service_level: float = 0.95) -> Dict:
+        """Reorder decisions for every product"""
+        now = datetime.utcnow()
+        cutoff = now - timedelta(days=self.history_days)
+
+        products = db.query(
+            models.Product.id,
+            models.Product.name,
+            models.Product.stock,
+            models.Product.reorder_level,
+            models.Product.price
+        ).order_by(models.Product.id).all()
+        if not products:
+            return {"products_evaluated": 0, "orders": [], "skipped": []}
+
+        demand = self._demand(db, cutoff)
+        lead_times = self._lead_times(db)
+        sourcing = self._sourcing(db)
+        on_order = self._on_order(db)
+
+        ids = np.array([p.id for p in products])
+        stock = np.array([p.stock for p in products], dtype=float)
+        reorder_level = np.array([p.reorder_level or 0 for p in products], dtype=float)
+        price = np.array([p.price for p in products], dtype=float)
+        pending = np.array([on_order.get(pid, 0) for pid in ids], dtype=float)
+        total = np.array([demand.get(pid, (0.0, 0.0))[0] for pid in ids])
+        squares = np.array([demand.get(pid, (0.0, 0.0))[1] for pid in ids])
+        supplier = np.array([sourcing.get(pid, (-1, None))[0] for pid in ids])
+        last_cost = np.array([
+            sourcing[pid][1] if pid in sourcing else np.nan for pid in ids
+        ], dtype=float)
+        lead_mean = np.array([
+            lead_times.get(sid, (self.default_lead_time_days, 0.0))[0] for sid in supplier
+        ])
+        lead_var = np.array([lead_times.get(sid, (0.0, 0.0))[1] for sid in supplier])
+
+        # Daily demand over the window, counting days without sales as zero
+        window = float(self.history_days)
+        daily_mean = total / window
+        daily_var = np.maximum(squares / window - daily_mean ** 2, 0.0)
+
+        z = NormalDist().inv_cdf(service_level)
+        safety_stock = z * np.sqrt(lead_mean * daily_var + daily_mean ** 2 * lead_var)
+        reorder_point = np.maximum(daily_mean * lead_mean + safety_stock, reorder_level)
+
+        unit_cost = np.where(np.isnan(last_cost), price, last_cost)
+        annual_demand = daily_mean * 365
+        holding_cost = np.maximum(unit_cost * self.holding_cost_rate, 1e-9)
+        eoq = np.sqrt(2 * annual_demand * self.ordering_cost / holding_cost)
+
+        position = stock + pending
+        needs_order = position <= reorder_point
+        # Order at least the EOQ, and enough to lift the position back over the ROP
+        order_quantity = np.ceil(np.maximum(eoq, reorder_point - position))
+        order_quantity = np.maximum(order_quantity, 1)
+
+        orders, skipped = [], []
+        for i, product in enumerate(products):
+            if not needs_order[i]:
+                continue
+            if supplier[i] == -1:
+                skipped.append({
+                    "product_id": product.id,
+                    "product_name": product.name,
+                    "reason": "No purchase history - supplier unknown"
+                })
+                continue
+            orders.append({
+                "product_id": product.id,
+                "product_name": product.name,
+                "supplier_id": int(supplier[i]),
+                "current_stock": product.stock,
+                "on_order": int(pending[i]),
+                "daily_demand": round(float(daily_mean[i]), 2),
+                "lead_time_days": round(float(lead_mean[i]), 2),
+                "safety_stock": round(float(safety_stock[i]), 2),
+                "reorder_point": round(float(reorder_point[i]), 2),
+                "eoq": round(float(eoq[i]), 2),
+                "quantity": int(order_quantity[i]),
+                "unit_cost": round(float(unit_cost[i]), 2),
+                "expected_delivery": now + timedelta(days=float(lead_mean[i]))
+            })
+
+        return {
+            "products_evaluated": len(products),
+            "orders": orders,
+            "skipped": skipped
+        }
+
+    def run(self, db: Session, dry_run: bool = True, service_level: float = 0.95) -> Dict:
+        """
+        Plan replenishment and, unless dry_run, insert draft purchase orders
+        """
+        plan = self.plan(db, service_level)
+
+        by_supplier: Dict[int, List[Dict]] = {}
+        for line in plan["orders"]:
+            by_supplier.setdefault(line["supplier_id"], []).append(line)
+
+        names = dict(db.query(models.Supplier.id, models.Supplier.name).filter(
+            models.Supplier.id.in_(list(by_supplier))
+        ).all()) if by_supplier else {}
+
+        if not dry_run and by_supplier:
+            run_at = datetime.utcnow()
+            note = f"Auto-replenishment run {run_at:%Y-%m-%d %H:%M}"
+            db.execute(insert(models.PurchaseOrder), [
+                {
+                    "supplier_id": line["supplier_id"],
+                    "product_id": line["product_id"],
+                    "quantity": line["quantity"],
+                    "unit_cost": line["unit_cost"],
+                    "total_cost": line["quantity"] * line["unit_cost"],
+                    "status": models.PurchaseOrderStatus.PENDING,
+                    "order_date": run_at,
+                    "expected_delivery": line["expected_delivery"],
+                    "notes": note
+                }
+                for line in plan["orders"]
+            ])
+            for supplier_id, lines in by_supplier.items():
+                db.query(models.Supplier).filter(
+                    models.Supplier.id == supplier_id
+                ).update(
+                    {models.Supplier.total_orders: models.Supplier.total_orders + len(lines)},
+                    synchronize_session=False
+                )
+            db.commit()
+
+        return {
+            "dry_run": dry_run,
+            "service_level": service_level,
+            "products_evaluated": plan["products_evaluated"],
+            "orders_created": 0 if dry_run else len(plan["orders"]),
+            "suppliers": [
+                {
+                    "supplier_id": supplier_id,
+                    "supplier_name": names.get(supplier_id),
+                    "lines": lines,
+                    "total_cost": round(sum(l["quantity"] * l["unit_cost"] for l in lines), 2)
+                }
+                for supplier_id, lines in by_supplier.items()
+            ],
+            "skipped": plan["skipped"]
+        }
+
+# Singleton instance
+replenishment_engine = ReplenishmentEngine()
@@ -0,0 +1,243 @@
+"""
+Reservation holds for carts and online orders.
+
+A hold moves quantity into Product.reserved instead of decrementing stock,
+so web checkout never keeps a transaction or row lock open while payment is
+processed. Available-to-sell is stock - reserved. Holds, sales and releases
+are all conditional UPDATEs (a hold only succeeds while enough stock is
+still available), so they cannot oversell each other.
+
+Holds expire after their TTL: a sweeper thread hands expired holds back to
+available stock, and creating a hold first expires the product's stale
+ones. Confirming a hold turns it into a sale in a single transaction.
+Reservations apply to central stock (Product.stock), not per-store stock.
+"""
+
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import case, update
+from sqlalchemy.orm import Session
+from . import models, crud
+from .database import SessionLocal
+from .sync import edge_syncer
+
+
+class ReservationManager:
+    """Creates, confirms, releases and expires reservation holds"""
+
+    def __init__(self, default_ttl_seconds: int = 900, sweep_seconds: float = 15.0):
+        self.default_ttl_seconds = default_ttl_seconds
+        self.sweep_seconds = sweep_seconds
+        self.expired_total = 0
+        self.last_sweep: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _unreserve(db: Session, product_id: int, quantity: int):
+        db.query(models.Product).filter(models.Product.id == product_id).update({
+            models.Product.reserved: case(
+                (models.Product.reserved >= quantity, models.Product.reserved - quantity),
+                else_=0
+            )
+        }, synchronize_session=False)
+
+    def _expire(self, db: Session, product_id: Optional[int] = None) -> int:
+        """Mark overdue holds expired and return their stock; caller commits"""
+        now = datetime.utcnow()
+        statement = update(models.Reservation).where(
+            models.Reservation.status == models.ReservationStatus.ACTIVE,
+            models.Reservation.expires_at <= now
+        )
+        if product_id is not None:
+            statement = statement.where(models.Reservation.product_id == product_id)
+        rows = db.execute(
+            statement.values(status=models.ReservationStatus.EXPIRED, resolved_at=now)
+            .returning(models.Reservation.product_id, models.Reservation.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+        released: Dict[int, int] = defaultdict(int)
+        for expired_product, quantity in rows:
+            released[expired_product] += quantity
+        for expired_product, quantity in released.items():
+            self._unreserve(db, expired_product, quantity)
+        self.expired_total += len(rows)
+        return len(rows)
+
+    def availability(self, db: Session, product_id: int) -> Dict:
+        if self._expire(db, product_id):
+            db.commit()
+        product = crud.get_product(db, product_id)
+        if not product:
+            raise LookupError("Product not found")
+        return {
+            "product_id": product.id,
+            "stock": product.stock,
+            "reserved": product.reserved,
+            "available_to_sell": product.stock - product.reserved
+        }
+
+    def hold(self, db: Session, items: List[Tuple[int, int]], ttl_seconds: Optional[int] = None,
+             reference: Optional[str] = None) -> List[models.Reservation]:
+        """Reserve every (product_id, quantity) item, or none of them"""
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl_seconds or self.default_ttl_seconds)
+        quantities: Dict[int, int] = defaultdict(int)
+        for product_id, quantity in items:
+            quantities[product_id] += quantity
+
+        # Consistent product order keeps concurrent carts from deadlocking
+        for product_id in sorted(quantities):
+            self._expire(db, product_id)
+            held = db.query(models.Product).filter(
+                models.Product.id == product_id,
+                models.Product.stock - models.Product.reserved >= quantities[product_id]
+            ).update({
+                models.Product.reserved: models.Product.reserved + quantities[product_id]
+            }, synchronize_session=False)
+            if not held:
+                exists = db.query(models.Product.id).filter(models.Product.id == product_id).first()
+                db.rollback()
+                if not exists:
+                    raise LookupError(f"Product {product_id} not found")
+                raise ValueError(f"Insufficient stock for product {product_id}")
+
+        reservations = [
+            models.Reservation(
+                product_id=product_id, quantity=quantity,
+                reference=reference, expires_at=expires_at
+            )
+            for product_id, quantity in items
+        ]
+        db.add_all(reservations)
+        db.commit()
+        for reservation in reservations:
+            db.refresh(reservation)
+        return reservations
+
+    def _resolve(self, db: Session, reservation_id: int, status: models.ReservationStatus,
+                 require_unexpired: bool) -> models.Reservation:
+        """Move an active hold to status; the conditional UPDATE settles races"""
+        now = datetime.utcnow()
+        query = db.query(models.Reservation).filter(
+            models.Reservation.id == reservation_id,
+            models.Reservation.status == models.ReservationStatus.ACTIVE
+        )
+        if require_unexpired:
+            query = query.filter(models.Reservation.expires_at > now)
+        if not query.update({
+            models.Reservation.status: status,
+            models.Reservation.resolved_at: now
+        }, synchronize_session=False):
+            db.rollback()
+            reservation = db.query(models.Reservation).filter(models.Reservation.id == reservation_id).first()
+            if not reservation:
+                raise LookupError("Reservation not found")
+            state = reservation.status.value
+            if reservation.status == models.ReservationStatus.ACTIVE:
+                state = "expired"
+            raise ValueError(f"Reservation is {state}")
+        reservation = db.query(models.Reservation).filter(models.Reservation.id == reservation_id).one()
+        db.refresh(reservation)
+        return reservation
+
+    def confirm(self, db: Session, reservation_id: int) -> Tuple[models.Reservation, models.Sale]:
+        """Turn a hold into a sale: stock and reserved drop together, atomically"""
+        reservation = self._resolve(db, reservation_id, models.ReservationStatus.CONFIRMED, True)
+        quantity = reservation.quantity
+        # Stock may have been adjusted below the held quantity meanwhile
+        sold = db.query(models.Product).filter(
+            models.Product.id == reservation.product_id,
+            models.Product.stock >= quantity
+        ).update({
+            models.Product.stock: models.Product.stock - quantity,
+            models.Product.reserved: case(
+                (models.Product.reserved >= quantity, models.Product.reserved - quantity),
+                else_=0
+            ),
+            models.Product.updated_at: datetime.utcnow()
+        }, synchronize_session=False)
+        if not sold:
+            db.rollback()
+            raise ValueError("Insufficient stock")
+        product = crud.get_product(db, reservation.product_id)
+        db.refresh(product)
+
+        db_sale = models.Sale(
+            product_id=product.id,
+            quantity=quantity,
+            total_amount=product.price * quantity,
+            sale_date=datetime.utcnow()
+        )
+        db.add(db_sale)
+        edge_syncer.record(db, "sale", product.id, quantity=quantity,
+                           total_amount=db_sale.total_amount, sale_date=db_sale.sale_date.isoformat())
+        db.flush()
+        reservation.sale_id = db_sale.id
+        db.add(models.StockHistory(product_id=product.id, stock_level=product.stock, action="sale"))
+        db.commit()
+        db.refresh(db_sale)
+        db.refresh(reservation)
+
+        crud.publish_sale(db, db_sale, product)
+        return reservation, db_sale
+
+    def release(self, db: Session, reservation_id: int) -> models.Reservation:
+        """Cancel a hold and return its stock"""
+        reservation = self._resolve(db, reservation_id, models.ReservationStatus.RELEASED, False)
+        self._unreserve(db, reservation.product_id, reservation.quantity)
+        db.commit()
+        db.refresh(reservation)
+        return reservation
+
+    # Sweeper
+    def sweep(self) -> int:
+        db = SessionLocal()
+        try:
+            expired = self._expire(db)
+            db.commit()
+            self.last_sweep = datetime.utcnow()
+            return expired
+        finally:
+            db.close()
+
+    def _sweeper(self):
+        while not self._stop.wait(self.sweep_seconds):
+            try:
+                self.sweep()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+
+    def start(self):
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sweeper, name="reservation-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def status(self) -> Dict:
+        return {
+            "sweeper_running": self._thread is not None,
+            "sweep_seconds": self.sweep_seconds,
+            "default_ttl_seconds": self.default_ttl_seconds,
+            "expired_total": self.expired_total,
+            "last_sweep": self.last_sweep,
+            "last_error": self.last_error
+        }
+
+# Singleton instance
+reservation_manager = ReservationManager(
+    default_ttl_seconds=int(os.getenv("RESERVATION_TTL_SECONDS", "900")),
+    sweep_seconds=float(os.getenv("RESERVATION_SWEEP_SECONDS", "15"))
+)
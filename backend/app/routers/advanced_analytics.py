@@ -2,14 +2,20 @@
 Create this as backend/app/routers/advanced_analytics.py
 """
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Body
+from typing import Optional, List
 from sqlalchemy.orm import Session
 from ..database import get_db
+from ..singleflight import SingleFlightRoute
 from ..advanced_ml import advanced_analytics
+from ..forecasting import revenue_forecaster
+from ..anomaly import anomaly_detector
+from ..jobs import job_runner
 
 router = APIRouter(
     prefix="/advanced-analytics",
-    tags=["advanced-analytics"]
+    tags=["advanced-analytics"],
+    route_class=SingleFlightRoute
 )
 
 @router.get("/revenue-forecast")
@@ -20,34 +26,89 @@ def get_revenue_forecast(
     """Forecast future revenue using ML"""
     return advanced_analytics.revenue_forecasting(db, days)
 
+@router.post("/revenue-forecast/rebuild")
+def rebuild_revenue_forecast(db: Session = Depends(get_db)):
+    """Recompute the running forecast sums from the sales table"""
+    return revenue_forecaster.rebuild(db)
+
 @router.get("/seasonal-trends")
-def get_seasonal_trends(db: Session = Depends(get_db)):
+def get_seasonal_trends(
+    run_async: bool = Query(False, alias="async"),
+    db: Session = Depends(get_db)
+):
     """Analyze seasonal patterns in sales"""
+    if run_async:
+        return job_runner.submit_response("seasonal_trends")
     return advanced_analytics.seasonal_trends_analysis(db)
 
 @router.get("/category-performance")
-def get_category_performance(db: Session = Depends(get_db)):
+def get_category_performance(
+    run_async: bool = Query(False, alias="async"),
+    db: Session = Depends(get_db)
+):
     """Compare performance across categories"""
+    if run_async:
+        return job_runner.submit_response("category_performance")
     return advanced_analytics.category_performance(db)
 
 @router.get("/profit-margin/{product_id}")
 def calculate_profit_margin(
     product_id: int,
-    cost_price: float = Query(..., gt=0),
+    cost_price: Optional[float] = Query(None, gt=0),
     db: Session = Depends(get_db)
 ):
-    """Calculate profit margins for a product"""
+    """Calculate profit margins for a product (defaults to purchase-order landed cost)"""
     return advanced_analytics.profit_margin_calculator(db, product_id, cost_price)
 
+@router.get("/margin-report")
+def get_margin_report(
+    page: int = Query(1, ge=1),
+    per_page: int = Query(50, ge=1, le=500),
+    category: Optional[str] = None,
+    band: Optional[str] = Query(None, pattern="^(excellent|good|average|low|critical)$"),
+    min_margin: Optional[float] = None,
+    max_margin: Optional[float] = None,
+    sort_by: str = Query("margin", pattern="^(margin|profit|revenue|units_sold|name)$"),
+    descending: bool = True,
+    db: Session = Depends(get_db)
+):
+    """Catalog-wide margins from delivered purchase-order costs and 30-day sales"""
+    return advanced_analytics.margin_report(
+        db, page, per_page, category, band, min_margin, max_margin, sort_by, descending
+    )
+
 @router.get("/demand-forecast/{product_id}")
 def forecast_demand(
     product_id: int,
     days: int = Query(30, ge=7, le=90),
+    run_async: bool = Query(False, alias="async"),
     db: Session = Depends(get_db)
 ):
     """Predict future demand for a product"""
+    if run_async:
+        return job_runner.submit_response("demand_forecast", {"product_id": product_id, "days": days})
     return advanced_analytics.demand_forecasting(db, product_id, days)
 
+@router.post("/price-optimization/run")
+def run_price_optimization(
+    run_async: bool = Query(False, alias="async"),
+    db: Session = Depends(get_db)
+):
+    """Recompute price suggestions for the whole catalog"""
+    if run_async:
+        return job_runner.submit_response("price_optimization")
+    return advanced_analytics.run_price_optimization_job(db)
+
+@router.post("/demand-forecast/batch", status_code=202)
+def forecast_demand_batch(
+    days: int = Query(30, ge=7, le=90),
+    product_ids: Optional[List[int]] = Body(None),
+):
+    """Queue demand forecasts for many products (all when none are given)"""
+    return job_runner.submit_response(
+        "demand_forecast_batch", {"days": days, "product_ids": product_ids}, priority=7
+    )
+
 @router.get("/price-optimization/{product_id}")
 def optimize_price(
     product_id: int,
@@ -59,4 +120,20 @@ def optimize_price(
 @router.get("/anomaly-detection")
 def detect_anomalies(db: Session = Depends(get_db)):
     """Detect unusual sales patterns"""
-    return advanced_analytics.anomaly_detection(db)
\ No newline at end of file
+    return advanced_analytics.anomaly_detection(db)
+
+@router.get("/anomalies/live")
+def get_live_anomalies(
+    scope: Optional[str] = Query(None, pattern="^(product|category|store)$"),
+    key: Optional[str] = None,
+    type: Optional[str] = Query(None, pattern="^(unusually_high|unusually_low)$"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Per-product, per-category and store-wide anomalies detected as sales are recorded"""
+    return anomaly_detector.anomalies(db, scope, key, type, limit)
+
+@router.post("/anomalies/live/rebuild")
+def rebuild_live_anomalies(db: Session = Depends(get_db)):
+    """Re-warm the streaming detector from recent sales"""
+    return anomaly_detector.rebuild(db)
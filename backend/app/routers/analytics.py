@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List
 from .. import schemas, crud
 from ..database import get_db
+from ..singleflight import SingleFlightRoute, single_flight
 from ..ml_model import stock_predictor
+from ..top_sellers import top_sellers
+from ..facets import catalog_facets
+from ..jobs import job_runner
 
 router = APIRouter(
     prefix="/analytics",
-    tags=["analytics"]
+    tags=["analytics"],
+    route_class=SingleFlightRoute
 )
 
 @router.get("/low-stock", response_model=List[schemas.Product])
@@ -22,12 +27,25 @@ def get_top_selling_products(
     db: Session = Depends(get_db)
 ):
     """Get top selling products within specified time period"""
-    results = crud.get_top_selling_products(db, limit, days)
+    # 1/7/30/90 day windows are served from the in-memory counters
+    results = top_sellers.top(db, limit, days)
+    if results is None:
+        results = crud.get_top_selling_products(db, limit, days)
     return [
         {"id": r[0], "name": r[1], "total_sold": r[2]}
         for r in results
     ]
 
+@router.post("/top-selling/rebuild")
+def rebuild_top_selling(db: Session = Depends(get_db)):
+    """Recount the in-memory top sellers from the sales table"""
+    return top_sellers.rebuild(db)
+
+@router.get("/coalescing")
+def get_coalescing_stats():
+    """How many identical concurrent analytics requests shared one computation"""
+    return single_flight.snapshot()
+
 @router.get("/stock-history/{product_id}", response_model=List[schemas.StockHistoryEntry])
 def get_product_stock_history(
     product_id: int, 
@@ -50,21 +68,26 @@ def predict_product_stockout(product_id: int, db: Session = Depends(get_db)):
     return prediction
 
 @router.get("/predictions/")
-def predict_all_stockouts(db: Session = Depends(get_db)):
+def predict_all_stockouts(
+    run_async: bool = Query(False, alias="async"),
+    db: Session = Depends(get_db)
+):
     """Get stockout predictions for all products"""
+    if run_async:
+        return job_runner.submit_response("stock_predictions")
     return stock_predictor.get_all_predictions(db)
 
 @router.get("/dashboard-stats")
 def get_dashboard_statistics(db: Session = Depends(get_db)):
     """Get aggregated statistics for dashboard"""
     from sqlalchemy import func
-    from ..models import Product, Sale
+    from ..models import Sale
     from datetime import datetime, timedelta
     
-    total_products = db.query(func.count(Product.id)).scalar()
-    low_stock_count = db.query(func.count(Product.id)).filter(
-        Product.stock <= Product.reorder_level
-    ).scalar()
+    # Product counts come from the precomputed catalog facets
+    facets = catalog_facets.facets(db)
+    stock_counts = facets["facets"]["stock_status"]
+    categories = facets["facets"]["category"]
     
     # Sales in last 30 days
     cutoff = datetime.utcnow() - timedelta(days=30)
@@ -72,13 +95,10 @@ def get_dashboard_statistics(db: Session = Depends(get_db)):
         Sale.sale_date >= cutoff
     ).scalar() or 0
     
-    # Categories
-    categories = db.query(Product.category).distinct().all()
-    
     return {
-        "total_products": total_products,
-        "low_stock_count": low_stock_count,
+        "total_products": facets["total"],
+        "low_stock_count": stock_counts["low_stock"] + stock_counts["out_of_stock"],
         "categories_count": len(categories),
         "revenue_30_days": float(recent_sales),
-        "categories": [c[0] for c in categories]
+        "categories": list(categories)
     }
\ No newline at end of file
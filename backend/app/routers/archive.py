@@ -0,0 +1,59 @@
+from datetime import date, datetime, time, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional, Union
+from ..database import get_db
+from ..partitions import partition_manager, PartitionError, PARTITIONED_TABLES
+
+router = APIRouter(
+    prefix="/archive",
+    tags=["archive"]
+)
+
+def _as_datetime(value: Optional[Union[datetime, date]]) -> Optional[datetime]:
+    """A bare date means midnight, so end=2025-11-01 covers all of October"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.combine(value, time.min)
+
+def _read(db: Session, table: str, start: Optional[Union[datetime, date]], end: Optional[Union[datetime, date]],
+          product_id: Optional[int], limit: int):
+    end = _as_datetime(end) or datetime.utcnow()
+    start = _as_datetime(start) or end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    try:
+        return partition_manager.read_rows(db, table, start, end, product_id=product_id, limit=limit)
+    except PartitionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.get("/partitions")
+def list_partitions(table: Optional[str] = None, db: Session = Depends(get_db)):
+    """Rows per month for each partitioned table, live and archived"""
+    tables = [table] if table else list(PARTITIONED_TABLES)
+    try:
+        return {name: partition_manager.months(db, name) for name in tables}
+    except PartitionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/sales")
+def read_sales(
+    start: Optional[Union[datetime, date]] = None,
+    end: Optional[Union[datetime, date]] = None,
+    product_id: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    """Sales in [start, end), including archived months (default: last 30 days); dates or datetimes"""
+    return _read(db, "sales", start, end, product_id, limit)
+
+@router.get("/stock-history")
+def read_stock_history(
+    start: Optional[Union[datetime, date]] = None,
+    end: Optional[Union[datetime, date]] = None,
+    product_id: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    """Stock history in [start, end), including archived months (default: last 30 days); dates or datetimes"""
+    return _read(db, "stock_history", start, end, product_id, limit)
@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from ..database import get_db
 from .. import models, schemas, crud
+from ..search import product_search_index
 import random
 import string
 
@@ -76,6 +77,7 @@ def generate_barcode(
         product.sku = f"SKU-{product.id:06d}"
     
     db.commit()
+    product_search_index.upsert(product)
     
     return {
         "message": "Barcode generated successfully",
@@ -135,6 +137,6 @@ def check_inventory_by_barcode(
         "product_name": product.name,
         "current_stock": product.stock,
         "reorder_level": product.reorder_level,
-        "status": "low_stock" if product.stock <= product.reorder_level else "in_stock",
+        "status": "low_stock" if product.stock <= (product.reorder_level or 0) else "in_stock",
         "price": product.price
     }
\ No newline at end of file
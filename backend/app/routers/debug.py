@@ -0,0 +1,74 @@
+import hmac
+import os
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from ..profiling import request_profiler
+from ..memory import memory_accountant
+
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
+
+def verify_debug_token(x_debug_token: Optional[str] = Header(None)):
+    """Debug endpoints require X-Debug-Token and do not exist unless DEBUG_TOKEN is configured"""
+    if not DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_debug_token or "", DEBUG_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid debug token")
+
+router = APIRouter(
+    prefix="/debug",
+    tags=["debug"],
+    dependencies=[Depends(verify_debug_token)]
+)
+
+def get_profile(profile_id: int):
+    profile = request_profiler.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found (the buffer may have rotated)")
+    return profile
+
+@router.get("/profiles")
+def list_profiles():
+    """Recent request profiles, newest first"""
+    return {"profiler": request_profiler.status(), "profiles": request_profiler.list()}
+
+@router.get("/profiles/{profile_id}")
+def get_profile_detail(profile_id: int, min_pct: float = Query(1.0, ge=0, le=100)):
+    """Hottest functions and call tree of a profiled request"""
+    profile = get_profile(profile_id)
+    return {**profile.detail(), "call_tree": profile.call_tree(min_pct)}
+
+@router.get("/profiles/{profile_id}/collapsed", response_class=PlainTextResponse)
+def get_profile_collapsed(profile_id: int):
+    """Collapsed stacks for flamegraph.pl or speedscope"""
+    return PlainTextResponse(get_profile(profile_id).collapsed())
+
+@router.get("/memory")
+def get_memory(
+    top: int = Query(20, ge=1, le=200),
+    diff: bool = Query(False, description="Top allocators by growth since tracing started")
+):
+    """RSS, estimated size of each model and cache, limits, evictions and tracemalloc top allocators"""
+    return memory_accountant.report(top, diff)
+
+@router.post("/memory/evict")
+def evict_memory(consumer: str):
+    """Drop one cache or fitted model; it is rebuilt or refitted on next use"""
+    try:
+        return memory_accountant.evict(consumer)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown consumer; one of {sorted(memory_accountant.consumers)}")
+
+@router.post("/memory/enforce")
+def enforce_memory_limits():
+    """Apply the configured byte limits now instead of waiting for the guard thread"""
+    return {"evictions": memory_accountant.enforce()}
+
+@router.post("/memory/tracemalloc")
+def toggle_tracemalloc(enabled: bool, frames: int = Query(1, ge=1, le=50)):
+    """Start (resetting the diff baseline) or stop tracemalloc"""
+    if enabled:
+        memory_accountant.start_tracing(frames)
+    else:
+        memory_accountant.stop_tracing()
+    return {"enabled": enabled}
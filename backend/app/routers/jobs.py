@@ -0,0 +1,87 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import desc
+from pydantic import BaseModel, Field
+from typing import Optional
+from ..database import get_db
+from .. import models
+from ..jobs import job_runner
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"]
+)
+
+class JobSubmit(BaseModel):
+    task: str
+    params: dict = {}
+    priority: int = Field(5, ge=0, le=9)
+
+@router.post("/", status_code=202)
+def submit_job(job: JobSubmit):
+    """Queue a registered task"""
+    try:
+        return job_runner.submit_response(job.task, job.params, job.priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/")
+def list_jobs(
+    status: Optional[str] = None,
+    task: Optional[str] = None,
+    skip: int = 0,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """List recent jobs (without results)"""
+    query = db.query(models.Job)
+    if status:
+        query = query.filter(models.Job.status == status)
+    if task:
+        query = query.filter(models.Job.task == task)
+    jobs = query.order_by(desc(models.Job.id)).offset(skip).limit(limit).all()
+    return [job_runner.describe(job, include_result=False) for job in jobs]
+
+@router.get("/tasks")
+def list_tasks():
+    """Registered tasks and the schedule"""
+    return {
+        "tasks": sorted(job_runner.tasks),
+        "schedules": [
+            {
+                "name": entry["name"],
+                "cron": entry["cron"].expression,
+                "task": entry["task"],
+                "params": entry["params"],
+                "next_run": entry["next_run"]
+            }
+            for entry in job_runner.schedules
+        ]
+    }
+
+@router.get("/latest/{task}")
+def get_latest_result(task: str, db: Session = Depends(get_db)):
+    """Most recent successful result of a task, e.g. nightly precomputation"""
+    job = db.query(models.Job).filter(
+        models.Job.task == task,
+        models.Job.status == models.JobStatus.SUCCEEDED
+    ).order_by(desc(models.Job.finished_at)).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="No completed job for this task")
+    return job_runner.describe(job)
+
+@router.get("/{job_id}")
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    """Job status and, once finished, its result"""
+    job = db.query(models.Job).filter(models.Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_runner.describe(job)
+
+@router.post("/{job_id}/cancel")
+def cancel_job(job_id: int, db: Session = Depends(get_db)):
+    """Cancel a queued job or ask a running one to stop"""
+    job = job_runner.cancel(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_runner.describe(job, include_result=False)
@@ -3,6 +3,8 @@ from sqlalchemy.orm import Session
 from typing import Optional
 from .. import schemas, crud
 from ..database import get_db
+from ..search import search_products, product_search_index
+from ..facets import catalog_facets, STOCK_STATUSES, PRICE_BANDS
 
 router = APIRouter(
     prefix="/products",
@@ -19,20 +21,51 @@ def get_products(
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=100),
     category: Optional[str] = None,
+    stock_status: Optional[str] = Query(None, pattern="^(" + "|".join(STOCK_STATUSES) + ")$"),
+    price_band: Optional[str] = Query(None, pattern="^(" + "|".join(b[0] for b in PRICE_BANDS) + ")$"),
     db: Session = Depends(get_db)
 ):
-    """Get paginated list of products with optional category filter"""
+    """Get paginated list of products with optional category, stock status and price band filters"""
     skip = (page - 1) * per_page
-    products = crud.get_products(db, skip=skip, limit=per_page, category=category)
-    total = crud.get_products_count(db, category=category)
+    products = crud.get_products(
+        db, skip=skip, limit=per_page, category=category,
+        stock_status=stock_status, price_band=price_band
+    )
+    # Total and facet counts come from the precomputed facets, not a COUNT
+    facets = catalog_facets.facets(db, category, stock_status, price_band)
     
     return {
-        "total": total,
+        "total": facets["total"],
         "page": page,
         "per_page": per_page,
-        "products": products
+        "products": products,
+        "facets": facets["facets"]
     }
 
+@router.get("/facets")
+def get_facets(
+    category: Optional[str] = None,
+    stock_status: Optional[str] = Query(None, pattern="^(" + "|".join(STOCK_STATUSES) + ")$"),
+    price_band: Optional[str] = Query(None, pattern="^(" + "|".join(b[0] for b in PRICE_BANDS) + ")$"),
+    db: Session = Depends(get_db)
+):
+    """Facet counts by category, stock status and price band for the given filters"""
+    return catalog_facets.facets(db, category, stock_status, price_band)
+
+@router.get("/search", response_model=schemas.ProductSearchResponse)
+def search(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Ranked prefix, substring and fuzzy search on name, SKU and category"""
+    return {"query": q, "results": search_products(db, q, limit)}
+
+@router.post("/search/rebuild")
+def rebuild_search_index(db: Session = Depends(get_db)):
+    """Rebuild the in-process search index (not used on PostgreSQL)"""
+    return product_search_index.rebuild(db)
+
 @router.get("/{product_id}", response_model=schemas.Product)
 def get_product(product_id: int, db: Session = Depends(get_db)):
     """Get a specific product by ID"""
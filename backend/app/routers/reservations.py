@@ -0,0 +1,90 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import desc
+from typing import List, Optional
+from ..database import get_db
+from .. import models, schemas
+from ..reservations import reservation_manager
+
+router = APIRouter(
+    prefix="/reservations",
+    tags=["reservations"]
+)
+
+@router.post("/", response_model=List[schemas.Reservation], status_code=201)
+def create_reservations(request: schemas.ReservationCreate, db: Session = Depends(get_db)):
+    """Hold stock for a cart or order; all items are reserved or none are"""
+    try:
+        return reservation_manager.hold(
+            db,
+            [(item.product_id, item.quantity) for item in request.items],
+            ttl_seconds=request.ttl_seconds,
+            reference=request.reference
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/", response_model=List[schemas.Reservation])
+def list_reservations(
+    reference: Optional[str] = None,
+    status: Optional[schemas.ReservationStatus] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """List reservations, e.g. all holds of one cart"""
+    query = db.query(models.Reservation)
+    if reference:
+        query = query.filter(models.Reservation.reference == reference)
+    if status:
+        query = query.filter(models.Reservation.status == models.ReservationStatus[status.name])
+    return query.order_by(desc(models.Reservation.id)).offset(skip).limit(limit).all()
+
+@router.get("/availability/{product_id}")
+def get_availability(product_id: int, db: Session = Depends(get_db)):
+    """Stock, reserved quantity and available-to-sell for a product"""
+    try:
+        return reservation_manager.availability(db, product_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/sweeper")
+def get_sweeper_status():
+    """Expired-hold sweeper status"""
+    return reservation_manager.status()
+
+@router.post("/sweep")
+def sweep_expired():
+    """Expire overdue holds now"""
+    return {"expired": reservation_manager.sweep()}
+
+@router.get("/{reservation_id}", response_model=schemas.Reservation)
+def get_reservation(reservation_id: int, db: Session = Depends(get_db)):
+    """Get a reservation"""
+    reservation = db.query(models.Reservation).filter(models.Reservation.id == reservation_id).first()
+    if not reservation:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return reservation
+
+@router.post("/{reservation_id}/confirm", response_model=schemas.ReservationConfirmation)
+def confirm_reservation(reservation_id: int, db: Session = Depends(get_db)):
+    """Convert an active hold into a sale"""
+    try:
+        reservation, sale = reservation_manager.confirm(db, reservation_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"reservation": reservation, "sale": sale}
+
+@router.post("/{reservation_id}/release", response_model=schemas.Reservation)
+def release_reservation(reservation_id: int, db: Session = Depends(get_db)):
+    """Cancel a hold and return its stock"""
+    try:
+        return reservation_manager.release(db, reservation_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
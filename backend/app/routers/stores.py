@@ -0,0 +1,146 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List
+from ..database import get_db
+from .. import models, schemas
+from .. import stores as store_service
+from ..stores import store_router
+
+router = APIRouter(
+    prefix="/stores",
+    tags=["stores"]
+)
+
+def get_store(code: str, db: Session = Depends(get_db)) -> models.Store:
+    store = db.query(models.Store).filter(models.Store.code == code).first()
+    if not store or not store.is_active:
+        raise HTTPException(status_code=404, detail="Store not found")
+    return store
+
+def get_store_db(store: models.Store = Depends(get_store), db: Session = Depends(get_db)):
+    """Session on the database holding this store's inventory, sales and history"""
+    if store_router.is_shared(store):
+        yield db
+        return
+    store_db = store_router.session(store)
+    try:
+        yield store_db
+    finally:
+        store_db.close()
+
+@router.post("/", response_model=schemas.Store, status_code=201)
+def create_store(store: schemas.StoreCreate, db: Session = Depends(get_db)):
+    """Register a store; its database or schema is created if needed"""
+    if db.query(models.Store).filter(models.Store.code == store.code).first():
+        raise HTTPException(status_code=400, detail="Store code already exists")
+    try:
+        store_service.check_store_target(store.database_url or "")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db_store = models.Store(**store.model_dump())
+    try:
+        store_router.sessionmaker_for(db_store)
+    except Exception as e:
+        store_router.dispose(db_store)
+        raise HTTPException(status_code=400, detail=f"Store database unavailable: {e}")
+    db.add(db_store)
+    db.commit()
+    db.refresh(db_store)
+    return db_store
+
+@router.get("/", response_model=List[schemas.Store])
+def list_stores(db: Session = Depends(get_db)):
+    """List all stores"""
+    return db.query(models.Store).order_by(models.Store.id).all()
+
+@router.get("/rollup/inventory")
+def inventory_rollup(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    low_stock_only: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Stock per product across all stores (HQ view)"""
+    return store_service.rollup_inventory(db, skip, limit, low_stock_only)
+
+@router.get("/rollup/sales")
+def sales_rollup(days: int = Query(30, ge=1, le=3650), db: Session = Depends(get_db)):
+    """Revenue and units per store (HQ view)"""
+    return store_service.rollup_sales(db, days)
+
+@router.get("/{code}", response_model=schemas.Store)
+def get_store_details(store: models.Store = Depends(get_store)):
+    """Get a store by code"""
+    return store
+
+@router.get("/{code}/inventory", response_model=List[schemas.StoreInventoryEntry])
+def get_store_inventory(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    low_stock_only: bool = False,
+    store: models.Store = Depends(get_store),
+    store_db: Session = Depends(get_store_db)
+):
+    """Stock levels at a store"""
+    return store_service.list_inventory(store_db, store, skip, limit, low_stock_only)
+
+@router.put("/{code}/inventory/{product_id}", response_model=schemas.StoreInventoryEntry)
+def set_store_stock(
+    product_id: int,
+    update: schemas.StoreStockUpdate,
+    store: models.Store = Depends(get_store),
+    db: Session = Depends(get_db),
+    store_db: Session = Depends(get_store_db)
+):
+    """Set a product's stock (and optionally reorder level) at a store"""
+    try:
+        return store_service.set_store_stock(db, store_db, store, product_id, update.stock, update.reorder_level)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.post("/{code}/inventory/{product_id}/restock", response_model=schemas.StoreInventoryEntry)
+def restock_store_product(
+    product_id: int,
+    quantity: int = Query(..., gt=0),
+    store: models.Store = Depends(get_store),
+    db: Session = Depends(get_db),
+    store_db: Session = Depends(get_store_db)
+):
+    """Add stock to a product at a store"""
+    try:
+        return store_service.restock_store(db, store_db, store, product_id, quantity)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.post("/{code}/sales", response_model=schemas.Sale, status_code=201)
+def create_store_sale(
+    sale: schemas.SaleCreate,
+    store: models.Store = Depends(get_store),
+    db: Session = Depends(get_db),
+    store_db: Session = Depends(get_store_db)
+):
+    """Record a sale against a store's stock"""
+    try:
+        return store_service.create_store_sale(db, store_db, store, sale)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{code}/sales", response_model=List[schemas.Sale])
+def get_store_sales(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    store: models.Store = Depends(get_store),
+    store_db: Session = Depends(get_store_db)
+):
+    """Recent sales at a store"""
+    return store_service.get_store_sales(store_db, store, skip, limit)
+
+@router.get("/{code}/stock-history/{product_id}", response_model=List[schemas.StockHistoryEntry])
+def get_store_stock_history(
+    product_id: int,
+    days: int = Query(30, ge=1, le=3650),
+    store: models.Store = Depends(get_store),
+    store_db: Session = Depends(get_store_db)
+):
+    """Stock history of a product at a store"""
+    return store_service.get_store_stock_history(store_db, store, product_id, days)
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import desc, insert
 from typing import List
 from datetime import datetime
 
 from ..database import get_db
-from .. import models, schemas
+from .. import models, schemas, crud
+from ..replenishment import replenishment_engine
+from ..jobs import job_runner
+from ..facets import catalog_facets
+from ..sync import edge_syncer
 
 router = APIRouter(
     prefix="/suppliers",
@@ -50,6 +54,20 @@ def create_purchase_order(
     db.refresh(db_order)
     return db_order
 
+@router.post("/replenishment/run")
+def run_replenishment(
+    dry_run: bool = True,
+    service_level: float = Query(0.95, gt=0.5, lt=1),
+    run_async: bool = Query(False, alias="async"),
+    db: Session = Depends(get_db)
+):
+    """Plan reorders for the whole catalog and create draft purchase orders"""
+    if run_async:
+        return job_runner.submit_response(
+            "replenishment", {"dry_run": dry_run, "service_level": service_level}
+        )
+    return replenishment_engine.run(db, dry_run=dry_run, service_level=service_level)
+
 @router.get("/purchase-orders", response_model=List[schemas.PurchaseOrder])
 def get_purchase_orders(
     skip: int = 0,
@@ -100,6 +118,8 @@ def update_purchase_order(
                     action="restock"
                 )
                 db.add(stock_history)
+                edge_syncer.record(db, "restock", product.id, quantity=db_order.quantity)
+                catalog_facets.update(product)
         
         if 'actual_delivery' not in update_data:
             update_data['actual_delivery'] = datetime.utcnow()
@@ -111,60 +131,99 @@ def update_purchase_order(
     db.refresh(db_order)
     return db_order
 
+@router.post("/purchase-orders/receive")
+def receive_purchase_orders(
+    receipt: schemas.PurchaseOrderBulkReceive,
+    db: Session = Depends(get_db)
+):
+    """Mark many purchase orders as delivered and restock in one transaction"""
+    requested = {item.order_id: item.quantity for item in receipt.items}
+    delivered_at = receipt.actual_delivery or datetime.utcnow()
+    
+    # Orders and their products in a single locked query
+    rows = db.query(models.PurchaseOrder, models.Product).join(
+        models.Product, models.Product.id == models.PurchaseOrder.product_id
+    ).filter(
+        models.PurchaseOrder.id.in_(list(requested))
+    ).with_for_update().all()
+    
+    found = {order.id for order, _ in rows}
+    received, skipped = [], []
+    restocked = {}
+    
+    for order, product in rows:
+        if order.status in (models.PurchaseOrderStatus.DELIVERED, models.PurchaseOrderStatus.CANCELLED):
+            skipped.append({"order_id": order.id, "reason": f"Already {order.status.value}"})
+            continue
+        
+        quantity = requested[order.id] or order.quantity
+        if quantity != order.quantity:
+            note = f"Received {quantity} of {order.quantity}"
+            order.notes = f"{order.notes}\n{note}" if order.notes else note
+        order.status = models.PurchaseOrderStatus.DELIVERED
+        order.actual_delivery = delivered_at
+        product.stock += quantity
+        restocked[product.id] = product
+        edge_syncer.record(db, "restock", product.id, quantity=quantity)
+        received.append({"order_id": order.id, "product_id": product.id, "quantity": quantity})
+    
+    # One history row per restocked product with its final level
+    if restocked:
+        db.execute(insert(models.StockHistory), [
+            {
+                "product_id": product.id,
+                "stock_level": product.stock,
+                "action": "restock",
+                "recorded_at": delivered_at
+            }
+            for product in restocked.values()
+        ])
+    db.commit()
+    for product in restocked.values():
+        catalog_facets.update(product)
+    
+    return {
+        "received": received,
+        "skipped": skipped,
+        "not_found": [order_id for order_id in requested if order_id not in found],
+        "stock_levels": {product.id: product.stock for product in restocked.values()}
+    }
+
+@router.get("/performance")
+def get_supplier_leaderboard(
+    sort_by: str = Query("performance_score", pattern="^(" + "|".join(crud.SUPPLIER_SORT_FIELDS) + ")$"),
+    descending: bool = True,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    active_only: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Rank all suppliers by delivery performance"""
+    return crud.get_supplier_performance_stats(
+        db, sort_by=sort_by, descending=descending, skip=skip, limit=limit, active_only=active_only
+    )
+
 @router.get("/performance/{supplier_id}")
 def get_supplier_performance(
     supplier_id: int,
     db: Session = Depends(get_db)
 ):
     """Get supplier performance metrics"""
-    supplier = db.query(models.Supplier).filter(
-        models.Supplier.id == supplier_id
-    ).first()
+    stats = crud.get_supplier_performance_stats(db, supplier_id=supplier_id)["suppliers"]
     
-    if not supplier:
+    if not stats:
         raise HTTPException(status_code=404, detail="Supplier not found")
     
-    # Get all orders
-    orders = db.query(models.PurchaseOrder).filter(
-        models.PurchaseOrder.supplier_id == supplier_id
-    ).all()
-    
-    if not orders:
+    performance = stats[0]
+    if performance["total_orders"] == 0:
         return {
-            "supplier_name": supplier.name,
+            "supplier_name": performance["supplier_name"],
             "total_orders": 0,
             "message": "No orders yet"
         }
     
-    # Calculate metrics
-    total_orders = len(orders)
-    completed_orders = len([o for o in orders if o.status == 'delivered'])
-    total_value = sum(o.total_cost for o in orders)
-    
-    # On-time delivery
-    on_time = 0
-    late = 0
-    for order in orders:
-        if order.status == 'delivered' and order.expected_delivery and order.actual_delivery:
-            if order.actual_delivery <= order.expected_delivery:
-                on_time += 1
-            else:
-                late += 1
-    
-    on_time_rate = (on_time / (on_time + late) * 100) if (on_time + late) > 0 else 100
-    
-    return {
-        "supplier_id": supplier_id,
-        "supplier_name": supplier.name,
-        "rating": supplier.rating,
-        "total_orders": total_orders,
-        "completed_orders": completed_orders,
-        "total_value": total_value,
-        "on_time_delivery_rate": round(on_time_rate, 2),
-        "on_time_deliveries": on_time,
-        "late_deliveries": late,
-        "performance_score": round((on_time_rate / 100) * supplier.rating, 2)
-    }
+    return performance
+
 # Supplier CRUD
 @router.post("/", response_model=schemas.Supplier, status_code=201)
 def create_supplier(
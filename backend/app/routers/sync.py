@@ -0,0 +1,86 @@
+import hmac
+import os
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import Optional
+from ..database import get_db
+from .. import sync as sync_service
+from ..sync import edge_syncer, SyncError
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["sync"]
+)
+
+SYNC_TOKEN = os.getenv("SYNC_TOKEN")
+
+def verify_node(x_sync_token: Optional[str] = Header(None)):
+    """Nodes must present SYNC_TOKEN when the central server has one configured"""
+    if SYNC_TOKEN and not hmac.compare_digest(x_sync_token or "", SYNC_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid sync token")
+
+# Central server
+
+@router.post("/batches", dependencies=[Depends(verify_node)])
+async def receive_batch(request: Request, db: Session = Depends(get_db)):
+    """Apply a (gzip-compressed) batch of edge events; replays are acknowledged as duplicates"""
+    body = await request.body()
+    try:
+        batch = sync_service.decode_batch(body, request.headers.get("content-encoding"))
+    except SyncError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        return await run_in_threadpool(sync_service.apply_batch, db, batch)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="Batch is already being applied; retry")
+
+@router.get("/catalog", dependencies=[Depends(verify_node)])
+def get_catalog(
+    node: str = Query(..., pattern="^[a-z0-9_-]{1,32}$"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=2000),
+    db: Session = Depends(get_db)
+):
+    """Catalog page with the node's stock levels, for edge nodes to pull"""
+    return sync_service.catalog_for(db, node, skip, limit)
+
+@router.get("/nodes")
+def list_nodes(db: Session = Depends(get_db)):
+    """Events received, conflicts and replication lag per edge node"""
+    return sync_service.node_status(db)
+
+@router.get("/conflicts")
+def list_conflicts(
+    node: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Edge events that hit a stock conflict or could not be applied"""
+    return sync_service.list_conflicts(db, node, limit)
+
+# Edge node
+
+@router.get("/status")
+def sync_status(db: Session = Depends(get_db)):
+    """Outbox backlog, lag and last sync result of this edge node"""
+    return edge_syncer.status(db)
+
+@router.post("/run")
+def run_sync():
+    """Push the outbox to the central server now"""
+    try:
+        return edge_syncer.sync_once()
+    except SyncError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/pull")
+def pull_catalog():
+    """Refresh the local catalog and stock from the central server"""
+    try:
+        return edge_syncer.pull_catalog()
+    except SyncError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Central server unavailable: {e}")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, field_validator
 from datetime import datetime
 from typing import Optional, List
 from enum import Enum
@@ -18,13 +18,20 @@ class ProductUpdate(BaseModel):
     name: Optional[str] = None
     category: Optional[str] = None
     stock: Optional[int] = None
-    price: Optional[float] = None
+    price: Optional[float] = Field(None, gt=0)
     reorder_level: Optional[int] = None
 
 class Product(ProductBase):
     id: int
+    reserved: int = 0
     created_at: datetime
     updated_at: datetime
+
+    @field_validator("reorder_level", mode="before")
+    @classmethod
+    def null_reorder_level(cls, value):
+        # The column is nullable (ProductUpdate accepts null); no level reads as 0
+        return 0 if value is None else value
     
     class Config:
         from_attributes = True
@@ -40,6 +47,7 @@ class Sale(BaseModel):
     quantity: int
     total_amount: float
     sale_date: datetime
+    store_id: Optional[int] = None
     
     class Config:
         from_attributes = True
@@ -51,6 +59,7 @@ class StockHistoryEntry(BaseModel):
     stock_level: int
     action: str
     recorded_at: datetime
+    store_id: Optional[int] = None
     
     class Config:
         from_attributes = True
@@ -61,6 +70,15 @@ class PaginatedProducts(BaseModel):
     page: int
     per_page: int
     products: List[Product]
+    facets: Optional[dict] = None
+
+class ProductSearchResult(BaseModel):
+    score: float
+    product: Product
+
+class ProductSearchResponse(BaseModel):
+    query: str
+    results: List[ProductSearchResult]
 
 # ML Prediction Schema
 class StockPrediction(BaseModel):
@@ -122,6 +140,14 @@ class PurchaseOrderUpdate(BaseModel):
     actual_delivery: Optional[datetime] = None
     notes: Optional[str] = None
 
+class PurchaseOrderReceiveItem(BaseModel):
+    order_id: int
+    quantity: Optional[int] = Field(None, gt=0)  # Defaults to the ordered quantity
+
+class PurchaseOrderBulkReceive(BaseModel):
+    items: List[PurchaseOrderReceiveItem] = Field(..., min_length=1, max_length=5000)
+    actual_delivery: Optional[datetime] = None
+
 class PurchaseOrder(BaseModel):
     id: int
     supplier_id: int
@@ -136,4 +162,110 @@ class PurchaseOrder(BaseModel):
     notes: Optional[str]
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+# Store Schemas
+class StoreCreate(BaseModel):
+    code: str = Field(..., pattern="^[a-z0-9_-]{1,32}$")
+    name: str = Field(..., min_length=1, max_length=200)
+    # Empty = shared database, "schema:<name>" = PostgreSQL schema, else an allowed database URL
+    # (STORE_DATABASE_URLS, or a SQLite file in STORE_SQLITE_DIR)
+    database_url: Optional[str] = Field(None, pattern="^(schema:[a-z_][a-z0-9_]{0,62}|[a-z0-9+]+://.+)$")
+
+class Store(BaseModel):
+    id: int
+    code: str
+    name: str
+    storage: str  # "shared", "schema:<name>" or "dedicated" (URL not exposed)
+    is_active: bool
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class StoreStockUpdate(BaseModel):
+    stock: int = Field(..., ge=0)
+    reorder_level: Optional[int] = Field(None, ge=0)
+
+class StoreInventoryEntry(BaseModel):
+    store_id: int
+    product_id: int
+    stock: int
+    reorder_level: int
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+# Reservation Schemas
+class ReservationItem(BaseModel):
+    product_id: int
+    quantity: int = Field(..., gt=0)
+
+class ReservationCreate(BaseModel):
+    items: List[ReservationItem] = Field(..., min_length=1, max_length=100)
+    ttl_seconds: Optional[int] = Field(None, ge=30, le=86400)
+    reference: Optional[str] = Field(None, max_length=100)  # Cart or order id
+
+class ReservationStatus(str, Enum):
+    ACTIVE = "active"
+    CONFIRMED = "confirmed"
+    RELEASED = "released"
+    EXPIRED = "expired"
+
+class Reservation(BaseModel):
+    id: int
+    product_id: int
+    quantity: int
+    status: ReservationStatus
+    reference: Optional[str]
+    expires_at: datetime
+    created_at: datetime
+    resolved_at: Optional[datetime]
+    sale_id: Optional[int]
+    
+    class Config:
+        from_attributes = True
+
+class ReservationConfirmation(BaseModel):
+    reservation: Reservation
+    sale: Sale
+
+# Edge Sync Schemas
+class SyncEventKind(str, Enum):
+    SALE = "sale"
+    RESTOCK = "restock"
+    ADJUSTMENT = "adjustment"
+
+class SaleEventData(BaseModel):
+    quantity: int = Field(..., gt=0)
+    total_amount: Optional[float] = Field(None, ge=0)
+    sale_date: Optional[datetime] = None
+
+class RestockEventData(BaseModel):
+    quantity: int = Field(..., gt=0)
+
+class AdjustmentEventData(BaseModel):
+    stock: int = Field(..., ge=0)
+    previous: int = Field(..., ge=0)
+
+SYNC_EVENT_DATA = {
+    SyncEventKind.SALE: SaleEventData,
+    SyncEventKind.RESTOCK: RestockEventData,
+    SyncEventKind.ADJUSTMENT: AdjustmentEventData,
+}
+
+class SyncEvent(BaseModel):
+    event_id: str = Field(..., pattern="^[0-9a-f]{32}$")
+    kind: SyncEventKind
+    product_id: int
+    created_at: datetime
+    # Checked per event against SYNC_EVENT_DATA[kind], so one bad payload
+    # is rejected on its own instead of failing the batch
+    data: dict
+
+class SyncBatch(BaseModel):
+    node: str = Field(..., pattern="^[a-z0-9_-]{1,32}$")
+    events: List[SyncEvent] = Field(..., max_length=5000)
+    # The node's backlog when the batch was cut, for lag reporting
+    pending: int = Field(0, ge=0)
+    oldest_pending_at: Optional[datetime] = None
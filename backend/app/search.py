@@ -0,0 +1,299 @@
+"""
+Ranked product search on name, SKU and category.
+
+On PostgreSQL the search runs in SQL against pg_trgm GIN indexes (created by
+migrate_database.py). Other backends use an in-process inverted index that
+is kept up to date as products are created, updated and deleted.
+
+Trigrams follow pg_trgm: every word is padded with two leading spaces and
+one trailing space. The last word of the query is treated as a prefix (its
+trailing-space trigram is dropped), so "mac bo" finds "MacBook" while the
+user is still typing. Products are ranked by the share of query words they
+match (substring matches count fully, typo matches partly), with boosts for
+exact, prefix and substring matches of the whole query.
+"""
+
+import heapq
+from bisect import bisect_left, insort
+import re
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from math import ceil
+from typing import Dict, List, Set, Tuple
+from sqlalchemy import func, or_, case, literal
+from sqlalchemy.orm import Session
+from . import models
+from .dialects import dialect_name
+
+WORD = re.compile(r"[a-z0-9]+")
+
+# Field weights for exact/prefix/substring boosts
+FIELD_WEIGHTS = (("name", 1.0), ("sku", 1.0), ("category", 0.5))
+
+
+def normalize(text: str) -> str:
+    return " ".join(WORD.findall(text.lower()))
+
+
+@lru_cache(maxsize=65536)
+def _word_trigrams(word: str, open_ended: bool) -> Tuple[str, ...]:
+    """pg_trgm-style trigrams of one word; open_ended drops the trailing pad"""
+    padded = "  " + word if open_ended else "  " + word + " "
+    return tuple(padded[j:j + 3] for j in range(len(padded) - 2))
+
+
+def _intersect(sets: List[Set[int]]) -> Set[int]:
+    """Intersection starting from the smallest set; never copies a lone set"""
+    if len(sets) == 1:
+        return sets[0]
+    sets = sorted(sets, key=len)
+    return sets[0].intersection(*sets[1:])
+
+
+class ProductSearchIndex:
+    """Two-level inverted index: trigram -> vocabulary words -> products
+
+    Query words are matched against the (much smaller) vocabulary first, by
+    substring or trigram similarity, and only then expanded to products, so
+    neither building nor querying touches every trigram of every product.
+    """
+
+    def __init__(self, candidates: int = 200, min_similarity: float = 0.5):
+        self.candidates = candidates
+        self.min_similarity = min_similarity
+        self._lock = threading.RLock()
+        self._docs: Dict[int, Tuple[str, str, str]] = {}
+        self._words: Dict[str, Set[int]] = defaultdict(set)
+        self._vocabulary: Dict[str, Set[str]] = defaultdict(set)
+        # (name length, product id), for ranking large result sets shortest first
+        self._by_length: List[Tuple[int, int]] = []
+        self.built = False
+
+    def _document(self, product) -> Tuple[str, str, str]:
+        return (
+            normalize(product.name or ""),
+            normalize(product.sku or ""),
+            normalize(product.category or "")
+        )
+
+    def _add(self, product_id: int, doc: Tuple[str, str, str]):
+        self._docs[product_id] = doc
+        for word in set(" ".join(doc).split()):
+            posting = self._words[word]
+            if not posting:
+                for gram in _word_trigrams(word, False):
+                    self._vocabulary[gram].add(word)
+            posting.add(product_id)
+
+    def _remove(self, product_id: int):
+        doc = self._docs.pop(product_id, None)
+        if doc is None:
+            return
+        for word in set(" ".join(doc).split()):
+            posting = self._words.get(word)
+            if posting is None:
+                continue
+            posting.discard(product_id)
+            if not posting:
+                del self._words[word]
+                for gram in _word_trigrams(word, False):
+                    self._vocabulary[gram].discard(word)
+        entry = (len(doc[0]), product_id)
+        i = bisect_left(self._by_length, entry)
+        if i < len(self._by_length) and self._by_length[i] == entry:
+            del self._by_length[i]
+
+    def rebuild(self, db: Session) -> Dict:
+        rows = db.query(
+            models.Product.id, models.Product.name, models.Product.sku, models.Product.category
+        ).yield_per(10000)
+        with self._lock:
+            self._docs = {}
+            self._words = defaultdict(set)
+            self._vocabulary = defaultdict(set)
+            for row in rows:
+                self._add(row.id, self._document(row))
+            self._by_length = sorted((len(doc[0]), pid) for pid, doc in self._docs.items())
+            self.built = True
+            return {"products_indexed": len(self._docs), "vocabulary": len(self._words)}
+
+    def evict(self):
+        """Drop the index to free memory; the next search rebuilds it"""
+        with self._lock:
+            self._docs = {}
+            self._words = defaultdict(set)
+            self._vocabulary = defaultdict(set)
+            self._by_length = []
+            self.built = False
+
+    def upsert(self, product):
+        with self._lock:
+            if not self.built:
+                return
+            doc = self._document(product)
+            if self._docs.get(product.id) == doc:
+                return
+            self._remove(product.id)
+            self._add(product.id, doc)
+            insort(self._by_length, (len(doc[0]), product.id))
+
+    def delete(self, product_id: int):
+        with self._lock:
+            if self.built:
+                self._remove(product_id)
+
+    def _expand(self, term: str, last: bool) -> Tuple[Set[int], Set[int]]:
+        """Products containing the term as a substring, and fuzzy (typo) matches"""
+        vocabulary = self._vocabulary
+        grams = _word_trigrams(term, last)
+        size = lambda gram: len(vocabulary.get(gram, ()))
+
+        # Substring matches contain every unpadded trigram of the term; short
+        # terms have none, and match as word prefixes instead
+        inner = [g for g in grams if " " not in g] or grams
+        strong_words = {w for w in vocabulary.get(min(inner, key=size), ()) if term in w}
+
+        weak_words = set()
+        if term.isalpha() and len(term) >= 3:
+            # A word sharing `need` trigrams must contain one of the
+            # len - need + 1 rarest, so only those seed candidates
+            need = ceil(self.min_similarity * len(grams))
+            rarest = sorted(grams, key=size)[:len(grams) - need + 1]
+            seed = set().union(*(vocabulary.get(g, ()) for g in rarest)) - strong_words
+            for word in seed:
+                if sum(word in vocabulary.get(g, ()) for g in grams) >= need:
+                    weak_words.add(word)
+
+        return self._products(strong_words), self._products(weak_words)
+
+    def _products(self, words: Set[str]) -> Set[int]:
+        """Union of word postings; a single posting is returned as is (read-only)"""
+        if len(words) == 1:
+            return self._words[next(iter(words))]
+        return set().union(*(self._words[w] for w in words))
+
+    def _shortest(self, product_ids: Set[int], k: int) -> List[int]:
+        """The k products with the shortest names, the closest matches for a term"""
+        if len(product_ids) * 20 > len(self._by_length):
+            # Dense sets are cheapest to rank by walking the length order
+            picked = []
+            for _, pid in self._by_length:
+                if pid in product_ids:
+                    picked.append(pid)
+                    if len(picked) == k:
+                        break
+            return picked
+        docs = self._docs
+        return heapq.nsmallest(k, product_ids, key=lambda pid: len(docs[pid][0]))
+
+    def search(self, db: Session, q: str, limit: int = 20) -> List[Tuple[int, float]]:
+        """(product_id, score) pairs, best first"""
+        if not self.built:
+            self.rebuild(db)
+
+        query = normalize(q)
+        terms = query.split()
+        if not terms:
+            return []
+
+        with self._lock:
+            expanded = [self._expand(term, i == len(terms) - 1) for i, term in enumerate(terms)]
+            exact = _intersect([strong for strong, _ in expanded])
+
+            if len(exact) >= limit:
+                candidates = self._shortest(exact, self.candidates)
+            else:
+                # Too few exact hits: also accept products where some terms
+                # only match fuzzily (typos), still requiring every term
+                matched = _intersect([strong | weak if weak else strong for strong, weak in expanded])
+                candidates = list(exact) + self._shortest(matched - exact, self.candidates)
+            hits = {
+                pid: sum(1.0 if pid in strong else 0.75 for strong, _ in expanded)
+                for pid in candidates
+            }
+
+            scored = []
+            for product_id in candidates:
+                similarity = hits[product_id] / len(terms)
+                if similarity < self.min_similarity:
+                    continue
+                boost = 0.0
+                for field, (_, weight) in zip(self._docs[product_id], FIELD_WEIGHTS):
+                    if field == query:
+                        boost = max(boost, 2.0 * weight)
+                    elif field.startswith(query):
+                        boost = max(boost, 1.0 * weight)
+                    elif query in field:
+                        boost = max(boost, 0.5 * weight)
+                scored.append((product_id, round(similarity + boost, 4)))
+
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
+
+# Singleton instance
+product_search_index = ProductSearchIndex()
+
+
+# PostgreSQL: pg_trgm GIN indexes used by the SQL search below
+TRIGRAM_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (lower(name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_sku_trgm ON products USING gin (lower(sku) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_category_trgm ON products USING gin (lower(category) gin_trgm_ops)",
+]
+
+
+def _search_postgres(db: Session, q: str, limit: int) -> List[Tuple[int, float]]:
+    query = normalize(q)
+    name = func.lower(models.Product.name)
+    sku = func.lower(models.Product.sku)
+    category = func.lower(models.Product.category)
+    similarity = func.greatest(
+        func.word_similarity(query, name),
+        func.word_similarity(query, sku),
+        func.word_similarity(query, category)
+    )
+    boost = case(
+        (or_(name == query, sku == query), 2.0),
+        (or_(name.startswith(query, autoescape=True), sku.startswith(query, autoescape=True)), 1.0),
+        (category == query, 1.0),
+        (or_(name.contains(query, autoescape=True), sku.contains(query, autoescape=True),
+             category.startswith(query, autoescape=True)), 0.5),
+        (category.contains(query, autoescape=True), 0.25),
+        else_=0.0
+    )
+    score = (similarity + boost).label("score")
+    rows = db.query(models.Product.id, score).filter(
+        or_(
+            name.contains(query, autoescape=True),
+            sku.contains(query, autoescape=True),
+            category.contains(query, autoescape=True),
+            # <% is the indexable word_similarity operator
+            literal(query).op("<%")(name),
+            literal(query).op("<%")(sku),
+        )
+    ).order_by(score.desc(), models.Product.id).limit(limit).all()
+    return [(row.id, round(float(row.score), 4)) for row in rows]
+
+
+def search_products(db: Session, q: str, limit: int = 20) -> List[Dict]:
+    """Ranked products matching q, with their current stock and price"""
+    if not normalize(q):
+        return []  # only punctuation, nothing to match
+    if dialect_name(db) == "postgresql":
+        ranked = _search_postgres(db, q, limit)
+    else:
+        ranked = product_search_index.search(db, q, limit)
+    if not ranked:
+        return []
+
+    products = {
+        p.id: p for p in db.query(models.Product).filter(
+            models.Product.id.in_([product_id for product_id, _ in ranked])
+        ).all()
+    }
+    return [
+        {"score": score, "product": products[product_id]}
+        for product_id, score in ranked
+        if product_id in products
+    ]
@@ -0,0 +1,93 @@
+"""
+Request coalescing (single-flight) for identical concurrent GET requests.
+
+While a request for a given method, path and query string is being computed,
+identical requests wait on the same future instead of starting duplicate
+work, and all of them receive the leader's response. Routers opt in with
+route_class=SingleFlightRoute.
+
+Admission control lets requests that look coalesced through without a slot
+and leaves an admission callable in the scope under DEFERRED_ADMISSION; if
+such a request ends up leading (the computation it saw has finished), it is
+admitted before computing.
+"""
+
+import asyncio
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Hashable
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+from starlette.responses import Response
+
+DEFERRED_ADMISSION = "admission.deferred"
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls that share a key"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.stats = defaultdict(lambda: {"executed": 0, "coalesced": 0})
+
+    async def do(self, key: Hashable, label: str, fn: Callable[[], Awaitable]):
+        future = self._calls.get(key)
+        if future is not None:
+            self.stats[label]["coalesced"] += 1
+            # Shield so a disconnecting follower does not cancel the leader
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.stats[label]["executed"] += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved in case nobody was waiting
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    @staticmethod
+    def request_key(path: str, query_params) -> Hashable:
+        return (path, tuple(sorted(query_params.multi_items())))
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    def snapshot(self) -> Dict:
+        routes = {label: dict(counts) for label, counts in self.stats.items()}
+        return {
+            "in_flight": len(self._calls),
+            "executed": sum(c["executed"] for c in routes.values()),
+            "coalesced": sum(c["coalesced"] for c in routes.values()),
+            "routes": routes
+        }
+
+# Singleton instance
+single_flight = SingleFlight()
+
+
+class SingleFlightRoute(APIRoute):
+    """APIRoute that coalesces identical concurrent GET requests"""
+
+    def get_route_handler(self) -> Callable[[Request], Awaitable[Response]]:
+        handler = super().get_route_handler()
+        label = f"{','.join(sorted(self.methods))} {self.path_format}"
+
+        async def coalesced_handler(request: Request) -> Response:
+            if request.method != "GET":
+                return await handler(request)
+            key = single_flight.request_key(request.url.path, request.query_params)
+            admit = request.scope.get(DEFERRED_ADMISSION)
+            if admit is None:
+                return await single_flight.do(key, label, lambda: handler(request))
+            return await single_flight.do(key, label, lambda: admit(lambda: handler(request)))
+
+        return coalesced_handler
@@ -0,0 +1,379 @@
+"""
+Multi-store inventory partitioning.
+
+Each store keeps its own stock rows (store_inventory) and tags its sales and
+stock history with its store_id, so checkout at one store never locks rows
+another store is writing. A store's rows live in one of:
+
+- the shared database (empty database_url), partitioned by store_id;
+- a PostgreSQL schema of the shared database ("schema:<name>");
+- a database of its own: a URL listed in STORE_DATABASE_URLS, or a SQLite
+  file inside STORE_SQLITE_DIR (e.g. sqlite:///stores/north.db).
+
+Registering a store opens its database and creates tables there, so other
+URLs are refused.
+
+The product catalog stays in the shared database; store databases hold a
+copy of each stocked product row only to anchor foreign keys. HQ rollups
+query every store database in parallel and merge the results.
+
+Central stock history is the rows with no store_id; every central stock
+read filters on that, since shared-database stores write their own rows to
+the same table. Central sales analytics deliberately cover the whole shared
+sales table, store sales included (the streaming analytics are rebuilt from
+it too); stores with a schema or database of their own are reported only by
+the rollups.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import func, text, update
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
+from . import models, schemas
+from .database import engine, create_engine_for
+from .forecasting import revenue_forecaster
+from .anomaly import anomaly_detector
+from .top_sellers import top_sellers
+
+# Tables created in a store's own database or schema
+STORE_TABLES = [
+    models.Product.__table__,
+    models.Sale.__table__,
+    models.StockHistory.__table__,
+    models.StoreInventory.__table__,
+    models.SyncReceipt.__table__,
+]
+
+# Dedicated store databases that may be opened
+STORE_DATABASE_URLS = {url.strip() for url in os.getenv("STORE_DATABASE_URLS", "").split(",") if url.strip()}
+STORE_SQLITE_DIR = os.path.realpath(os.getenv("STORE_SQLITE_DIR", "stores"))
+
+
+def check_store_target(target: str):
+    """Refuse store databases that are not configured; raises ValueError"""
+    if not target or target.startswith("schema:") or target in STORE_DATABASE_URLS:
+        return
+    try:
+        url = make_url(target)
+    except Exception:
+        raise ValueError("Invalid database URL")
+    if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:" and not url.query:
+        path = os.path.realpath(url.database)
+        if os.path.commonpath([path, STORE_SQLITE_DIR]) == STORE_SQLITE_DIR:
+            return
+        raise ValueError(f"SQLite store databases must be inside {STORE_SQLITE_DIR}")
+    raise ValueError("Database URL is not in STORE_DATABASE_URLS")
+
+
+class StoreRouter:
+    """Maps stores to the engine holding their inventory, sales and history"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, sessionmaker] = {}
+
+    @staticmethod
+    def is_shared(store: models.Store) -> bool:
+        return not store.database_url
+
+    def _bind(self, target: str) -> Engine:
+        check_store_target(target)
+        if target.startswith("sqlite"):
+            os.makedirs(os.path.dirname(os.path.realpath(make_url(target).database)), exist_ok=True)
+        if target.startswith("schema:"):
+            schema = target.split(":", 1)[1]
+            with engine.begin() as conn:
+                conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{schema}"'))
+            bound = engine.execution_options(schema_translate_map={None: schema})
+        else:
+            bound = create_engine_for(target)
+        models.Base.metadata.create_all(bind=bound, tables=STORE_TABLES)
+        return bound
+
+    def sessionmaker_for(self, store: models.Store) -> sessionmaker:
+        target = store.database_url or ""
+        with self._lock:
+            factory = self._sessions.get(target)
+            if factory is None:
+                bound = self._bind(target) if target else engine
+                factory = sessionmaker(autocommit=False, autoflush=False, bind=bound)
+                self._sessions[target] = factory
+            return factory
+
+    def session(self, store: models.Store) -> Session:
+        return self.sessionmaker_for(store)()
+
+    def dispose(self, store: models.Store):
+        with self._lock:
+            factory = self._sessions.pop(store.database_url or "", None)
+        if factory is not None and store.database_url and not store.database_url.startswith("schema:"):
+            factory.kw["bind"].dispose()
+
+# Singleton instance
+store_router = StoreRouter()
+
+
+def _catalog_product(db: Session, product_id: int) -> models.Product:
+    product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    if not product:
+        raise ValueError("Product not found")
+    return product
+
+
+def _anchor_product(store_db: Session, store: models.Store, product: models.Product):
+    """Copy the catalog row into a separate store database for its foreign keys"""
+    if not store_router.is_shared(store):
+        store_db.merge(models.Product(
+            id=product.id, name=product.name, category=product.category, stock=0,
+            price=product.price, reorder_level=product.reorder_level,
+            barcode=product.barcode, sku=product.sku
+        ))
+
+
+def get_inventory(store_db: Session, store: models.Store, product_id: int,
+                  for_update: bool = False) -> Optional[models.StoreInventory]:
+    query = store_db.query(models.StoreInventory).filter(
+        models.StoreInventory.store_id == store.id,
+        models.StoreInventory.product_id == product_id
+    )
+    if for_update:
+        query = query.with_for_update()
+    return query.first()
+
+
+def list_inventory(store_db: Session, store: models.Store, skip: int = 0, limit: int = 100,
+                   low_stock_only: bool = False) -> List[models.StoreInventory]:
+    query = store_db.query(models.StoreInventory).filter(models.StoreInventory.store_id == store.id)
+    if low_stock_only:
+        query = query.filter(models.StoreInventory.stock <= models.StoreInventory.reorder_level)
+    return query.order_by(models.StoreInventory.product_id).offset(skip).limit(limit).all()
+
+
+def set_store_stock(db: Session, store_db: Session, store: models.Store, product_id: int,
+                    stock: int, reorder_level: Optional[int] = None,
+                    action: str = "adjustment") -> models.StoreInventory:
+    """Set a product's stock at a store, creating its inventory row if needed"""
+    product = _catalog_product(db, product_id)
+    inventory = get_inventory(store_db, store, product_id, for_update=True)
+    if inventory is None:
+        _anchor_product(store_db, store, product)
+        inventory = models.StoreInventory(
+            store_id=store.id, product_id=product_id, stock=0,
+            reorder_level=product.reorder_level if reorder_level is None else reorder_level
+        )
+        store_db.add(inventory)
+        action = "initial" if action == "adjustment" else action
+    elif reorder_level is not None:
+        inventory.reorder_level = reorder_level
+
+    inventory.stock = stock
+    inventory.updated_at = datetime.utcnow()
+    store_db.add(models.StockHistory(
+        product_id=product_id, store_id=store.id, stock_level=stock, action=action
+    ))
+    store_db.commit()
+    store_db.refresh(inventory)
+    return inventory
+
+
+def _adjust_stock(store_db: Session, store: models.Store, product_id: int, delta: int) -> Optional[int]:
+    """Atomically add delta to a store's stock, never going below zero
+
+    Returns the new level, or None if the product is not stocked there or
+    has too little stock. A conditional UPDATE avoids lost updates even on
+    SQLite, which has no row locks.
+    """
+    result = store_db.execute(
+        update(models.StoreInventory).where(
+            models.StoreInventory.store_id == store.id,
+            models.StoreInventory.product_id == product_id,
+            models.StoreInventory.stock + delta >= 0
+        ).values(
+            stock=models.StoreInventory.stock + delta,
+            updated_at=datetime.utcnow()
+        ).execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        return None
+    return store_db.query(models.StoreInventory.stock).filter(
+        models.StoreInventory.store_id == store.id,
+        models.StoreInventory.product_id == product_id
+    ).scalar()
+
+
+def restock_store(db: Session, store_db: Session, store: models.Store, product_id: int,
+                  quantity: int) -> models.StoreInventory:
+    level = _adjust_stock(store_db, store, product_id, quantity)
+    if level is None:
+        # Not stocked at this store yet
+        store_db.rollback()
+        return set_store_stock(db, store_db, store, product_id, quantity, action="restock")
+    store_db.add(models.StockHistory(
+        product_id=product_id, store_id=store.id, stock_level=level, action="restock"
+    ))
+    store_db.commit()
+    return get_inventory(store_db, store, product_id)
+
+
+def create_store_sale(db: Session, store_db: Session, store: models.Store,
+                      sale: schemas.SaleCreate) -> models.Sale:
+    """Record a sale against one store's stock; only that store's row is written"""
+    product = _catalog_product(db, sale.product_id)
+    level = _adjust_stock(store_db, store, sale.product_id, -sale.quantity)
+    if level is None:
+        store_db.rollback()
+        raise ValueError("Insufficient stock")
+
+    db_sale = models.Sale(
+        product_id=sale.product_id,
+        store_id=store.id,
+        quantity=sale.quantity,
+        total_amount=product.price * sale.quantity
+    )
+    store_db.add(db_sale)
+    store_db.add(models.StockHistory(
+        product_id=sale.product_id, store_id=store.id, stock_level=level, action="sale"
+    ))
+    store_db.commit()
+    store_db.refresh(db_sale)
+
+    # The streaming analytics are rebuilt from the shared sales table, so
+    # only sales stored there may feed them
+    if store_router.is_shared(store):
+        revenue_forecaster.record_sale(db_sale.sale_date, db_sale.total_amount)
+        anomaly_detector.record_sale(db_sale, product)
+        top_sellers.record_sale(product.id, product.name, db_sale.sale_date, db_sale.quantity)
+    return db_sale
+
+
+def get_store_sales(store_db: Session, store: models.Store, skip: int = 0, limit: int = 50) -> List[models.Sale]:
+    return store_db.query(models.Sale).filter(
+        models.Sale.store_id == store.id
+    ).order_by(models.Sale.sale_date.desc()).offset(skip).limit(limit).all()
+
+
+def get_store_stock_history(store_db: Session, store: models.Store, product_id: int,
+                            days: int = 30) -> List[models.StockHistory]:
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    return store_db.query(models.StockHistory).filter(
+        models.StockHistory.store_id == store.id,
+        models.StockHistory.product_id == product_id,
+        models.StockHistory.recorded_at >= cutoff
+    ).order_by(models.StockHistory.recorded_at).all()
+
+
+# Cross-store rollups
+
+def _fan_out(stores: List[models.Store], query) -> List:
+    """Run query(session, stores) once per database, in parallel, and concatenate"""
+    groups: Dict[str, List[models.Store]] = {}
+    for store in stores:
+        groups.setdefault(store.database_url or "", []).append(store)
+
+    def run(members: List[models.Store]) -> List:
+        session = store_router.session(members[0])
+        try:
+            return query(session, [store.id for store in members])
+        finally:
+            session.close()
+
+    if not groups:
+        return []
+    with ThreadPoolExecutor(max_workers=min(8, len(groups))) as pool:
+        results = pool.map(run, groups.values())
+    return [row for rows in results for row in rows]
+
+
+def _active_stores(db: Session) -> List[models.Store]:
+    return db.query(models.Store).filter(models.Store.is_active == True).order_by(models.Store.id).all()
+
+
+def rollup_inventory(db: Session, skip: int = 0, limit: int = 100,
+                     low_stock_only: bool = False) -> Dict:
+    """Stock per product across all stores, next to central stock"""
+    stores = _active_stores(db)
+    codes = {store.id: store.code for store in stores}
+
+    def query(session: Session, store_ids: List[int]):
+        return session.query(
+            models.StoreInventory.store_id,
+            models.StoreInventory.product_id,
+            models.StoreInventory.stock,
+            models.StoreInventory.reorder_level
+        ).filter(models.StoreInventory.store_id.in_(store_ids)).all()
+
+    by_product: Dict[int, Dict] = {}
+    for row in _fan_out(stores, query):
+        entry = by_product.setdefault(row.product_id, {"store_stock": 0, "stores": {}, "low_stock_stores": []})
+        entry["store_stock"] += row.stock
+        entry["stores"][codes[row.store_id]] = row.stock
+        if row.stock <= row.reorder_level:
+            entry["low_stock_stores"].append(codes[row.store_id])
+
+    product_ids = sorted(
+        pid for pid, entry in by_product.items()
+        if not low_stock_only or entry["low_stock_stores"]
+    )
+    page = product_ids[skip:skip + limit]
+    products = {
+        p.id: p for p in db.query(
+            models.Product.id, models.Product.name, models.Product.stock
+        ).filter(models.Product.id.in_(page)).all()
+    } if page else {}
+
+    return {
+        "stores": len(stores),
+        "total_products": len(product_ids),
+        "products": [
+            {
+                "product_id": pid,
+                "product_name": products[pid].name if pid in products else None,
+                "central_stock": products[pid].stock if pid in products else None,
+                **by_product[pid]
+            }
+            for pid in page
+        ]
+    }
+
+
+def rollup_sales(db: Session, days: int = 30) -> Dict:
+    """Revenue and units per store over the last `days` days"""
+    stores = _active_stores(db)
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    def query(session: Session, store_ids: List[int]):
+        return session.query(
+            models.Sale.store_id,
+            func.count(models.Sale.id).label("sales"),
+            func.sum(models.Sale.quantity).label("units"),
+            func.sum(models.Sale.total_amount).label("revenue")
+        ).filter(
+            models.Sale.store_id.in_(store_ids),
+            models.Sale.sale_date >= cutoff
+        ).group_by(models.Sale.store_id).all()
+
+    totals = {row.store_id: row for row in _fan_out(stores, query)}
+    per_store = []
+    for store in stores:
+        row = totals.get(store.id)
+        per_store.append({
+            "store_id": store.id,
+            "store_code": store.code,
+            "store_name": store.name,
+            "sales": row.sales if row else 0,
+            "units_sold": int(row.units or 0) if row else 0,
+            "revenue": round(float(row.revenue or 0), 2) if row else 0.0
+        })
+    per_store.sort(key=lambda s: s["revenue"], reverse=True)
+
+    return {
+        "period_days": days,
+        "total_revenue": round(sum(s["revenue"] for s in per_store), 2),
+        "total_units_sold": sum(s["units_sold"] for s in per_store),
+        "total_sales": sum(s["sales"] for s in per_store),
+        "stores": per_store
+    }
@@ -0,0 +1,590 @@
+"""
+Offline-first edge sync.
+
+A store node runs the app on its own database (typically the tuned SQLite
+profile) with EDGE_NODE_ID and CENTRAL_URL set. Checkout never talks to the
+central server: every sale, restock and stock adjustment is appended to the
+local outbox in the same transaction as the change itself. A background
+thread pushes the outbox to the central server in gzip-compressed batches
+and marks events synced once the server acknowledges them, so an interrupted
+sync simply resumes from the oldest unsynced event.
+
+The central server (any instance; it needs no configuration) applies each
+event exactly once: a receipt row keyed by the event id is written in the
+same transaction, and replays of already applied events are acknowledged as
+duplicates. Stock changes are applied as deltas, so sales made centrally
+and at the store while it was offline both count. A sale the central stock
+cannot cover is still recorded (the goods are gone) and the stock is floored
+at zero; the shortfall is reported as a conflict, as are stock adjustments
+made from a level that no longer matches the central one.
+
+Events from a node whose id matches a store code are applied to that store's
+inventory (in whatever database holds it); other nodes apply to central
+stock. Another local instance can act as the central server in tests, and
+EdgeSyncer.http accepts any client with requests' post/get interface (such
+as a FastAPI TestClient).
+"""
+
+import gzip
+import json
+import os
+import threading
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import requests
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import case, func, update
+from sqlalchemy.orm import Session
+from . import models, schemas
+from .database import SessionLocal
+from .stores import store_router, _anchor_product, _fan_out
+from .forecasting import revenue_forecaster
+from .anomaly import anomaly_detector
+from .top_sellers import top_sellers
+from .search import product_search_index
+from .facets import catalog_facets
+
+
+class SyncError(Exception):
+    """A batch could not be decoded or applied"""
+
+
+# Edge side
+
+class EdgeSyncer:
+    """Pushes the local outbox to the central server and pulls its catalog"""
+
+    def __init__(self, node: Optional[str], central_url: Optional[str], token: Optional[str] = None,
+                 batch_size: int = 500, interval_seconds: float = 15.0, retention_days: int = 7,
+                 timeout_seconds: float = 30.0):
+        self.node = node
+        self.central_url = central_url.rstrip("/") if central_url else None
+        self.token = token
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        self.retention_days = retention_days
+        self.timeout_seconds = timeout_seconds
+        self.http = requests.Session()
+        self.batches_sent = 0
+        self.events_synced = 0
+        self.last_sync_at: Optional[datetime] = None
+        self.last_pull_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._sync_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.node and self.central_url)
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"X-Sync-Node": self.node}
+        if self.token:
+            headers["X-Sync-Token"] = self.token
+        return headers
+
+    def record(self, db: Session, kind: str, product_id: int, **data):
+        """Append an event to the outbox; the caller's commit makes it durable"""
+        if not self.enabled:
+            return
+        db.add(models.OutboxEvent(
+            event_id=uuid.uuid4().hex,
+            kind=kind,
+            product_id=product_id,
+            payload=json.dumps(data, default=str)
+        ))
+
+    def _backlog(self, db: Session) -> Tuple[int, Optional[datetime]]:
+        pending, oldest = db.query(
+            func.count(models.OutboxEvent.id), func.min(models.OutboxEvent.created_at)
+        ).filter(models.OutboxEvent.synced_at.is_(None)).one()
+        return pending, oldest
+
+    def _push_batch(self, db: Session) -> int:
+        """Send the oldest unsynced events; returns how many were acknowledged"""
+        events = db.query(models.OutboxEvent).filter(
+            models.OutboxEvent.synced_at.is_(None)
+        ).order_by(models.OutboxEvent.id).limit(self.batch_size).all()
+        if not events:
+            return 0
+
+        pending, oldest = self._backlog(db)
+        body = json.dumps({
+            "node": self.node,
+            "pending": pending,
+            "oldest_pending_at": oldest.isoformat() if oldest else None,
+            "events": [
+                {
+                    "event_id": e.event_id,
+                    "kind": e.kind,
+                    "product_id": e.product_id,
+                    "created_at": e.created_at.isoformat(),
+                    "data": json.loads(e.payload)
+                }
+                for e in events
+            ]
+        }).encode()
+        response = self.http.post(
+            f"{self.central_url}/sync/batches",
+            data=gzip.compress(body, compresslevel=6),
+            headers={**self._headers(), "Content-Type": "application/json", "Content-Encoding": "gzip"},
+            timeout=self.timeout_seconds
+        )
+        response.raise_for_status()
+
+        now = datetime.utcnow()
+        ids = {e.event_id: e.id for e in events}
+        acked = [
+            {
+                "id": ids[r["event_id"]],
+                "synced_at": now,
+                "sync_status": r["status"],
+                "sync_detail": json.dumps(r["detail"]) if r.get("detail") else None
+            }
+            for r in response.json()["results"] if r["event_id"] in ids
+        ]
+        if acked:
+            db.execute(update(models.OutboxEvent), acked)
+        db.commit()
+        self.batches_sent += 1
+        self.events_synced += len(acked)
+        return len(acked)
+
+    def sync_once(self) -> Dict:
+        """Push batches until the outbox is drained or the central server is unreachable"""
+        if not self.enabled:
+            raise SyncError("Edge mode is not configured (set EDGE_NODE_ID and CENTRAL_URL)")
+        with self._sync_lock:
+            db = SessionLocal()
+            synced = 0
+            try:
+                while True:
+                    acked = self._push_batch(db)
+                    synced += acked
+                    if acked < self.batch_size:
+                        break
+                self.last_sync_at = datetime.utcnow()
+                self.last_error = None
+                self._prune(db)
+            except Exception as e:
+                db.rollback()
+                self.last_error = str(e)
+            finally:
+                db.close()
+            return {"synced": synced, "error": self.last_error}
+
+    def _prune(self, db: Session):
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        db.query(models.OutboxEvent).filter(
+            models.OutboxEvent.synced_at.isnot(None),
+            models.OutboxEvent.synced_at < cutoff
+        ).delete(synchronize_session=False)
+        db.commit()
+
+    def pull_catalog(self, page_size: int = 500) -> Dict:
+        """Copy the central catalog (and this node's stock) into the local database
+
+        Stock is only taken over for products without unsynced local events,
+        since the central level does not include those yet.
+        """
+        if not self.enabled:
+            raise SyncError("Edge mode is not configured (set EDGE_NODE_ID and CENTRAL_URL)")
+        db = SessionLocal()
+        try:
+            dirty = {
+                pid for (pid,) in db.query(models.OutboxEvent.product_id).filter(
+                    models.OutboxEvent.synced_at.is_(None)
+                ).distinct()
+            }
+            pulled = stock_updated = 0
+            skip = 0
+            while True:
+                response = self.http.get(
+                    f"{self.central_url}/sync/catalog",
+                    params={"node": self.node, "skip": skip, "limit": page_size},
+                    headers=self._headers(),
+                    timeout=self.timeout_seconds
+                )
+                response.raise_for_status()
+                page = response.json()["products"]
+                for item in page:
+                    product = db.get(models.Product, item["id"])
+                    if product is None:
+                        product = models.Product(id=item["id"], stock=0)
+                        db.add(product)
+                    for field in ("name", "category", "price", "reorder_level", "barcode", "sku"):
+                        setattr(product, field, item[field])
+                    if item["id"] not in dirty and product.stock != item["stock"]:
+                        product.stock = item["stock"]
+                        db.add(models.StockHistory(product_id=item["id"], stock_level=item["stock"], action="sync"))
+                        stock_updated += 1
+                db.commit()
+                pulled += len(page)
+                skip += page_size
+                if len(page) < page_size:
+                    break
+
+            # The local catalog changed wholesale; rebuild rather than patch
+            if product_search_index.built:
+                product_search_index.rebuild(db)
+            if catalog_facets.built:
+                catalog_facets.rebuild(db)
+            self.last_pull_at = datetime.utcnow()
+            return {"products": pulled, "stock_updated": stock_updated, "skipped_unsynced": len(dirty)}
+        finally:
+            db.close()
+
+    def _worker(self):
+        try:
+            self.pull_catalog()
+        except Exception as e:
+            self.last_error = f"catalog pull failed: {e}"
+        while not self._stop.wait(self.interval_seconds):
+            self.sync_once()
+
+    def start(self):
+        if self._thread or not self.enabled:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._worker, name="edge-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.timeout_seconds)
+        self._thread = None
+
+    def status(self, db: Session) -> Dict:
+        pending, oldest = self._backlog(db)
+        problems = db.query(models.OutboxEvent).filter(
+            models.OutboxEvent.sync_status.in_(("conflict", "rejected"))
+        ).order_by(models.OutboxEvent.id.desc()).limit(20).all()
+        return {
+            "enabled": self.enabled,
+            "node": self.node,
+            "central_url": self.central_url,
+            "running": self._thread is not None,
+            "pending_events": pending,
+            "oldest_pending_at": oldest,
+            "lag_seconds": round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0.0,
+            "last_sync_at": self.last_sync_at,
+            "last_pull_at": self.last_pull_at,
+            "last_error": self.last_error,
+            "batches_sent": self.batches_sent,
+            "events_synced": self.events_synced,
+            "recent_conflicts": [
+                {
+                    "event_id": e.event_id,
+                    "kind": e.kind,
+                    "product_id": e.product_id,
+                    "status": e.sync_status,
+                    "detail": json.loads(e.sync_detail) if e.sync_detail else None,
+                    "created_at": e.created_at
+                }
+                for e in problems
+            ]
+        }
+
+# Singleton instance
+edge_syncer = EdgeSyncer(
+    node=os.getenv("EDGE_NODE_ID"),
+    central_url=os.getenv("CENTRAL_URL"),
+    token=os.getenv("SYNC_TOKEN"),
+    batch_size=int(os.getenv("SYNC_BATCH_SIZE", "500")),
+    interval_seconds=float(os.getenv("SYNC_INTERVAL_SECONDS", "15")),
+    retention_days=int(os.getenv("SYNC_OUTBOX_RETENTION_DAYS", "7"))
+)
+
+
+# Central side
+
+SYNC_MAX_BATCH_BYTES = int(os.getenv("SYNC_MAX_BATCH_BYTES", str(16 * 1024 * 1024)))
+
+# Backlog each node reported with its latest batch
+_node_reports: Dict[str, Dict] = {}
+_node_reports_lock = threading.Lock()
+
+
+def decode_batch(body: bytes, content_encoding: Optional[str]) -> schemas.SyncBatch:
+    """Decompress (with a size cap) and validate a batch"""
+    if content_encoding == "gzip":
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = inflater.decompress(body, SYNC_MAX_BATCH_BYTES)
+        except zlib.error as e:
+            raise SyncError(f"Invalid gzip body: {e}")
+        if inflater.unconsumed_tail:
+            raise SyncError("Batch too large")
+    elif content_encoding not in (None, "identity"):
+        raise SyncError(f"Unsupported Content-Encoding: {content_encoding}")
+    try:
+        return schemas.SyncBatch.model_validate_json(body)
+    except ValueError as e:
+        raise SyncError(f"Invalid batch: {e}")
+
+
+def _shift_stock(target: Session, model, filters: List, delta: int) -> Tuple[int, int]:
+    """Add delta to a stock level, flooring at zero; returns (new level, shortfall)"""
+    now = datetime.utcnow()
+    shortfall = 0
+    moved = target.query(model).filter(*filters, model.stock + delta >= 0).update(
+        {model.stock: model.stock + delta, model.updated_at: now}, synchronize_session=False
+    )
+    if not moved:
+        level = target.query(model.stock).filter(*filters).scalar()
+        shortfall = -(level + delta)
+        target.query(model).filter(*filters).update(
+            {model.stock: 0, model.updated_at: now}, synchronize_session=False
+        )
+    return target.query(model.stock).filter(*filters).scalar(), shortfall
+
+
+def _stock_target(target: Session, store: Optional[models.Store], product: models.Product):
+    """The model and filter holding this product's stock for the node"""
+    if store is None:
+        return models.Product, [models.Product.id == product.id]
+    filters = [models.StoreInventory.store_id == store.id, models.StoreInventory.product_id == product.id]
+    if not target.query(models.StoreInventory.id).filter(*filters).first():
+        _anchor_product(target, store, product)
+        target.add(models.StoreInventory(
+            store_id=store.id, product_id=product.id, stock=0, reorder_level=product.reorder_level
+        ))
+        target.flush()
+    return models.StoreInventory, filters
+
+
+def _apply_event(target: Session, store: Optional[models.Store], product: models.Product,
+                 event: schemas.SyncEvent, data: BaseModel) -> Tuple[str, Optional[Dict], Optional[models.Sale]]:
+    model, filters = _stock_target(target, store, product)
+    store_id = store.id if store else None
+    status, detail, sale = "applied", None, None
+
+    if event.kind == schemas.SyncEventKind.SALE:
+        quantity = data.quantity
+        level, shortfall = _shift_stock(target, model, filters, -quantity)
+        sale = models.Sale(
+            product_id=product.id,
+            store_id=store_id,
+            quantity=quantity,
+            total_amount=data.total_amount if data.total_amount is not None else product.price * quantity,
+            sale_date=data.sale_date or event.created_at
+        )
+        target.add(sale)
+        if shortfall:
+            status, detail = "conflict", {"type": "oversold", "shortfall": shortfall}
+    elif event.kind == schemas.SyncEventKind.RESTOCK:
+        level, _ = _shift_stock(target, model, filters, data.quantity)
+    else:
+        # Replay the count as a change relative to what the store saw, so
+        # movements the central server recorded meanwhile are kept
+        previous, counted = data.previous, data.stock
+        before = target.query(model.stock).filter(*filters).scalar()
+        level, shortfall = _shift_stock(target, model, filters, counted - previous)
+        if before != previous or shortfall:
+            status, detail = "conflict", {
+                "type": "diverged", "central_level": before, "edge_level": previous,
+                "counted": counted, "resulting_level": level
+            }
+
+    target.add(models.StockHistory(
+        product_id=product.id, store_id=store_id, stock_level=level, action=event.kind.value
+    ))
+    return status, detail, sale
+
+
+def apply_batch(db: Session, batch: schemas.SyncBatch) -> Dict:
+    """Apply a node's events exactly once, in one transaction"""
+    store = db.query(models.Store).filter(
+        models.Store.code == batch.node, models.Store.is_active == True
+    ).first()
+    shared = store is None or store_router.is_shared(store)
+    target = db if shared else store_router.session(store)
+    try:
+        event_ids = [e.event_id for e in batch.events]
+        seen = {
+            r.event_id: r.status for r in target.query(
+                models.SyncReceipt.event_id, models.SyncReceipt.status
+            ).filter(models.SyncReceipt.event_id.in_(event_ids))
+        } if event_ids else {}
+        product_ids = {e.product_id for e in batch.events}
+        products = {
+            p.id: p for p in db.query(models.Product).filter(models.Product.id.in_(product_ids))
+        } if product_ids else {}
+
+        results, sales = [], []
+        for event in batch.events:
+            if event.event_id in seen:
+                results.append({"event_id": event.event_id, "status": "duplicate",
+                                "detail": {"original_status": seen[event.event_id]}})
+                continue
+            product = products.get(event.product_id)
+            try:
+                data = schemas.SYNC_EVENT_DATA[event.kind].model_validate(event.data)
+            except ValidationError as e:
+                data, invalid = None, [
+                    {"field": ".".join(str(part) for part in error["loc"]), "message": error["msg"]}
+                    for error in e.errors()
+                ]
+            if product is None:
+                status, detail, sale = "rejected", {"type": "unknown_product"}, None
+            elif data is None:
+                status, detail, sale = "rejected", {"type": "invalid_payload", "errors": invalid}, None
+            else:
+                status, detail, sale = _apply_event(target, store, product, event, data)
+            if sale is not None:
+                sales.append((sale, product))
+            target.add(models.SyncReceipt(
+                event_id=event.event_id, node=batch.node, kind=event.kind.value,
+                product_id=event.product_id, event_at=event.created_at, status=status,
+                detail=json.dumps(detail) if detail else None
+            ))
+            seen[event.event_id] = status
+            results.append({"event_id": event.event_id, "status": status, "detail": detail})
+        try:
+            target.commit()
+        except Exception:
+            # Typically the same batch being replayed concurrently; the node retries
+            target.rollback()
+            raise
+    finally:
+        if target is not db:
+            target.close()
+
+    # Streaming analytics are rebuilt from the shared database only
+    if shared:
+        for sale, product in sales:
+            revenue_forecaster.record_sale(sale.sale_date, sale.total_amount)
+            anomaly_detector.record_sale(sale, product)
+            top_sellers.record_sale(product.id, product.name, sale.sale_date, sale.quantity)
+        if store is None:
+            for product_id in product_ids & products.keys():
+                db.refresh(products[product_id])
+                catalog_facets.update(products[product_id])
+
+    now = datetime.utcnow()
+    with _node_reports_lock:
+        _node_reports[batch.node] = {
+            "reported_pending": batch.pending,
+            "reported_oldest_pending_at": batch.oldest_pending_at,
+            "last_batch_at": now
+        }
+    counts: Dict[str, int] = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    return {"node": batch.node, "received": len(results), "counts": counts, "results": results}
+
+
+def catalog_for(db: Session, node: str, skip: int, limit: int) -> Dict:
+    """Catalog page with the node's stock: its store inventory, else central stock"""
+    store = db.query(models.Store).filter(models.Store.code == node).first()
+    products = db.query(models.Product).order_by(models.Product.id).offset(skip).limit(limit).all()
+    levels = {p.id: p.stock for p in products}
+    if store is not None:
+        store_db = db if store_router.is_shared(store) else store_router.session(store)
+        try:
+            stocked = dict(store_db.query(
+                models.StoreInventory.product_id, models.StoreInventory.stock
+            ).filter(
+                models.StoreInventory.store_id == store.id,
+                models.StoreInventory.product_id.in_(list(levels))
+            ).all()) if levels else {}
+        finally:
+            if store_db is not db:
+                store_db.close()
+        levels = {pid: stocked.get(pid, 0) for pid in levels}
+    return {
+        "node": node,
+        "store": store.code if store else None,
+        "products": [
+            {
+                "id": p.id, "name": p.name, "category": p.category, "price": p.price,
+                "reorder_level": p.reorder_level, "barcode": p.barcode, "sku": p.sku,
+                "stock": levels[p.id]
+            }
+            for p in products
+        ]
+    }
+
+
+def _receipt_query(db: Session, query) -> List:
+    """Run query(session) against the shared database and every dedicated store database"""
+    dedicated = [
+        store for store in db.query(models.Store).filter(models.Store.is_active == True)
+        if not store_router.is_shared(store)
+    ]
+    return query(db) + _fan_out(dedicated, lambda session, store_ids: query(session))
+
+
+def node_status(db: Session) -> List[Dict]:
+    """Events, conflicts and lag per edge node, as seen by the central server"""
+    receipt = models.SyncReceipt
+
+    def query(session: Session):
+        return session.query(
+            receipt.node,
+            func.count(receipt.id).label("events"),
+            func.sum(case((receipt.status == "conflict", 1), else_=0)).label("conflicts"),
+            func.sum(case((receipt.status == "rejected", 1), else_=0)).label("rejected"),
+            func.max(receipt.event_at).label("last_event_at"),
+            func.max(receipt.received_at).label("last_received_at")
+        ).group_by(receipt.node).all()
+
+    nodes: Dict[str, Dict] = {}
+    for row in _receipt_query(db, query):
+        entry = nodes.setdefault(row.node, {
+            "node": row.node, "events": 0, "conflicts": 0, "rejected": 0,
+            "last_event_at": None, "last_received_at": None
+        })
+        entry["events"] += row.events
+        entry["conflicts"] += int(row.conflicts or 0)
+        entry["rejected"] += int(row.rejected or 0)
+        for field in ("last_event_at", "last_received_at"):
+            value = getattr(row, field)
+            if value is not None and (entry[field] is None or value > entry[field]):
+                entry[field] = value
+
+    now = datetime.utcnow()
+    with _node_reports_lock:
+        reports = dict(_node_reports)
+    for name, report in reports.items():
+        nodes.setdefault(name, {
+            "node": name, "events": 0, "conflicts": 0, "rejected": 0,
+            "last_event_at": None, "last_received_at": None
+        }).update(report)
+    for entry in nodes.values():
+        oldest = entry.get("reported_oldest_pending_at")
+        # Lag as of the node's last batch: how old its oldest unsynced event was
+        entry["lag_seconds"] = round((entry["last_batch_at"] - oldest).total_seconds(), 1) \
+            if oldest and entry.get("last_batch_at") else None
+        last_heard = entry.get("last_batch_at") or entry["last_received_at"]
+        entry["seconds_since_last_batch"] = round((now - last_heard).total_seconds(), 1) if last_heard else None
+    return sorted(nodes.values(), key=lambda n: n["node"])
+
+
+def list_conflicts(db: Session, node: Optional[str] = None, limit: int = 100) -> List[Dict]:
+    receipt = models.SyncReceipt
+
+    def query(session: Session):
+        q = session.query(receipt).filter(receipt.status.in_(("conflict", "rejected")))
+        if node:
+            q = q.filter(receipt.node == node)
+        return q.order_by(receipt.received_at.desc()).limit(limit).all()
+
+    rows = sorted(_receipt_query(db, query), key=lambda r: r.received_at, reverse=True)[:limit]
+    return [
+        {
+            "event_id": r.event_id,
+            "node": r.node,
+            "kind": r.kind,
+            "product_id": r.product_id,
+            "status": r.status,
+            "detail": json.loads(r.detail) if r.detail else None,
+            "event_at": r.event_at,
+            "received_at": r.received_at
+        }
+        for r in rows
+    ]
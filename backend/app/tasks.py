@@ -0,0 +1,94 @@
+"""
+Background job tasks and the nightly precomputation schedule.
+
+Every task takes (db, params, ctx) and returns a JSON-serializable result.
+"""
+
+from sqlalchemy.orm import Session
+from . import models
+from .jobs import job_runner, JobContext
+from .ml_model import stock_predictor
+from .advanced_ml import advanced_analytics
+from .replenishment import replenishment_engine
+from .forecasting import revenue_forecaster
+from .anomaly import anomaly_detector
+from .top_sellers import top_sellers
+from .search import product_search_index
+from .facets import catalog_facets
+from .partitions import partition_manager
+
+
+@job_runner.task("stock_predictions")
+def stock_predictions(db: Session, params: dict, ctx: JobContext):
+    return stock_predictor.get_all_predictions(db)
+
+
+@job_runner.task("seasonal_trends")
+def seasonal_trends(db: Session, params: dict, ctx: JobContext):
+    return advanced_analytics.seasonal_trends_analysis(db)
+
+
+@job_runner.task("category_performance")
+def category_performance(db: Session, params: dict, ctx: JobContext):
+    return advanced_analytics.category_performance(db)
+
+
+@job_runner.task("demand_forecast")
+def demand_forecast(db: Session, params: dict, ctx: JobContext):
+    return advanced_analytics.demand_forecasting(db, params["product_id"], params.get("days", 30))
+
+
+@job_runner.task("demand_forecast_batch")
+def demand_forecast_batch(db: Session, params: dict, ctx: JobContext):
+    """Demand forecasts for many products (all by default)"""
+    product_ids = params.get("product_ids")
+    if product_ids is None:
+        product_ids = [pid for (pid,) in db.query(models.Product.id).order_by(models.Product.id).all()]
+    days = params.get("days", 30)
+    forecasts = []
+    for i, product_id in enumerate(product_ids):
+        if i % 25 == 0:
+            ctx.check_cancelled()
+        forecasts.append(advanced_analytics.demand_forecasting(db, product_id, days))
+    return forecasts
+
+
+@job_runner.task("price_optimization")
+def price_optimization(db: Session, params: dict, ctx: JobContext):
+    return advanced_analytics.run_price_optimization_job(db)
+
+
+@job_runner.task("replenishment")
+def replenishment(db: Session, params: dict, ctx: JobContext):
+    return replenishment_engine.run(
+        db,
+        dry_run=params.get("dry_run", True),
+        service_level=params.get("service_level", 0.95)
+    )
+
+
+@job_runner.task("rebuild_streaming_state")
+def rebuild_streaming_state(db: Session, params: dict, ctx: JobContext):
+    """Recompute in-memory forecast, anomaly, top-seller, search and facet state from the DB"""
+    return {
+        "revenue_forecast": revenue_forecaster.rebuild(db),
+        "anomalies": anomaly_detector.rebuild(db),
+        "top_sellers": top_sellers.rebuild(db),
+        "product_search": product_search_index.rebuild(db),
+        "catalog_facets": catalog_facets.rebuild(db)
+    }
+
+
+@job_runner.task("partition_maintenance")
+def partition_maintenance(db: Session, params: dict, ctx: JobContext):
+    """Create upcoming monthly partitions and archive months past ARCHIVE_AFTER_MONTHS"""
+    return partition_manager.maintain(db)
+
+
+# Nightly precomputation (UTC)
+job_runner.schedule("nightly-partition-maintenance", "30 1 * * *", "partition_maintenance")
+job_runner.schedule("nightly-price-optimization", "0 2 * * *", "price_optimization")
+job_runner.schedule("nightly-streaming-rebuild", "30 2 * * *", "rebuild_streaming_state")
+job_runner.schedule("nightly-stock-predictions", "0 3 * * *", "stock_predictions")
+job_runner.schedule("nightly-seasonal-trends", "15 3 * * *", "seasonal_trends")
+job_runner.schedule("nightly-replenishment-plan", "30 3 * * *", "replenishment", {"dry_run": True})
@@ -0,0 +1,154 @@
+"""
+Sliding-window top sellers kept in memory.
+
+Units sold are counted in hourly buckets, and a running counter is kept for
+each of the standard 1, 7, 30 and 90 day windows. Recording a sale touches
+one bucket and four counters; as time moves on, buckets that slide out of a
+window are subtracted from its counter. Top-N queries for those windows are
+then a heap selection over the products sold in the window instead of a
+GROUP BY over the sales table. Other windows fall back to SQL.
+"""
+
+import heapq
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from . import models
+
+BUCKET = timedelta(hours=1)
+
+
+def _floor_hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class TopSellers:
+    """Hourly bucketed unit counters with per-window running totals"""
+
+    WINDOWS = (1, 7, 30, 90)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._buckets: "OrderedDict[datetime, Counter]" = OrderedDict()
+        self._windows: Dict[int, Counter] = {days: Counter() for days in self.WINDOWS}
+        self._starts: Dict[int, datetime] = {}
+        self._names: Dict[int, str] = {}
+        self.built = False
+        self.built_at: Optional[datetime] = None
+
+    def window_start(self, days: int, now: Optional[datetime] = None) -> datetime:
+        """First hour bucket counted in a window ending at now"""
+        return _floor_hour((now or datetime.utcnow()) - timedelta(days=days))
+
+    def _advance(self, now: datetime):
+        """Subtract buckets that slid out of each window"""
+        for days in self.WINDOWS:
+            new_start = self.window_start(days, now)
+            hour = self._starts[days]
+            counter = self._windows[days]
+            while hour < new_start:
+                bucket = self._buckets.get(hour)
+                if bucket:
+                    for product_id, quantity in bucket.items():
+                        remaining = counter[product_id] - quantity
+                        if remaining > 0:
+                            counter[product_id] = remaining
+                        else:
+                            del counter[product_id]
+                hour += BUCKET
+            self._starts[days] = new_start
+
+        # Buckets older than the widest window are no longer needed
+        oldest = self._starts[max(self.WINDOWS)]
+        while self._buckets:
+            hour = next(iter(self._buckets))
+            if hour >= oldest:
+                break
+            self._buckets.popitem(last=False)
+
+    def _add(self, product_id: int, sale_date: datetime, quantity: int):
+        hour = _floor_hour(sale_date)
+        if hour < self._starts[max(self.WINDOWS)]:
+            return
+        bucket = self._buckets.get(hour)
+        if bucket is None:
+            bucket = self._buckets[hour] = Counter()
+            if len(self._buckets) > 1 and hour < next(reversed(self._buckets)):
+                self._buckets = OrderedDict(sorted(self._buckets.items()))
+        bucket[product_id] += quantity
+        for days in self.WINDOWS:
+            if hour >= self._starts[days]:
+                self._windows[days][product_id] += quantity
+
+    def rebuild(self, db: Session) -> Dict:
+        """Recount the buckets from the last 90 days of sales"""
+        now = datetime.utcnow()
+        cutoff = self.window_start(max(self.WINDOWS), now)
+        rows = db.query(
+            models.Sale.product_id,
+            models.Sale.sale_date,
+            models.Sale.quantity
+        ).filter(
+            models.Sale.sale_date >= cutoff
+        ).yield_per(10000)
+        names = dict(db.query(models.Product.id, models.Product.name).all())
+
+        with self._lock:
+            self._reset()
+            self._starts = {days: self.window_start(days, now) for days in self.WINDOWS}
+            self._names = names
+            for product_id, sale_date, quantity in rows:
+                self._add(product_id, sale_date, quantity)
+            self.built = True
+            self.built_at = now
+            return self.status()
+
+    def evict(self):
+        """Drop the buckets to free memory; the next query rebuilds them"""
+        with self._lock:
+            self._reset()
+
+    def record_sale(self, product_id: int, product_name: str, sale_date: datetime, quantity: int):
+        """Count a newly committed sale"""
+        with self._lock:
+            if not self.built:
+                # The next rebuild will count this sale from the database
+                return
+            self._names[product_id] = product_name
+            self._add(product_id, sale_date, quantity)
+
+    def rename(self, product_id: int, name: str):
+        with self._lock:
+            if product_id in self._names:
+                self._names[product_id] = name
+
+    def top(self, db: Session, limit: int, days: int) -> Optional[List[Tuple[int, str, int]]]:
+        """Top sellers as (id, name, total_sold), or None for non-standard windows"""
+        if days not in self.WINDOWS:
+            return None
+        if not self.built:
+            self.rebuild(db)
+
+        with self._lock:
+            self._advance(datetime.utcnow())
+            best = heapq.nlargest(limit, self._windows[days].items(), key=lambda item: item[1])
+            return [
+                (product_id, self._names.get(product_id), total)
+                for product_id, total in best
+            ]
+
+    def status(self) -> Dict:
+        return {
+            "built": self.built,
+            "built_at": self.built_at,
+            "buckets": len(self._buckets),
+            "products_per_window": {days: len(self._windows[days]) for days in self.WINDOWS}
+        }
+
+# Singleton instance
+top_sellers = TopSellers()
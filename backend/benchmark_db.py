@@ -0,0 +1,242 @@
+"""
+SQLite vs PostgreSQL benchmark for store-edge deployments
+Compares the tuned SQLite profile against stock SQLite settings and, when a
+URL is given, PostgreSQL on the checkout (sales) path, the barcode scan path
+(lookup by barcode plus quick sale) and the analytics scans.
+Run from backend folder:
+    python benchmark_db.py [--postgres postgresql://...] [--json results.json]
+
+PostgreSQL runs inside a throwaway schema, so existing tables are untouched.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# The app builds its default engine on import; point it somewhere harmless
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, func, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, schemas
+from app.database import create_engine_for
+from app.dialects import date_of
+from generate_data import ean13
+
+BENCH_SCHEMA = "retail_bench"
+CATEGORIES = ["Electronics", "Mobile Phones", "Audio", "Grocery", "Clothing", "Home", "Sports", "Toys"]
+
+
+def build_targets(args, workdir):
+    targets = [
+        ("sqlite-tuned", create_engine_for(f"sqlite:///{os.path.join(workdir, 'tuned.db')}")),
+        ("sqlite-default", create_engine(
+            f"sqlite:///{os.path.join(workdir, 'default.db')}",
+            connect_args={"check_same_thread": False}
+        )),
+    ]
+    if args.postgres:
+        pg = create_engine_for(args.postgres)
+        with pg.begin() as conn:
+            conn.execute(text(f'DROP SCHEMA IF EXISTS "{BENCH_SCHEMA}" CASCADE'))
+            conn.execute(text(f'CREATE SCHEMA "{BENCH_SCHEMA}"'))
+        targets.append(("postgresql", pg.execution_options(schema_translate_map={None: BENCH_SCHEMA})))
+    return targets
+
+
+def seed(engine, products, sales, rng):
+    """Bulk-load a catalog and a year of backdated sales"""
+    models.Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(models.Product), [
+            {
+                "id": i, "name": f"Product {i}", "category": rng.choice(CATEGORIES),
+                "stock": rng.randint(0, 500), "reserved": 0,
+                "price": round(rng.uniform(2, 1500), 2), "reorder_level": rng.randint(5, 40),
+                "barcode": ean13(i), "sku": f"SKU-{i:06d}",
+                "created_at": now, "updated_at": now
+            }
+            for i in range(1, products + 1)
+        ])
+        for start in range(0, sales, 10000):
+            rows = []
+            for _ in range(start, min(start + 10000, sales)):
+                quantity = rng.randint(1, 5)
+                rows.append({
+                    "product_id": rng.randint(1, products), "quantity": quantity,
+                    "total_amount": round(quantity * rng.uniform(2, 500), 2),
+                    "sale_date": now - timedelta(seconds=rng.randint(0, 365 * 86400))
+                })
+            conn.execute(insert(models.Sale), rows)
+        # Plenty of stock for the checkout phase
+        conn.execute(models.Product.__table__.update().values(stock=1000000))
+
+
+def summarize(samples):
+    samples = sorted(samples)
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000, 3)
+
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+    }
+
+
+def run_checkouts(Session, items, threads, sell):
+    """Run sell(db, item) for each item from `threads` concurrent checkouts"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def checkout(item):
+        nonlocal errors
+        db = Session()
+        started = time.perf_counter()
+        try:
+            sell(db, item)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+        except Exception:
+            with lock:
+                errors += 1
+        finally:
+            db.close()
+
+    # The first sales build the streaming analytics; keep that out of the timings
+    for item in items[:threads]:
+        checkout(item)
+    latencies.clear()
+    errors = 0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(checkout, items))
+    wall = time.perf_counter() - started
+
+    result = summarize(latencies) if latencies else {"count": 0}
+    result.update({
+        "threads": threads,
+        "errors": errors,
+        "throughput_per_s": round(len(latencies) / wall, 1),
+    })
+    return result
+
+
+def bench_sales(Session, products, count, threads, rng):
+    """crud.create_sale by product id"""
+    product_ids = [rng.randint(1, products) for _ in range(count)]
+
+    def sell(db, product_id):
+        crud.create_sale(db, schemas.SaleCreate(product_id=product_id, quantity=1))
+
+    return run_checkouts(Session, product_ids, threads, sell)
+
+
+def bench_barcode_sales(Session, products, count, threads, rng):
+    """Barcode scan at the till: product lookup by barcode, then the quick sale"""
+    barcodes = [ean13(rng.randint(1, products)) for _ in range(count)]
+
+    def sell(db, barcode):
+        # Same statements as POST /barcode/quick-sale
+        product = db.query(models.Product).filter(models.Product.barcode == barcode).first()
+        if not product:
+            raise LookupError(barcode)
+        crud.create_sale(db, schemas.SaleCreate(product_id=product.id, quantity=1))
+
+    return run_checkouts(Session, barcodes, threads, sell)
+
+
+def scan_queries():
+    year_ago = datetime.utcnow() - timedelta(days=365)
+    return {
+        "top_selling_30d": lambda db: crud.get_top_selling_products(db, limit=10, days=30),
+        "low_stock": lambda db: crud.get_low_stock_products(db),
+        "daily_revenue_365d": lambda db: db.query(
+            date_of(models.Sale.sale_date).label("day"),
+            func.sum(models.Sale.total_amount)
+        ).filter(models.Sale.sale_date >= year_ago).group_by("day").all(),
+        "category_revenue": lambda db: db.query(
+            models.Product.category, func.sum(models.Sale.total_amount)
+        ).join(models.Sale).group_by(models.Product.category).all(),
+        "products_page": lambda db: crud.get_products(db, skip=200, limit=50, category="Audio"),
+    }
+
+
+def bench_scans(Session, repeat):
+    results = {}
+    for name, query in scan_queries().items():
+        db = Session()
+        try:
+            query(db)  # warm caches
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                query(db)
+                samples.append(time.perf_counter() - started)
+        finally:
+            db.close()
+        results[name] = summarize(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--postgres", help="PostgreSQL URL to compare against")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--sales", type=int, default=100000, help="Backdated sales to seed")
+    parser.add_argument("--checkouts", type=int, default=2000, help="Sales to record per target")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per scan query")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    report = {"config": vars(args), "targets": {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, engine in build_targets(args, workdir):
+            rng = random.Random(args.seed)
+            print(f"== {name}: seeding {args.products} products / {args.sales} sales")
+            seed(engine, args.products, args.sales, rng)
+            Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+            sales = bench_sales(Session, args.products, args.checkouts, args.threads, rng)
+            print(f"   sales: {sales['throughput_per_s']}/s, p50 {sales.get('p50_ms')} ms, "
+                  f"p99 {sales.get('p99_ms')} ms, errors {sales['errors']}")
+            barcode = bench_barcode_sales(Session, args.products, args.checkouts, args.threads, rng)
+            print(f"   barcode: {barcode['throughput_per_s']}/s, p50 {barcode.get('p50_ms')} ms, "
+                  f"p99 {barcode.get('p99_ms')} ms, errors {barcode['errors']}")
+            scans = bench_scans(Session, args.repeat)
+            for query, stats in scans.items():
+                print(f"   {query:<20} p50 {stats['p50_ms']:>9} ms   p95 {stats['p95_ms']:>9} ms")
+
+            report["targets"][name] = {"sales": sales, "barcode_sales": barcode, "scans": scans}
+            if name == "postgresql":
+                with engine.begin() as conn:
+                    conn.execute(text(f'DROP SCHEMA IF EXISTS "{BENCH_SCHEMA}" CASCADE'))
+            engine.dispose()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
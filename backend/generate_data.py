@@ -0,0 +1,318 @@
+"""
+Synthetic dataset generator writing straight to the database
+Bulk-inserts products, suppliers, purchase orders, backdated sales and the
+stock history that goes with them, for analytics work and load testing.
+Sales follow yearly seasonality, a weekday pattern, opening hours and a
+long-tailed product popularity; stock is simulated sale by sale, so every
+StockHistory row and the final product stock agree with the sales and
+deliveries. The same --seed and --end-date always give the same data.
+Run from backend folder:
+    python generate_data.py --scale 10              # ~100k sales
+    python generate_data.py --scale 1000 --reset    # ~10M sales
+
+--scale 1 is 10,000 sales over --days 365; products and suppliers grow with
+the square root of the scale. The target database comes from DATABASE_URL
+(or --database-url) and must have no products unless --reset is given,
+which drops and recreates every table.
+"""
+
+import argparse
+import math
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import bindparam, func, insert, select, text, update
+
+from app import models
+from app.database import DATABASE_URL, create_engine_for
+
+SALES_PER_SCALE = 10000
+
+# category: (min price, max price, extra units per sale, relative demand)
+CATEGORIES = {
+    "Electronics": (300, 2500, 0.05, 0.5),
+    "Mobile Phones": (200, 1300, 0.05, 0.8),
+    "Tablets": (150, 1200, 0.05, 0.5),
+    "Audio": (30, 450, 0.2, 0.9),
+    "Computer Accessories": (15, 200, 0.4, 1.1),
+    "Tech Accessories": (8, 90, 0.8, 1.4),
+    "Office Furniture": (80, 1400, 0.05, 0.25),
+    "Home Appliances": (40, 800, 0.1, 0.6),
+    "Stationery": (1, 25, 2.0, 1.8),
+    "Smart Home": (25, 350, 0.2, 0.7),
+}
+# Monday..Sunday
+WEEKDAY_FACTORS = (0.85, 0.9, 0.95, 1.0, 1.15, 1.35, 1.1)
+# Share of a day's sales per hour; the store is shut overnight
+HOUR_WEIGHTS = np.array([0] * 8 + [2, 4, 6, 7, 9, 8, 7, 7, 8, 9, 10, 8, 5, 3] + [0] * 2, dtype=float)
+HOUR_WEIGHTS /= HOUR_WEIGHTS.sum()
+
+LEAD_DAYS = (2, 7)  # supplier lead time range
+COVER_DAYS = 30  # demand one purchase order covers
+SAFETY = 1.8  # reorder point headroom over average lead-time demand (peak season)
+
+
+def ean13(number: int) -> str:
+    """EAN-13 in the in-store 20 prefix range"""
+    digits = f"20{number:010d}"
+    check = (10 - sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits)) % 10) % 10
+    return digits + str(check)
+
+
+def day_weights(days, end: datetime, seasonality: float, growth: float) -> np.ndarray:
+    """Relative sales volume per day: yearly cycle peaking in December, weekdays, trend"""
+    weights = np.empty(days)
+    for i in range(days):
+        day = end - timedelta(days=days - i)
+        season = 1 + seasonality * math.cos(2 * math.pi * (day.timetuple().tm_yday - 350) / 365.25)
+        if day.month == 11 and day.day >= 24:  # holiday sales week
+            season *= 1.5
+        weights[i] = season * WEEKDAY_FACTORS[day.weekday()] * (1 + growth * i / max(days - 1, 1))
+    return weights / weights.sum()
+
+
+class Generator:
+    def __init__(self, engine, args):
+        self.engine = engine
+        self.args = args
+        self.rng = np.random.default_rng(args.seed)
+        self.end = args.end_date
+        self.start = self.end - timedelta(days=args.days)
+        self.counts = {"products": 0, "suppliers": 0, "purchase_orders": 0,
+                       "sales": 0, "stock_history": 0, "lost_sales": 0}
+
+    # Catalog
+
+    def build_catalog(self, n_products, n_suppliers):
+        rng = self.rng
+        names = list(CATEGORIES)
+        category_demand = np.array([CATEGORIES[c][3] for c in names])
+        self.category = rng.choice(len(names), size=n_products, p=category_demand / category_demand.sum())
+
+        low = np.array([CATEGORIES[names[c]][0] for c in self.category], dtype=float)
+        high = np.array([CATEGORIES[names[c]][1] for c in self.category], dtype=float)
+        # Log-uniform: most items sit at the cheap end of their category
+        self.price = np.round(np.exp(rng.uniform(np.log(low), np.log(high))), 2)
+        self.extra_units = np.array([CATEGORIES[names[c]][2] for c in self.category])
+
+        # Long tail: a few products sell far more than the rest
+        popularity = 1.0 / np.arange(1, n_products + 1) ** 0.9
+        rng.shuffle(popularity)
+        popularity *= category_demand[self.category]
+        self.popularity = popularity / popularity.sum()
+
+        sales_per_day = self.args.sales / self.args.days
+        daily_units = sales_per_day * self.popularity * (1 + self.extra_units)
+        self.reorder_level = np.ceil(daily_units * LEAD_DAYS[1] * SAFETY).astype(int) + 1
+        self.order_quantity = np.ceil(daily_units * COVER_DAYS).astype(int) + self.reorder_level
+        self.stock = (self.reorder_level + self.order_quantity).astype(int)
+
+        # Each supplier serves one category; every category has at least one
+        supplier_categories = [i % len(names) for i in range(max(n_suppliers, len(names)))]
+        self.suppliers = [
+            {
+                "id": i + 1,
+                "name": f"{names[c]} Supply {i // len(names) + 1}",
+                "contact_person": f"Account Manager {i + 1}",
+                "email": f"orders{i + 1}@supplier.example",
+                "phone": f"+1-555-{i + 1:04d}",
+                "address": f"{100 + i} Warehouse Row",
+                "rating": round(float(rng.uniform(3.0, 5.0)), 1),
+                "total_orders": 0,
+                "created_at": self.start,
+                "is_active": True,
+            }
+            for i, c in enumerate(supplier_categories)
+        ]
+        by_category = {}
+        for supplier, c in zip(self.suppliers, supplier_categories):
+            by_category.setdefault(c, []).append(supplier["id"])
+        self.supplier_of = np.array([by_category[c][p % len(by_category[c])] for p, c in enumerate(self.category)])
+
+        with self.engine.begin() as conn:
+            conn.execute(insert(models.Supplier), self.suppliers)
+            for offset in range(0, n_products, self.args.batch):
+                conn.execute(insert(models.Product), [
+                    {
+                        "id": p + 1,
+                        "name": f"{names[self.category[p]]} Item {p + 1:06d}",
+                        "category": names[self.category[p]],
+                        "stock": int(self.stock[p]),
+                        "reserved": 0,
+                        "price": float(self.price[p]),
+                        "reorder_level": int(self.reorder_level[p]),
+                        "created_at": self.start,
+                        "updated_at": self.start,
+                        "barcode": ean13(p + 1),
+                        "sku": f"SKU-{p + 1:07d}",
+                    }
+                    for p in range(offset, min(offset + self.args.batch, n_products))
+                ])
+            # Explicit ids leave PostgreSQL sequences behind; move them past the new rows
+            if self.engine.dialect.name == "postgresql":
+                for table in ("products", "suppliers"):
+                    conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), MAX(id)) FROM {table}"))
+            self.history = [
+                {"product_id": p + 1, "stock_level": int(self.stock[p]), "action": "initial", "recorded_at": self.start}
+                for p in range(n_products)
+            ]
+        self.counts["products"] = n_products
+        self.counts["suppliers"] = len(self.suppliers)
+
+    # Simulation
+
+    def simulate(self):
+        rng, args = self.rng, self.args
+        n_products = len(self.price)
+        stock = self.stock.tolist()
+        reorder_level = self.reorder_level.tolist()
+        price = self.price.tolist()
+        on_order = [False] * n_products
+        deliveries = {}  # day index -> [purchase order]
+        self.orders = []
+        sales = []
+        history = self.history
+        per_day = rng.multinomial(args.sales, day_weights(args.days, self.end, args.seasonality, args.growth))
+        started = time.perf_counter()
+
+        with self.engine.connect() as conn:
+            for day_index, count in enumerate(per_day.tolist()):
+                day = self.start + timedelta(days=day_index)
+
+                # Deliveries arrive before opening
+                for order in deliveries.pop(day_index, []):
+                    p = order["product_id"] - 1
+                    stock[p] += order["quantity"]
+                    on_order[p] = False
+                    history.append({"product_id": p + 1, "stock_level": stock[p], "action": "restock",
+                                    "recorded_at": order["actual_delivery"]})
+
+                products = rng.choice(n_products, size=count, p=self.popularity)
+                quantities = 1 + rng.poisson(self.extra_units[products])
+                seconds = rng.choice(24, size=count, p=HOUR_WEIGHTS) * 3600 + rng.integers(0, 3600, size=count)
+                order_by_time = np.argsort(seconds, kind="stable")
+
+                for p, quantity, second in zip(products[order_by_time].tolist(), quantities[order_by_time].tolist(),
+                                               seconds[order_by_time].tolist()):
+                    if stock[p] < quantity:
+                        self.counts["lost_sales"] += 1
+                        continue
+                    stock[p] -= quantity
+                    at = day + timedelta(seconds=second)
+                    sales.append({"product_id": p + 1, "quantity": quantity,
+                                  "total_amount": round(price[p] * quantity, 2), "sale_date": at})
+                    history.append({"product_id": p + 1, "stock_level": stock[p], "action": "sale", "recorded_at": at})
+
+                    if stock[p] <= reorder_level[p] and not on_order[p]:
+                        on_order[p] = True
+                        self._place_order(p, at, day_index, deliveries)
+
+                if len(sales) >= args.batch:
+                    self._flush(conn, sales, history)
+                    sales, history = [], []
+                    rate = self.counts["sales"] / (time.perf_counter() - started)
+                    print(f"  {self.counts['sales']:>12,} sales written ({rate:,.0f}/s)", file=sys.stderr)
+
+            self._flush(conn, sales, history)
+
+            # Orders still open at the end stay open
+            for orders in deliveries.values():
+                for order in orders:
+                    order["status"] = models.PurchaseOrderStatus.ORDERED
+                    order["actual_delivery"] = None
+            for offset in range(0, len(self.orders), args.batch):
+                conn.execute(insert(models.PurchaseOrder), self.orders[offset:offset + args.batch])
+            conn.execute(
+                update(models.Product).where(models.Product.id == bindparam("product_id")).values(
+                    stock=bindparam("new_stock"), updated_at=self.end
+                ),
+                [{"product_id": p + 1, "new_stock": s} for p, s in enumerate(stock)]
+            )
+            conn.execute(update(models.Supplier).values(total_orders=(
+                select(func.count(models.PurchaseOrder.id))
+                .where(models.PurchaseOrder.supplier_id == models.Supplier.id)
+                .scalar_subquery()
+            )))
+            conn.commit()
+        self.counts["purchase_orders"] = len(self.orders)
+
+    def _place_order(self, p, at, day_index, deliveries):
+        lead = int(self.rng.integers(LEAD_DAYS[0], LEAD_DAYS[1] + 1))
+        arrives = (at + timedelta(days=lead)).replace(hour=7, minute=0, second=0, microsecond=0)
+        quantity = int(self.order_quantity[p])
+        unit_cost = round(self.price[p] * float(self.rng.uniform(0.45, 0.75)), 2)
+        order = {
+            "supplier_id": int(self.supplier_of[p]),
+            "product_id": p + 1,
+            "quantity": quantity,
+            "unit_cost": unit_cost,
+            "total_cost": round(unit_cost * quantity, 2),
+            "status": models.PurchaseOrderStatus.DELIVERED,
+            "order_date": at,
+            "expected_delivery": arrives,
+            "actual_delivery": arrives,
+            "notes": None,
+        }
+        self.orders.append(order)
+        deliveries.setdefault(day_index + lead, []).append(order)
+
+    def _flush(self, conn, sales, history):
+        if sales:
+            conn.execute(insert(models.Sale), sales)
+        if history:
+            conn.execute(insert(models.StockHistory), history)
+        conn.commit()
+        self.counts["sales"] += len(sales)
+        self.counts["stock_history"] += len(history)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help=f"{SALES_PER_SCALE:,} sales per unit")
+    parser.add_argument("--sales", type=int, help="Sales to generate (overrides --scale)")
+    parser.add_argument("--products", type=int, help="Default: 100 x sqrt(scale)")
+    parser.add_argument("--suppliers", type=int, help="Default: products / 40")
+    parser.add_argument("--days", type=int, default=365, help="History length, ending at --end-date")
+    parser.add_argument("--end-date", type=datetime.fromisoformat,
+                        default=datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0),
+                        help="Last day of history (YYYY-MM-DD, default today)")
+    parser.add_argument("--seasonality", type=float, default=0.3, help="Yearly swing around the mean")
+    parser.add_argument("--growth", type=float, default=0.2, help="Volume growth over the period")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch", type=int, default=10000, help="Rows per INSERT batch")
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate all tables first")
+    args = parser.parse_args()
+
+    scale = (args.sales or args.scale * SALES_PER_SCALE) / SALES_PER_SCALE
+    args.sales = args.sales or int(args.scale * SALES_PER_SCALE)
+    n_products = args.products or max(50, int(100 * math.sqrt(scale)))
+    n_suppliers = args.suppliers or max(len(CATEGORIES), n_products // 40)
+
+    engine = create_engine_for(args.database_url)
+    if args.reset:
+        models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        if conn.execute(select(func.count(models.Product.id))).scalar():
+            print("Database already has products; use --reset to replace everything", file=sys.stderr)
+            return 1
+
+    print(f"Generating {args.sales:,} sales over {args.days} days for {n_products:,} products "
+          f"({engine.dialect.name}, seed {args.seed})")
+    started = time.perf_counter()
+    generator = Generator(engine, args)
+    generator.build_catalog(n_products, n_suppliers)
+    generator.simulate()
+    engine.dispose()
+
+    for table, count in generator.counts.items():
+        print(f"   {table:<16} {count:>12,}")
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
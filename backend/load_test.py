@@ -0,0 +1,395 @@
+"""
+End-to-end load and latency benchmark
+Seeds a database at each --scales size with generate_data.py, starts the API
+on it with uvicorn, and drives a mixed workload from --concurrency closed-loop
+clients: catalog browsing (scans), barcode and API checkouts, dashboards and
+forecasts. Reports throughput and p50/p95/p99 per route against per-route
+p95 SLOs, and saves the results as JSON for comparing runs over time.
+Run from backend folder:
+    python load_test.py --scales 1,10 --concurrency 1,8,32 --duration 30
+    python load_test.py --postgres postgresql://.../retail_bench --scales 10
+    python load_test.py --url http://localhost:8000 --compare bench_results/load_previous.json
+
+--postgres resets every table in the given database, so point it at a
+throwaway one. --url load-tests an already running server instead.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import requests
+
+from benchmark_db import summarize
+from generate_data import ean13
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_MIX = "browse=40,checkout=30,dashboard=20,forecast=10"
+# p95 targets in ms per workload; --slo overrides single routes
+DEFAULT_SLOS = {"browse": 300, "checkout": 250, "dashboard": 1000, "forecast": 3000}
+# Non-2xx answers that are correct behaviour (sold out); every other one is an error
+EXPECTED_STATUSES = {"POST /sales/": {400}, "POST /barcode/quick-sale": {400}}
+
+
+class Catalog:
+    """Product ids, barcodes and search terms the clients draw from"""
+
+    def __init__(self, base_url, limit=2000):
+        self.products = []
+        page = 1
+        while len(self.products) < limit:
+            response = requests.get(f"{base_url}/products/", params={"page": page, "per_page": 100}, timeout=60)
+            response.raise_for_status()
+            batch = response.json()["products"]
+            if not batch:
+                break
+            self.products.extend(batch)
+            page += 1
+        if not self.products:
+            raise SystemExit("The target database has no products; seed it first")
+        self.barcodes = self._barcodes(base_url)
+        self.categories = sorted({p["category"] for p in self.products})
+        self.pages = max(1, len(self.products) // 20)
+
+    def _barcodes(self, base_url, probes=20):
+        """Barcodes generate_data.py assigns (ean13 of the id), kept only if a sample resolves"""
+        candidates = [ean13(p["id"]) for p in self.products]
+        sample = random.Random(0).sample(candidates, min(probes, len(candidates)))
+        found = [b for b in sample
+                 if requests.get(f"{base_url}/barcode/inventory-check/{b}", timeout=60).status_code == 200]
+        if len(found) == len(sample):
+            return candidates
+        print(f"⚠️  {len(found)}/{len(sample)} generated barcodes resolve; "
+              "barcode checkouts use only those" if found else
+              "⚠️  No generated barcodes resolve; checkouts use the sales API only")
+        return found
+
+    def search_term(self, rng):
+        word = rng.choice(rng.choice(self.products)["name"].split())
+        term = word[:rng.randint(3, max(3, len(word)))]
+        if len(term) > 4 and rng.random() < 0.2:  # typo
+            i = rng.randrange(len(term) - 1)
+            term = term[:i] + term[i + 1] + term[i] + term[i + 2:]
+        return term
+
+
+# Workloads: each call is one user action of one or more requests
+
+def browse(client, catalog, rng):
+    params = {"page": rng.randint(1, catalog.pages), "per_page": 20}
+    if rng.random() < 0.4:
+        params["category"] = rng.choice(catalog.categories)
+    client.get("/products/", "GET /products/", params=params)
+    client.get("/products/search", "GET /products/search", params={"q": catalog.search_term(rng)})
+    client.get(f"/products/{rng.choice(catalog.products)['id']}", "GET /products/{product_id}")
+
+
+def checkout(client, catalog, rng):
+    if catalog.barcodes and rng.random() < 0.5:
+        barcode = rng.choice(catalog.barcodes)
+        client.get(f"/barcode/inventory-check/{barcode}", "GET /barcode/inventory-check/{barcode}")
+        client.post("/barcode/quick-sale", "POST /barcode/quick-sale", params={"barcode": barcode, "quantity": 1})
+    else:
+        product = rng.choice(catalog.products)
+        client.get(f"/reservations/availability/{product['id']}", "GET /reservations/availability/{product_id}")
+        client.post("/sales/", "POST /sales/", json={"product_id": product["id"], "quantity": rng.randint(1, 2)})
+
+
+def dashboard(client, catalog, rng):
+    client.get("/analytics/dashboard-stats", "GET /analytics/dashboard-stats")
+    client.get("/analytics/top-selling", "GET /analytics/top-selling")
+    client.get("/analytics/low-stock", "GET /analytics/low-stock")
+    client.get("/products/facets", "GET /products/facets")
+    client.get("/advanced-analytics/category-performance", "GET /advanced-analytics/category-performance")
+    client.get("/advanced-analytics/anomalies/live", "GET /advanced-analytics/anomalies/live")
+
+
+def forecast(client, catalog, rng):
+    product_id = rng.choice(catalog.products)["id"]
+    client.get("/advanced-analytics/revenue-forecast", "GET /advanced-analytics/revenue-forecast")
+    client.get(f"/advanced-analytics/demand-forecast/{product_id}", "GET /advanced-analytics/demand-forecast/{product_id}")
+    client.get(f"/analytics/predictions/{product_id}", "GET /analytics/predictions/{product_id}")
+
+WORKLOADS = {"browse": browse, "checkout": checkout, "dashboard": dashboard, "forecast": forecast}
+
+
+class Recorder:
+    """Latencies and status codes per route, shared by all clients"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.workload_of = {}
+        self.recording = False
+        self._lock = threading.Lock()
+
+    def record(self, route, workload, seconds, status):
+        if not self.recording:
+            return
+        with self._lock:
+            self.workload_of[route] = workload
+            self.statuses[route][status] += 1
+            if isinstance(status, int) and status < 500:
+                self.latencies[route].append(seconds)
+
+
+class Client:
+    def __init__(self, base_url, recorder, timeout):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.workload = None
+
+    def _call(self, method, path, route, **kwargs):
+        started = time.perf_counter()
+        try:
+            status = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs).status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        self.recorder.record(route, self.workload, time.perf_counter() - started, status)
+
+    def get(self, path, route, **kwargs):
+        self._call("GET", path, route, **kwargs)
+
+    def post(self, path, route, **kwargs):
+        self._call("POST", path, route, **kwargs)
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in WORKLOADS:
+            raise SystemExit(f"Unknown workload {name!r}; choose from {', '.join(WORKLOADS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def run_level(base_url, catalog, mix, concurrency, duration, warmup, seed, timeout):
+    """Closed-loop clients for warmup + duration seconds; only the last `duration` counts"""
+    recorder = Recorder()
+    stop = threading.Event()
+    names, weights = list(mix), list(mix.values())
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = Client(base_url, recorder, timeout)
+        while not stop.is_set():
+            client.workload = rng.choices(names, weights)[0]
+            WORKLOADS[client.workload](client, catalog, rng)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    time.sleep(warmup)
+    recorder.recording = True
+    started = time.perf_counter()
+    time.sleep(duration)
+    recorder.recording = False
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join(timeout + 5)
+    return recorder, elapsed
+
+
+def route_report(recorder, elapsed, slos):
+    routes = {}
+    for route, statuses in sorted(recorder.statuses.items()):
+        total = sum(statuses.values())
+        expected = EXPECTED_STATUSES.get(route, set())
+        errors = sum(n for status, n in statuses.items()
+                     if not isinstance(status, int) or (status >= 400 and status not in expected))
+        latencies = recorder.latencies.get(route)
+        stats = summarize(latencies) if latencies else {"count": 0}
+        workload = recorder.workload_of[route]
+        target = slos.get(route, DEFAULT_SLOS.get(workload))
+        stats.update({
+            "workload": workload,
+            "requests": total,
+            "errors": errors,
+            "statuses": {str(status): n for status, n in sorted(statuses.items(), key=str)},
+            "throughput_rps": round(total / elapsed, 2),
+            "slo_p95_ms": target,
+            "slo_ok": target is None or (stats.get("p95_ms") is not None and stats["p95_ms"] <= target
+                                         and errors == 0),
+        })
+        stats.pop("count", None)
+        routes[route] = stats
+    return routes
+
+
+def print_level(label, concurrency, routes, elapsed):
+    total = sum(r["requests"] for r in routes.values())
+    print(f"\n== {label}, {concurrency} clients: {total / elapsed:,.1f} req/s")
+    print(f"   {'route':<52}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>6}  SLO")
+    for route, r in routes.items():
+        slo = "-" if r["slo_p95_ms"] is None else ("ok" if r["slo_ok"] else f"MISS ({r['slo_p95_ms']} ms)")
+        print(f"   {route[:51]:<52}{r['throughput_rps']:>8}{r.get('p50_ms', '-'):>9}"
+              f"{r.get('p95_ms', '-'):>9}{r.get('p99_ms', '-'):>9}{r['errors']:>6}  {slo}")
+
+
+def compare(previous_path, runs):
+    """p95 change per route against an earlier results file"""
+    with open(previous_path) as f:
+        previous = {(run["label"], run["concurrency"]): run["routes"] for run in json.load(f)["runs"]}
+    print(f"\n== p95 vs {previous_path}")
+    for run in runs:
+        before = previous.get((run["label"], run["concurrency"]))
+        if not before:
+            continue
+        for route, r in run["routes"].items():
+            old, new = before.get(route, {}).get("p95_ms"), r.get("p95_ms")
+            if old and new:
+                print(f"   {run['label']:<10} c={run['concurrency']:<4} {route[:50]:<51}"
+                      f"{old:>9} -> {new:>9} ms ({(new - old) / old * 100:+.0f}%)")
+
+
+# Server lifecycle
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed_database(url, scale, seed):
+    subprocess.run(
+        [sys.executable, "generate_data.py", "--scale", str(scale), "--seed", str(seed),
+         "--database-url", url, "--reset"],
+        cwd=BACKEND_DIR, check=True, env={**os.environ, "DATABASE_URL": url}
+    )
+
+
+def start_server(url, workers):
+    port = free_port()
+    env = {**os.environ, "DATABASE_URL": url, "JOB_SCHEDULER": "0"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise SystemExit("API server exited during startup")
+        try:
+            if requests.get(f"{base_url}/health", timeout=2).status_code == 200:
+                return server, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise SystemExit("API server did not become healthy")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1,10", help="generate_data.py scales to test (1 = 10k sales)")
+    parser.add_argument("--postgres", help="Throwaway PostgreSQL database to use instead of SQLite")
+    parser.add_argument("--url", help="Load-test this running server instead of starting one")
+    parser.add_argument("--concurrency", default="1,8,32", help="Client counts to run in turn")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before each level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Workload weights")
+    parser.add_argument("--slo", action="append", default=[], metavar="ROUTE=P95_MS",
+                        help='e.g. "GET /products/{product_id}=100"; repeatable')
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=os.path.join(
+        "bench_results", f"load_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json"))
+    parser.add_argument("--compare", help="Earlier results file to diff p95 against")
+    parser.add_argument("--fail-on-slo", action="store_true", help="Exit 1 if any route misses its SLO")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    slos = {}
+    for item in args.slo:
+        route, _, target = item.rpartition("=")
+        slos[route.strip()] = float(target)
+
+    if args.url:
+        targets = [("external", None)]
+    else:
+        targets = [(f"scale-{scale}", scale) for scale in args.scales.split(",")]
+
+    report = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(),
+            "git_commit": git_commit(),
+            "database": "external" if args.url else ("postgresql" if args.postgres else "sqlite"),
+            "python": platform.python_version(),
+            "host": platform.node(),
+            "cpus": os.cpu_count(),
+            "config": vars(args),
+        },
+        "runs": []
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for label, scale in targets:
+            server = None
+            base_url = args.url
+            if scale is not None:
+                url = args.postgres or f"sqlite:///{os.path.join(workdir, f'{label}.db')}"
+                print(f"== {label}: seeding")
+                seed_database(url, scale, args.seed)
+                server, base_url = start_server(url, args.workers)
+            try:
+                catalog = Catalog(base_url)
+                for concurrency in levels:
+                    recorder, elapsed = run_level(base_url, catalog, mix, concurrency, args.duration,
+                                                  args.warmup, args.seed, args.timeout)
+                    routes = route_report(recorder, elapsed, slos)
+                    print_level(label, concurrency, routes, elapsed)
+                    report["runs"].append({
+                        "label": label,
+                        "scale": scale,
+                        "concurrency": concurrency,
+                        "duration_s": round(elapsed, 2),
+                        "throughput_rps": round(sum(r["requests"] for r in routes.values()) / elapsed, 2),
+                        "slo_ok": all(r["slo_ok"] for r in routes.values()),
+                        "routes": routes,
+                    })
+            finally:
+                if server is not None:
+                    server.terminate()
+                    server.wait(30)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(args.compare, report["runs"])
+    if args.fail_on_slo and not all(run["slo_ok"] for run in report["runs"]):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Partition and archive management for sales and stock_history
+Shows rows per month, creates upcoming monthly partitions (PostgreSQL, after
+migration 4) and moves old months to compressed files in ARCHIVE_DIR or back.
+Run from backend folder:
+    python manage_partitions.py status
+    python manage_partitions.py maintain
+    python manage_partitions.py archive --older-than-months 12 --dry-run
+    python manage_partitions.py archive --table sales --month 2025-01
+    python manage_partitions.py restore --table sales --month 2025-01
+
+Archived months stay readable through GET /archive/sales and
+GET /archive/stock-history.
+"""
+
+import argparse
+import sys
+from datetime import datetime
+
+from app.database import SessionLocal
+from app.partitions import (
+    PARTITIONED_TABLES, PartitionError, add_months, month_start, parse_month, partition_manager
+)
+
+
+def show_status(db, tables):
+    for table in tables:
+        print(f"📋 {table}:")
+        months = partition_manager.months(db, table)
+        if not months:
+            print("  (no rows)")
+        for m in months:
+            where = m["partition"] or ("live" if m["live_rows"] else "-")
+            archived = f"  📦 {m['archived_rows']:,} archived" if m["archive_path"] else ""
+            print(f"  {m['month']}  {m['live_rows']:>10,} rows  {where}{archived}")
+
+
+def archive(db, tables, month, older_than, dry_run):
+    if month:
+        targets = [(table, month) for table in tables]
+    else:
+        cutoff = add_months(month_start(datetime.utcnow()), -older_than)
+        targets = [
+            (table, m["month"]) for table in tables for m in partition_manager.months(db, table)
+            if parse_month(m["month"]) < cutoff and m["live_rows"] and not m["archive_path"]
+        ]
+    if not targets:
+        print("  ✓ Nothing to archive")
+    for table, target in sorted(targets):
+        if dry_run:
+            print(f"  · would archive {table} {target}")
+            continue
+        result = partition_manager.archive(db, table, target)
+        dropped = ", partition dropped" if result["partition_dropped"] else ""
+        print(f"  📦 {table} {target}: {result['rows']:,} rows -> {result['path']}{dropped}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["status", "maintain", "archive", "restore"])
+    parser.add_argument("--table", choices=list(PARTITIONED_TABLES), help="Default: both tables")
+    parser.add_argument("--month", help="YYYY-MM")
+    parser.add_argument("--older-than-months", type=int, help="archive: every month before this many months ago")
+    parser.add_argument("--dry-run", action="store_true", help="archive: only list what would be archived")
+    args = parser.parse_args()
+
+    tables = [args.table] if args.table else list(PARTITIONED_TABLES)
+    if args.command == "archive" and bool(args.month) == (args.older_than_months is not None):
+        parser.error("archive needs either --month or --older-than-months")
+    if args.command == "restore" and not args.month:
+        parser.error("restore needs --month")
+
+    db = SessionLocal()
+    try:
+        if args.command == "status":
+            show_status(db, tables)
+        elif args.command == "maintain":
+            result = partition_manager.maintain(db)
+            print(f"  ✅ Created {len(result['created_partitions'])} partition(s), "
+                  f"archived {len(result['archived'])} month(s)")
+        elif args.command == "archive":
+            archive(db, tables, args.month, args.older_than_months, args.dry_run)
+        else:
+            for table in tables:
+                result = partition_manager.restore(db, table, args.month)
+                print(f"  ♻️  {table} {args.month}: restored {result['rows']:,} rows")
+    except PartitionError as e:
+        print(f"\n❌ {e}")
+        return 1
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
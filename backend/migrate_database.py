@@ -1,70 +1,82 @@
 """
-Database migration script to add new tables and columns
-Run this: python migrate_database.py
+Database migrations
+Applies the versioned migrations in app/migrations.py and records them in
+the schema_migrations table.
+Run from backend folder:
+    python migrate_database.py                 # apply everything pending
+    python migrate_database.py status
+    python migrate_database.py up --to 2
+    python migrate_database.py down --to 2     # revert migrations above 2
+    python migrate_database.py check           # EXPLAIN the hot queries
 """
 
-from app.database import engine, SessionLocal
-from app import models
-from sqlalchemy import inspect, text
+import argparse
+import sys
 
-def check_column_exists(table_name, column_name):
-    """Check if a column exists in a table"""
-    inspector = inspect(engine)
-    columns = [col['name'] for col in inspector.get_columns(table_name)]
-    return column_name in columns
+from sqlalchemy import inspect
 
-def check_table_exists(table_name):
-    """Check if a table exists"""
-    inspector = inspect(engine)
-    return table_name in inspector.get_table_names()
+from app.database import engine
+from app.migrations import Migrator, check_index_usage
 
-def migrate():
+
+def show_status(migrator):
+    print("📋 Migrations:")
+    for m in migrator.status():
+        state = f"applied {m['applied_at']:%Y-%m-%d %H:%M}" if m["applied_at"] else "pending"
+        flags = ("" if m["reversible"] else " [irreversible]") + (" [online]" if m["online"] else "")
+        print(f"  {'✓' if m['applied_at'] else '·'} {m['version']:03d} {m['name']:<40} {state}{flags}")
+
+
+def check():
+    print("🔎 Index usage of hot queries:")
+    ok = True
+    for result in check_index_usage(engine):
+        if result["uses_index"]:
+            note = " (only with seq scans disabled; table too small to prefer it)" if result["forced"] else ""
+            print(f"  ✅ {result['query']:<36} {result['index']}{note}")
+        else:
+            ok = False
+            print(f"  ❌ {result['query']:<36} does not use {result['index']}")
+            for line in result["plan"].splitlines():
+                print(f"       {line}")
+    return ok
+
+
+def migrate(target=None):
     """Run database migrations"""
     print("🔄 Starting database migration...")
-    
-    db = SessionLocal()
-    
+    applied = Migrator(engine).upgrade(target)
+    print(f"  ✅ Applied {len(applied)} migration(s)" if applied else "  ✓ Already up to date")
+
+    print("\n📊 Current database tables:")
+    for table in inspect(engine).get_table_names():
+        print(f"  ✓ {table}")
+    print("\n✨ Migration completed successfully!")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", default="up", choices=["up", "down", "status", "check"])
+    parser.add_argument("--to", type=int, help="Target version (up: default latest, down: required)")
+    args = parser.parse_args()
+
     try:
-        # 1. Add barcode and sku columns to products table if they don't exist
-        if check_table_exists('products'):
-            print("\n📦 Checking products table...")
-            
-            if not check_column_exists('products', 'barcode'):
-                print("  ➕ Adding barcode column...")
-                db.execute(text("ALTER TABLE products ADD COLUMN barcode VARCHAR UNIQUE"))
-                db.commit()
-                print("  ✅ Barcode column added")
-            else:
-                print("  ✓ Barcode column already exists")
-            
-            if not check_column_exists('products', 'sku'):
-                print("  ➕ Adding SKU column...")
-                db.execute(text("ALTER TABLE products ADD COLUMN sku VARCHAR UNIQUE"))
-                db.commit()
-                print("  ✅ SKU column added")
-            else:
-                print("  ✓ SKU column already exists")
-        
-        # 2. Create new tables
-        print("\n🆕 Creating new tables...")
-        models.Base.metadata.create_all(bind=engine)
-        print("  ✅ All tables created/updated")
-        
-        # 3. Verify tables
-        inspector = inspect(engine)
-        tables = inspector.get_table_names()
-        
-        print("\n📊 Current database tables:")
-        for table in tables:
-            print(f"  ✓ {table}")
-        
-        print("\n✨ Migration completed successfully!")
-        
+        if args.command == "status":
+            show_status(Migrator(engine))
+        elif args.command == "check":
+            return 0 if check() else 1
+        elif args.command == "down":
+            if args.to is None:
+                parser.error("down needs --to VERSION (0 reverts everything)")
+            reverted = Migrator(engine).downgrade(args.to)
+            print(f"  ✅ Reverted {len(reverted)} migration(s)" if reverted else "  ✓ Nothing to revert")
+        else:
+            migrate(args.to)
     except Exception as e:
         print(f"\n❌ Migration failed: {e}")
-        db.rollback()
-    finally:
-        db.close()
+        return 1
+    return 0
+
 
 if __name__ == "__main__":
-    migrate()
\ No newline at end of file
+    sys.exit(main())
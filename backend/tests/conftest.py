@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# app.main creates its tables at import; keep that off any configured database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault("JOB_SCHEDULER", "0")
+
+pytest_plugins = ["app.query_budget"]
@@ -0,0 +1,21 @@
+from app.facets import catalog_facets
+
+
+def test_null_reorder_level_counts_as_zero(budget_client):
+    catalog_facets.evict()  # module-level cache; rebuild from this test's database
+    for stock in (0, 5, 50):
+        budget_client.post("/products/", json={
+            "name": f"Item {stock}", "category": "Tools", "stock": stock, "price": 5.0, "reorder_level": 10
+        })
+    assert budget_client.get("/products/facets").json()["facets"]["stock_status"] == {
+        "in_stock": 1, "low_stock": 1, "out_of_stock": 1
+    }
+
+    response = budget_client.put("/products/2", json={"reorder_level": None})
+    assert response.status_code == 200
+
+    facets = budget_client.get("/products/facets").json()["facets"]["stock_status"]
+    assert facets == {"in_stock": 2, "low_stock": 0, "out_of_stock": 1}
+    # The SQL filter agrees with the in-memory counts
+    listed = budget_client.get("/products/", params={"stock_status": "in_stock"}).json()
+    assert sorted(p["id"] for p in listed["products"]) == [2, 3]
@@ -0,0 +1,20 @@
+from datetime import datetime
+
+from app.jobs import CronSchedule
+
+
+def test_day_and_weekday_match_either_when_both_restricted():
+    schedule = CronSchedule("0 3 1 * 1")  # the 1st and every Monday
+    assert schedule.matches(datetime(2025, 1, 1, 3, 0))  # Wednesday the 1st
+    assert schedule.matches(datetime(2025, 1, 6, 3, 0))  # Monday the 6th
+    assert not schedule.matches(datetime(2025, 1, 7, 3, 0))
+    assert schedule.next_after(datetime(2025, 1, 1, 3, 0)) == datetime(2025, 1, 6, 3, 0)
+
+
+def test_wildcard_day_field_leaves_weekday_in_charge():
+    weekdays = CronSchedule("30 2 * * 1-5")
+    assert weekdays.matches(datetime(2025, 1, 6, 2, 30))
+    assert not weekdays.matches(datetime(2025, 1, 5, 2, 30))  # Sunday
+    stepped = CronSchedule("0 0 */10 * *")
+    assert stepped.matches(datetime(2025, 1, 11, 0, 0))
+    assert not stepped.matches(datetime(2025, 1, 12, 0, 0))
@@ -0,0 +1,20 @@
+from sqlalchemy import inspect
+
+from app.database import create_engine_for
+from app.migrations import MIGRATIONS, Migrator
+
+
+def test_upgrade_empty_database_and_back(tmp_path):
+    engine = create_engine_for(f"sqlite:///{tmp_path / 'empty.db'}")
+    migrator = Migrator(engine)
+    latest = [m.version for m in MIGRATIONS]
+
+    assert migrator.upgrade(log=lambda line: None) == latest
+    inspector = inspect(engine)
+    assert {"products", "sales", "stock_history"} <= set(inspector.get_table_names())
+    assert "store_id" in {c["name"] for c in inspector.get_columns("sales")}
+
+    assert migrator.downgrade(2, log=lambda line: None) == [v for v in reversed(latest) if v > 2]
+    assert migrator.upgrade(log=lambda line: None) == [v for v in latest if v > 2]
+    assert all(m["applied_at"] for m in migrator.status())
+    engine.dispose()
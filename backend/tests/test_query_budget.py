@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import models
+from app.query_budget import QueryBudgetExceeded, QueryRecorder, normalize_statement, query_budget
+
+
+def seed_products(engine, count=10, history_days=5):
+    now = datetime.utcnow()
+    with Session(engine) as db:
+        for i in range(count):
+            product = models.Product(name=f"Item {i}", category="Tools", stock=100, price=5.0, reorder_level=10)
+            db.add(product)
+            db.flush()
+            for day in range(history_days):
+                db.add(models.StockHistory(
+                    product_id=product.id, stock_level=100 - day * 5, action="sale",
+                    recorded_at=now - timedelta(days=history_days - day)
+                ))
+        db.commit()
+
+
+# Endpoint budgets
+
+def test_all_predictions_do_not_query_per_product(budget_engine, budget_client, query_budget):
+    seed_products(budget_engine, count=10)
+    with query_budget(2, n_plus_one_threshold=3, label="GET /analytics/predictions/"):
+        response = budget_client.get("/analytics/predictions/")
+    assert response.status_code == 200
+    assert len(response.json()) == 10
+
+
+def test_restock_loads_the_product_once(budget_engine, budget_client, query_budget):
+    seed_products(budget_engine, count=1)
+    with query_budget(5, n_plus_one_threshold=2, label="POST /products/{id}/restock"):
+        response = budget_client.post("/products/1/restock", params={"quantity": 5})
+    assert response.status_code == 200
+    assert response.json()["new_stock"] == 105
+
+
+def test_checkout_after_eviction_does_not_replay_history(budget_engine, budget_client, query_budget):
+    from app.anomaly import anomaly_detector
+    from app.memory import memory_accountant
+
+    seed_products(budget_engine, count=1)
+    memory_accountant.evict("anomaly_detector")
+    with query_budget(7, n_plus_one_threshold=3, label="POST /sales/"):
+        response = budget_client.post("/sales/", json={"product_id": 1, "quantity": 1})
+    assert response.status_code == 201
+    # Left cold for the next query or the rebuild job to warm
+    assert not anomaly_detector.built
+
+
+# Helper
+
+def test_normalize_statement_collapses_literals_and_lists():
+    assert normalize_statement("SELECT * FROM t WHERE a = 'x''y' AND b = 42") == "SELECT * FROM t WHERE a = ? AND b = ?"
+    assert normalize_statement("SELECT * FROM t WHERE id IN (?, ?, ?)") == "SELECT * FROM t WHERE id IN (?)"
+    assert normalize_statement("SELECT * FROM t WHERE id IN (__[POSTCOMPILE_id_1])") == "SELECT * FROM t WHERE id IN (?)"
+    assert normalize_statement("SELECT a,\n   b  FROM t\tWHERE c = 1.5") == "SELECT a, b FROM t WHERE c = ?"
+
+
+def test_repeated_groups_near_identical_selects(budget_engine):
+    with QueryRecorder(budget_engine) as recorder:
+        with budget_engine.connect() as conn:
+            for product_id in range(4):
+                conn.execute(text(f"SELECT name FROM products WHERE id = {product_id}"))
+            conn.execute(text("SELECT count(*) FROM sales"))
+            for _ in range(4):
+                conn.execute(text("DELETE FROM sales WHERE id = 1"))
+    suspects = recorder.repeated(threshold=3)
+    assert [(sql, count) for sql, count, _ in suspects] == [("SELECT name FROM products WHERE id = ?", 4)]
+    assert recorder.repeated(threshold=5) == []
+
+
+def test_query_budget_fails_over_budget(budget_engine):
+    with pytest.raises(QueryBudgetExceeded, match="ran 3 statements"):
+        with query_budget(2, budget_engine):
+            with budget_engine.connect() as conn:
+                for _ in range(3):
+                    conn.execute(text("SELECT 1"))
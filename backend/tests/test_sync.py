@@ -0,0 +1,171 @@
+import json
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import crud, models, schemas, sync
+from app.database import create_engine_for
+from app.sync import edge_syncer
+
+
+def add_product(engine, stock):
+    with Session(engine) as db:
+        db.add(models.Product(id=1, name="Kettle", category="Home", stock=stock, price=20.0, reorder_level=2))
+        db.commit()
+
+
+def central_stock(engine):
+    with Session(engine) as db:
+        return db.get(models.Product, 1).stock
+
+
+def outbox(edge):
+    with edge() as db:
+        return db.query(models.OutboxEvent).order_by(models.OutboxEvent.id).all()
+
+
+@pytest.fixture
+def edge(tmp_path, budget_client, monkeypatch):
+    """A second local database acting as the store node, syncing to budget_client as central"""
+    edge_engine = create_engine_for(f"sqlite:///{tmp_path / 'edge.db'}")
+    models.Base.metadata.create_all(bind=edge_engine)
+    EdgeSession = sessionmaker(autocommit=False, autoflush=False, bind=edge_engine)
+    monkeypatch.setattr(sync, "SessionLocal", EdgeSession)
+    monkeypatch.setattr(sync, "_node_reports", {})
+    monkeypatch.setattr(edge_syncer, "node", "edge1")
+    monkeypatch.setattr(edge_syncer, "central_url", "http://testserver")
+    monkeypatch.setattr(edge_syncer, "http", budget_client)
+    EdgeSession.engine = edge_engine
+    yield EdgeSession
+    edge_engine.dispose()
+
+
+def sell(edge, quantity):
+    with edge() as db:
+        crud.create_sale(db, schemas.SaleCreate(product_id=1, quantity=quantity))
+
+
+def test_push_then_replay_is_duplicate(edge, budget_engine):
+    add_product(edge.engine, 10)
+    add_product(budget_engine, 10)
+    sell(edge, 2)
+
+    assert edge_syncer.sync_once() == {"synced": 1, "error": None}
+    assert central_stock(budget_engine) == 8
+    assert [e.sync_status for e in outbox(edge)] == ["applied"]
+
+    # The acknowledgement got lost: the same event is sent again
+    with edge() as db:
+        db.query(models.OutboxEvent).update({models.OutboxEvent.synced_at: None})
+        db.commit()
+    assert edge_syncer.sync_once()["synced"] == 1
+    assert [e.sync_status for e in outbox(edge)] == ["duplicate"]
+    assert central_stock(budget_engine) == 8
+
+
+def test_oversold_sale_is_a_conflict_floored_at_zero(edge, budget_engine):
+    add_product(edge.engine, 10)
+    add_product(budget_engine, 1)
+    sell(edge, 3)
+
+    edge_syncer.sync_once()
+    event, = outbox(edge)
+    assert event.sync_status == "conflict"
+    assert json.loads(event.sync_detail) == {"type": "oversold", "shortfall": 2}
+    assert central_stock(budget_engine) == 0
+    with Session(budget_engine) as db:
+        assert db.query(models.Sale).filter(models.Sale.product_id == 1).one().quantity == 3
+
+
+def test_adjustment_from_a_diverged_level_keeps_central_movements(edge, budget_engine):
+    add_product(edge.engine, 10)
+    add_product(budget_engine, 10)
+    with Session(budget_engine) as db:
+        crud.create_sale(db, schemas.SaleCreate(product_id=1, quantity=2))  # central: 8
+    with edge() as db:
+        crud.update_product(db, 1, schemas.ProductUpdate(stock=7))  # counted 7, saw 10
+
+    edge_syncer.sync_once()
+    event, = outbox(edge)
+    assert event.sync_status == "conflict"
+    assert json.loads(event.sync_detail) == {
+        "type": "diverged", "central_level": 8, "edge_level": 10, "counted": 7, "resulting_level": 5
+    }
+    assert central_stock(budget_engine) == 5
+
+
+def test_sync_resumes_after_a_partial_acknowledgement(edge, budget_engine, budget_client, monkeypatch):
+    add_product(edge.engine, 10)
+    add_product(budget_engine, 10)
+    for _ in range(5):
+        sell(edge, 1)
+    monkeypatch.setattr(edge_syncer, "batch_size", 2)
+
+    class DropsSecondResponse:
+        """Central applies every batch, but the reply to the second one is lost"""
+        calls = 0
+
+        def post(self, *args, **kwargs):
+            response = budget_client.post(*args, **kwargs)
+            self.calls += 1
+            if self.calls == 2:
+                raise requests.ConnectionError("connection reset")
+            return response
+
+    monkeypatch.setattr(edge_syncer, "http", DropsSecondResponse())
+    result = edge_syncer.sync_once()
+    assert result["synced"] == 2 and "connection reset" in result["error"]
+    assert [e.synced_at is not None for e in outbox(edge)] == [True, True, False, False, False]
+
+    monkeypatch.setattr(edge_syncer, "http", budget_client)
+    assert edge_syncer.sync_once() == {"synced": 3, "error": None}
+    assert [e.sync_status for e in outbox(edge)] == ["applied", "applied", "duplicate", "duplicate", "applied"]
+    assert central_stock(budget_engine) == 5
+
+
+def test_nodes_report_lag_from_the_last_batch(edge, budget_engine, budget_client, monkeypatch):
+    add_product(edge.engine, 10)
+    add_product(budget_engine, 10)
+    for _ in range(3):
+        sell(edge, 1)
+    with edge() as db:
+        db.query(models.OutboxEvent).update(
+            {models.OutboxEvent.created_at: datetime.utcnow() - timedelta(hours=1)}
+        )
+        db.commit()
+    monkeypatch.setattr(edge_syncer, "batch_size", 2)
+
+    edge_syncer.sync_once()
+    node, = budget_client.get("/sync/nodes").json()
+    assert node["node"] == "edge1"
+    assert node["events"] == 3
+    assert node["conflicts"] == 0 and node["rejected"] == 0
+    # The last batch was cut with one event left, an hour old
+    assert node["reported_pending"] == 1
+    assert 3500 < node["lag_seconds"] < 3700
+    assert node["seconds_since_last_batch"] < 60
+
+
+def test_invalid_payloads_are_rejected_per_event(budget_engine, budget_client):
+    add_product(budget_engine, 7)
+
+    def event(kind, data):
+        return {"event_id": uuid.uuid4().hex, "kind": kind, "product_id": 1,
+                "created_at": datetime.utcnow().isoformat(), "data": data}
+
+    events = [
+        event("sale", {}),
+        event("sale", {"quantity": -50}),
+        event("adjustment", {"stock": -1, "previous": 7}),
+        event("restock", {"quantity": 3}),
+    ]
+    response = budget_client.post("/sync/batches", json={"node": "edge1", "events": events})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["rejected", "rejected", "rejected", "applied"]
+    assert results[0]["detail"]["type"] == "invalid_payload"
+    assert results[1]["detail"]["errors"][0]["field"] == "quantity"
+    assert central_stock(budget_engine) == 10
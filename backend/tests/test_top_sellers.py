@@ -0,0 +1,53 @@
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from app import crud, models
+from app.top_sellers import TopSellers
+
+
+def seed_sales(db, rng, products, count, max_age_days):
+    now = datetime.utcnow()
+    sales = []
+    for _ in range(count):
+        sale = models.Sale(
+            product_id=rng.choice(products).id,
+            quantity=rng.randint(1, 5),
+            total_amount=1.0,
+            sale_date=now - timedelta(minutes=rng.randint(1, max_age_days * 24 * 60))
+        )
+        db.add(sale)
+        sales.append(sale)
+    db.commit()
+    return sales
+
+
+def test_windows_match_sql_after_rebuild_and_streaming(budget_engine):
+    rng = random.Random(7)
+    with Session(budget_engine) as db:
+        products = [models.Product(name=f"Item {i}", category="Tools", stock=1000, price=1.0) for i in range(25)]
+        db.add_all(products)
+        db.commit()
+        # Backdated sales, some older than the widest window
+        seed_sales(db, rng, products, 2000, max_age_days=120)
+
+        counters = TopSellers()
+        counters.rebuild(db)
+        # Sales arriving after the rebuild are counted as they are recorded
+        for sale in seed_sales(db, rng, products, 300, max_age_days=2):
+            counters.record_sale(sale.product_id, f"Item {sale.product_id}", sale.sale_date, sale.quantity)
+
+        for days in TopSellers.WINDOWS:
+            streamed = counters.top(db, len(products), days)
+            expected = crud.get_top_selling_products(
+                db, len(products), days, since=counters.window_start(days)
+            )
+            assert {r[0]: r[2] for r in streamed} == {r[0]: int(r[2]) for r in expected}, f"{days} day window"
+            # Ties may be ordered differently, so ranks are compared by total
+            assert [r[2] for r in streamed[:5]] == [int(r[2]) for r in expected[:5]]
+
+
+def test_non_standard_window_falls_back_to_sql(budget_engine):
+    with Session(budget_engine) as db:
+        assert TopSellers().top(db, 10, 14) is None